@@ -1,6 +1,29 @@
-import pandas as pd
+from constants import CARD_NAMES, CROPS, DEFAULT_CROP
+
+# Account Maps columns allocate reads for each grower
+MAP_COLUMNS = ["Logistics Account", "Freight Account", "Repack Logistics Account", "Repack Freight Account", "Job Code"]
+
+
+def mapping_lookup(mapping_df):
+    """Returns lookup(grower) -> {column: value} from the first matching Supplier row, or None.
+
+    mapping_df may also be compiled reference tables (anything with .account_row,
+    see shared_ref.RefTables), which answer without pandas.
+    """
+    if hasattr(mapping_df, "account_row"):
+        return mapping_df.account_row
+
+    supplier_series = mapping_df["Supplier"].astype(str).str.strip().str.lower()
+    cols = [c for c in MAP_COLUMNS if c in mapping_df.columns]
+
+    def lookup(grower):
+        row = mapping_df[supplier_series == str(grower).strip().lower()]
+        if row.empty:
+            return None
+        return {c: row[c].values[0] for c in cols}
+
+    return lookup
 
-from constants import CARD_NAMES
 
 def allocate(
     invoice_no,
@@ -12,15 +35,18 @@ def allocate(
     mapping_df,
     repack_growers=None,
     repack_charge_types=None,
+    crop=DEFAULT_CROP,
 ):
     """Returns (rows: list[dict], fail_reason: str|None)
 
     repack_growers: optional iterable of grower names that should be routed to repack accounts.
     repack_charge_types: optional iterable of charge types (e.g. {"Logistics","Freight"}) that
         should use repack accounts for repack growers. If None, defaults to all charge types present.
+    crop: CROPS name; sets the tray rate and description templates for the lines.
     """
     rows = []
     card_name = CARD_NAMES.get(company, company)
+    crop_cfg = CROPS.get(crop, CROPS[DEFAULT_CROP])
 
     repack_growers = set(repack_growers or [])
 
@@ -31,18 +57,13 @@ def allocate(
         repack_charge_types = set(repack_charge_types)
 
     # Fail if any growers unmapped
-    missing = []
     # Guard against non-string Supplier column
     if "Supplier" not in mapping_df.columns:
         return [], "Mapping file missing 'Supplier' column"
 
-    supplier_series = mapping_df["Supplier"].astype(str).str.strip().str.lower()
-
-    for grower in grower_split.keys():
-        g = str(grower).strip().lower()
-        hit = mapping_df[supplier_series == g]
-        if hit.empty:
-            missing.append(grower)
+    lookup = mapping_lookup(mapping_df)
+    mapped = {grower: lookup(grower) for grower in grower_split.keys()}
+    missing = [grower for grower, row in mapped.items() if row is None]
     if missing:
         return [], f"{', '.join(missing)} not in mapping"
 
@@ -56,20 +77,19 @@ def allocate(
     # Build rows
     for grower, pct in grower_split.items():
         g_str = str(grower).strip()
-        g_key = g_str.lower()
-        row = mapping_df[supplier_series == g_key]
+        row = mapped[grower]
 
         # Standard accounts
-        logistics_acc = row["Logistics Account"].values[0]
-        freight_acc   = row["Freight Account"].values[0]
+        logistics_acc = row["Logistics Account"]
+        freight_acc   = row["Freight Account"]
 
         # Repack accounts
-        rep_logistics_acc = row.get("Repack Logistics Account", pd.Series([None])).values[0] if "Repack Logistics Account" in row.columns else None
-        rep_freight_acc   = row.get("Repack Freight Account", pd.Series([None])).values[0] if "Repack Freight Account" in row.columns else None
+        rep_logistics_acc = row.get("Repack Logistics Account")
+        rep_freight_acc   = row.get("Repack Freight Account")
 
         is_repack_grower = g_str in repack_growers
 
-        job_code = row["Job Code"].values[0]
+        job_code = row["Job Code"]
 
         for ch_type, amount in (charges or {}).items():
             # Decide which account applies for THIS charge type for THIS grower
@@ -77,12 +97,12 @@ def allocate(
 
             if ch_type == "Logistics":
                 account_no = rep_logistics_acc if use_repack_for_this_charge and rep_logistics_acc is not None else logistics_acc
-                tray_count = int(round(amount / 0.85))  # description only
-                desc = f"{tray_count} x Blueberry Logistics {job_code}"
+                tray_count = int(round(amount / crop_cfg["tray_rate"]))  # description only
+                desc = crop_cfg["logistics_desc"].format(trays=tray_count, job=job_code)
             else:
                 # Treat everything other than Logistics as Freight (current v1 behavior)
                 account_no = rep_freight_acc if use_repack_for_this_charge and rep_freight_acc is not None else freight_acc
-                desc = f"Blueberry Freight {job_code}"
+                desc = crop_cfg["freight_desc"].format(job=job_code)
 
             rows.append({
                 "Co./Last Name": card_name,
@@ -93,7 +113,10 @@ def allocate(
                 "Amount": round(float(amount) * float(pct), 2),
                 "Job": job_code,
                 "Tax Code": "GST",
-                "Comment": cust_po
+                "Comment": cust_po,
+                "Grower": g_str,
+                "Crop": crop,
+                "Charge Type": ch_type,
             })
 
     if not rows:
@@ -1,272 +1,124 @@
+import io
+import json
+import os
 import streamlit as st
 import pandas as pd
 from pathlib import Path
 
-from parsers import parse_pdf_filelike
-from excel_ops import get_grower_split
+from consignment_store import ConsignmentStore
+from pipeline import Pipeline, unreadable_result
+from journal import BatchJournal, batch_id, file_id
+from line_items import LINE_ITEMS_PATH, LineItemStore
+import jobs
+import history_store
+from reconcile import reconcile
 from allocator import allocate
-from exporter import group_with_blank_lines, to_tab_delimited_with_header
-from utils import load_consignee_state_map, norm_consignee
-from constants import GROWER_NAME
+from maps_check import MapIndex, check_maps, has_problems
+from preview import PAGE_SIZES, PreviewCache, reason_kind
+from utils import load_consignee_state_map
+from constants import DEFAULT_CROP
+from session_store import (
+    AllocRow, InvoiceMetaStore, RowStore, SESSION_BUDGET_BYTES, memory_report, trim_to_budget
+)
 
 
+CONSIGNEES_PATH = Path(__file__).resolve().parent / "data" / "consignees.xlsx"
 
-st.set_page_config(page_title="Invoice Splitter for MYOB", layout="wide")
 
-st.markdown("""
-<style>
-  .block-container { max-width: 100%; padding-left: 3rem; padding-right: 3rem; }
-</style>
-""", unsafe_allow_html=True)
+@st.cache_data
+def _get_consignee_state_map():
+    return load_consignee_state_map(CONSIGNEES_PATH)
 
-st.title("Invoice Splitter for MYOB")
 
+@st.cache_resource(max_entries=1)
+def _load_line_store(mtime_ns):
+    return LineItemStore.load()
 
-@st.cache_data
-def _get_consignee_state_map():
-    base_dir = Path(__file__).resolve().parent
-    return load_consignee_state_map(base_dir / "data" / "consignees.xlsx")
 
+def _line_store():
+    """Stored invoice lines, reloaded only when the file changes."""
+    return _load_line_store(LINE_ITEMS_PATH.stat().st_mtime_ns if LINE_ITEMS_PATH.exists() else 0)
 
-consignee_state_map = _get_consignee_state_map()
 
+def _init_session_state():
+    if "invoice_meta" not in st.session_state:
+        # key -> InvoiceMeta with all invoice fields we need later (including failed ones)
+        st.session_state.invoice_meta = InvoiceMetaStore()
 
-def _mk_key(company, invoice_no, cust_po):
-    return f"{str(company).strip()}|{str(invoice_no).strip()}|{str(cust_po).strip()}"
+    if "repack_growers" not in st.session_state:
+        # key -> set[grower] (legacy: used to flag growers to repack accounts)
+        st.session_state.repack_growers = {}
 
+    if "repack_allocations" not in st.session_state:
+        # key -> list[AllocRow(Grower, Trays, Repack)]
+        st.session_state.repack_allocations = {}
 
-# -------------------------
-# Session state
-# -------------------------
-if "invoice_meta" not in st.session_state:
-    # key -> dict with all invoice fields we need later (including failed ones)
-    st.session_state.invoice_meta = {}
-
-if "repack_growers" not in st.session_state:
-    # key -> set[grower] (legacy: used to flag growers to repack accounts)
-    st.session_state.repack_growers = {}
-
-if "repack_allocations" not in st.session_state:
-    # key -> list[{"Grower": str, "Trays": float, "Repack": bool}]
-    st.session_state.repack_allocations = {}
-
-if "manual_jobs" not in st.session_state:
-    # key -> True (queued for manual allocation)
-    st.session_state.manual_jobs = {}
-
-# Store results so UI edits don't re-run heavy parsing
-if "all_rows" not in st.session_state:
-    st.session_state.all_rows = []
-
-if "failed_rows" not in st.session_state:
-    st.session_state.failed_rows = []
-
-if "all_growers" not in st.session_state:
-    # global grower list seen in the current run (used for dropdowns)
-    st.session_state.all_growers = set()
-
-if "mapping_df" not in st.session_state:
-    st.session_state.mapping_df = None
-
-if "processed_keys" not in st.session_state:
-    # avoid accidentally double-processing the same invoice key
-    st.session_state.processed_keys = set()
-
-
- # -------------------------
- # Uploads (3 across)
- # -------------------------
-u1, u2, u3 = st.columns(3)
-with u1:
-    uploaded_pdfs = st.file_uploader("Upload Invoice PDFs", type="pdf", accept_multiple_files=True)
-with u2:
-    uploaded_excel = st.file_uploader("Upload Consignment Summary Excel", type=["xlsx"])
-
-with u3:
-    uploaded_maps = st.file_uploader("Upload Account Maps Excel", type=["xlsx"])
-
-# Build grower dropdown options directly from Account Maps (Supplier column)
-if uploaded_maps is not None:
-    try:
-        # Only reload if different file (name/size token)
-        token = (getattr(uploaded_maps, "name", None), getattr(uploaded_maps, "size", None))
-        if st.session_state.get("_maps_token") != token:
-            mapping_df_preview = pd.read_excel(uploaded_maps)
-            st.session_state.mapping_df = mapping_df_preview
-            st.session_state._maps_token = token
-        mapping_df_for_opts = st.session_state.mapping_df
-        if mapping_df_for_opts is not None and "Supplier" in mapping_df_for_opts.columns:
-            opts = (
-                mapping_df_for_opts["Supplier"]
-                .dropna()
-                .astype(str)
-                .str.strip()
-                .loc[lambda s: s.ne("") & s.str.lower().ne("nan") & s.str.lower().ne("none")]
-                .unique()
-                .tolist()
-            )
-            st.session_state.grower_options = sorted(opts, key=str.lower)
-        else:
-            st.session_state.grower_options = []
-    except Exception:
-        st.session_state.grower_options = []
+    if "manual_jobs" not in st.session_state:
+        # key -> True (queued for manual allocation)
+        st.session_state.manual_jobs = {}
 
-run = st.button(
-    "Run Processing",
-    type="primary",
-    disabled=not (uploaded_pdfs and uploaded_excel and uploaded_maps),
-)
+    # Store results so UI edits don't re-run heavy parsing
+    if "all_rows" not in st.session_state:
+        st.session_state.all_rows = RowStore()
 
+    if "failed_rows" not in st.session_state:
+        st.session_state.failed_rows = []
 
-# -------------------------
-# Processing (ONLY when Run clicked)
-# -------------------------
-if run and uploaded_pdfs and uploaded_excel and uploaded_maps:
-    # mapping_df was already loaded from uploaded Account Maps
-    mapping_df = st.session_state.mapping_df
+    if "all_growers" not in st.session_state:
+        # global grower list seen in the current run (used for dropdowns)
+        st.session_state.all_growers = set()
 
-    all_rows, failed_rows = [], []
-
-    with st.spinner("Processing invoices..."):
-        for pdf in uploaded_pdfs:
-            company, (invoice_no, cust_po, invoice_date, charges, invoice_trays) = parse_pdf_filelike(pdf)
-
-            # Build a stable key early (cust_po might be missing)
-            key = _mk_key(company, invoice_no, cust_po or "")
-
-            # Save invoice meta (even if it fails) so repack can use totals/charges/date later
-            st.session_state.invoice_meta[key] = {
-                "Company": company,
-                "Invoice No.": invoice_no,
-                "PO No.": cust_po,
-                "Invoice Date": invoice_date,
-                "Charges": charges or {},
-                "Invoice Trays": invoice_trays,
-                "Key": key,
-            }
-
-            # Fail 1: missing PO
-            if not cust_po:
-                failed_rows.append({
-                    "Company": company,
-                    "Invoice No.": invoice_no,
-                    "PO No.": cust_po,
-                    "Reason": "Could not read PO",
-                    "Key": key
-                })
-                continue
-
-            grower_split, excel_trays, consignee = get_grower_split(uploaded_excel, cust_po, company)
-            # Track growers seen (for dropdowns in repack setup)
-            try:
-                st.session_state.all_growers.update({str(g).strip() for g in (grower_split or {}).keys() if str(g).strip()})
-            except Exception:
-                pass
-
-
-            # Add growers + excel meta for repack UI
-            st.session_state.invoice_meta[key].update({
-                "Growers": sorted([str(g).strip() for g in grower_split.keys()]),
-                "FT Trays": excel_trays,
-                "Consignee": consignee,
-            })
-
-            # Fail 2: no growers
-            if not grower_split:
-                failed_rows.append({
-                    "Company": company,
-                    "Invoice No.": invoice_no,
-                    "PO No.": cust_po,
-                    "Reason": "No Growers Found in FT",
-                    "Key": key
-                })
-                continue
-
-            # ---------------- KINGLAKE: Block if consignee is outside VIC ----------------
-            has_kinglake = any(
-                str(g).strip().lower() == GROWER_NAME.strip().lower()
-                for g in grower_split.keys()
-            )
+    if "mapping_df" not in st.session_state:
+        st.session_state.mapping_df = None
 
-            if has_kinglake:
-                # If consignee missing, block (safer)
-                if not consignee or not str(consignee).strip():
-                    failed_rows.append({
-                        "Company": company, "Invoice No.": invoice_no, "PO No.": cust_po,
-                        "Reason": "Consignee not in FT",
-                        "Key": key
-                    })
-                    continue
+    if "maps_index" not in st.session_state:
+        # Account Maps compiled for allocate, and its check against the FT (maps_check.py)
+        st.session_state.maps_index = None
+        st.session_state.maps_report = None
 
-                ckey = norm_consignee(consignee)
-                state = consignee_state_map.get(ckey)
+    if "processed_keys" not in st.session_state:
+        # avoid accidentally double-processing the same invoice key
+        st.session_state.processed_keys = set()
 
-                # If not found in list, block (safer)
-                if not state:
-                    failed_rows.append({
-                        "Company": company, "Invoice No.": invoice_no, "PO No.": cust_po,
-                        "Reason": "Consignee not in list",
-                        "Key": key
-                    })
-                    continue
+    if "failed_actions" not in st.session_state:
+        # keys ticked for Manual Allocation in the failed table
+        st.session_state.failed_actions = set()
 
-                if state != "VIC":
-                    failed_rows.append({
-                        "Company": company, "Invoice No.": invoice_no, "PO No.": cust_po,
-                        "Reason": "KING Outside of VIC",
-                        "Key": key
-                    })
-                    continue
-            # ---------------------------------------------------------------------------
-
-            inv_ok = isinstance(invoice_trays, (int, float)) and invoice_trays > 0
-            ex_ok = isinstance(excel_trays, (int, float)) and excel_trays > 0
-
-            # Fail 3: invoice trays missing
-            if not inv_ok:
-                failed_rows.append({
-                    "Company": company, "Invoice No.": invoice_no, "PO No.": cust_po,
-                    "Reason": "Invoice Tray Error", "Key": key
-                })
-                continue
-
-            # Fail 4: consignment trays missing
-            if not ex_ok:
-                failed_rows.append({
-                    "Company": company, "Invoice No.": invoice_no, "PO No.": cust_po,
-                    "Reason": "0 FT Trays", "Key": key
-                })
-                continue
-
-            # Fail 5: tray mismatch
-            if int(round(invoice_trays)) != int(round(excel_trays)):
-                failed_rows.append({
-                    "Company": company, "Invoice No.": invoice_no, "PO No.": cust_po,
-                    "Reason": f"Mismatch, {int(round(invoice_trays))} v {int(round(excel_trays))}",
-                    "Key": key
-                })
-                continue
-
-            repack_set = st.session_state.repack_growers.get(key, set())
-
-            # Allocation (normal path)
-            rows, fail_reason = allocate(
-                invoice_no, cust_po, charges, grower_split, company, invoice_date, mapping_df, repack_set
-            )
-            if fail_reason:
-                failed_rows.append({
-                    "Company": company, "Invoice No.": invoice_no, "PO No.": cust_po,
-                    "Reason": fail_reason, "Key": key
-                })
-                continue
+    if "results_version" not in st.session_state:
+        # bumped whenever all_rows / failed_rows change (invalidates the preview cache)
+        st.session_state.results_version = 0
+        st.session_state.preview = PreviewCache()
+
+
+def _results_changed():
+    st.session_state.results_version += 1
+
+
+# Session entries counted against SESSION_BUDGET_BYTES
+_BUDGETED_STATE = ("invoice_meta", "repack_growers", "repack_allocations", "manual_jobs",
+                   "failed_actions", "all_rows", "failed_rows", "processed_keys", "preview")
+
+
+def _enforce_session_budget():
+    """Keeps the session under SESSION_BUDGET_BYTES; invoices queued or ticked for manual allocation stay."""
+    pinned = set(st.session_state.manual_jobs) | st.session_state.failed_actions
+    total = trim_to_budget({n: st.session_state.get(n) for n in _BUDGETED_STATE}, pinned=pinned)
+    if total > SESSION_BUDGET_BYTES:
+        st.warning(
+            f"Session holds {total / 1024 / 1024:,.0f} MiB, over the {SESSION_BUDGET_BYTES / 1024 / 1024:,.0f} MiB"
+            " budget. Download the MYOB file and process the rest in smaller batches."
+        )
 
-            if key not in st.session_state.processed_keys:
-                all_rows.extend(rows)
-                st.session_state.processed_keys.add(key)
 
-    # Save results for UI interactions (checkbox ticks won't reprocess)
-    st.session_state.all_rows = all_rows
-    st.session_state.failed_rows = failed_rows
+def _evict_keys(keys):
+    """Forget per-invoice UI state for invoices that are done (allocated or exported)."""
+    keys = set(keys)
+    st.session_state.invoice_meta.evict(keys)
+    for name in ("repack_growers", "repack_allocations", "manual_jobs"):
+        store = st.session_state[name]
+        for k in keys:
+            store.pop(k, None)
+    st.session_state.failed_actions -= keys
 
 
 # -------------------------
@@ -278,7 +130,7 @@ def _default_repack_allocations_for_key(k: str):
     """
     meta = st.session_state.invoice_meta.get(k, {})
     growers = meta.get("Growers", []) or []
-    base = [{"Grower": g, "Trays": 0.0, "Repack": False} for g in growers]
+    base = [AllocRow(g, 0.0, False) for g in growers]
     return base
 
 
@@ -303,7 +155,7 @@ def _save_allocations_df(k: str, df: pd.DataFrame):
     # Drop empty growers / zero trays rows
     df = df[(df["Grower"] != "") & (df["Trays"] > 0)]
 
-    st.session_state.repack_allocations[k] = df.to_dict("records")
+    st.session_state.repack_allocations[k] = [AllocRow(*r) for r in df[["Grower", "Trays", "Repack"]].itertuples(index=False)]
     st.session_state.repack_growers[k] = set(df[df["Repack"]]["Grower"].tolist())
 
 def _save_allocations_rows(k: str, rows: list[dict]):
@@ -315,7 +167,7 @@ def _save_allocations_rows(k: str, rows: list[dict]):
         trays = pd.to_numeric(r.get("Trays", 0), errors="coerce")
         trays = float(trays) if pd.notna(trays) else 0.0
         repack = bool(r.get("Repack", False))
-        cleaned.append({"Grower": g, "Trays": trays, "Repack": repack})
+        cleaned.append(AllocRow(g, trays, repack))
         if g and trays > 0 and repack:
             repack_set.add(g)
     st.session_state.repack_allocations[k] = cleaned
@@ -328,14 +180,18 @@ def _process_manual_keys(keys_for_setup):
     if mapping_df is None or mapping_df.empty:
         st.error("No Account Maps loaded in session. Click 'Run Processing' again with the maps file.")
         return
+    maps = st.session_state.maps_index if st.session_state.maps_index is not None else mapping_df
 
     new_rows = []
+    done_keys = []
     processed = 0
     skipped = 0
 
+    missing = []
     for k in keys_for_setup:
         meta = st.session_state.invoice_meta.get(k)
         if not meta:
+            missing.append(k)
             skipped += 1
             continue
 
@@ -374,7 +230,8 @@ def _process_manual_keys(keys_for_setup):
         repack_types = {"Logistics", "Freight"}
 
         rows, fail_reason = allocate(
-            invoice_no, cust_po, charges, grower_split, company, invoice_date, mapping_df, repack_set, repack_types
+            invoice_no, cust_po, charges, grower_split, company, invoice_date, maps, repack_set, repack_types,
+            crop=meta.get("Crop", DEFAULT_CROP),
         )
         if fail_reason:
             # Keep it failed, but show why
@@ -390,196 +247,564 @@ def _process_manual_keys(keys_for_setup):
 
         new_rows.extend(rows)
         st.session_state.processed_keys.add(repack_key)
+        done_keys.append(k)
         processed += 1
 
     if new_rows:
-        st.session_state.all_rows = (st.session_state.all_rows or []) + new_rows
+        st.session_state.all_rows.extend(new_rows)
+        _results_changed()
+
+    # Allocated invoices leave the failed table and their UI state is dropped
+    if done_keys:
+        _evict_keys(done_keys)
+        st.session_state.failed_rows = [r for r in st.session_state.failed_rows if r["Key"] not in set(done_keys)]
+        _results_changed()
 
+    if missing:
+        st.warning(f"Invoice details no longer in memory (run the batch again): {', '.join(missing)}")
     if processed:
         st.success(f"Processed {processed} invoice(s) via manual allocation.")
     if skipped and not processed:
         st.info("No invoices were processed (missing allocations, missing PO, or mapping issues).")
 
 
-# -------------------------
-# Display results from session_state (2-column layout)
-# -------------------------
-all_rows = st.session_state.get("all_rows", [])
-failed_rows = st.session_state.get("failed_rows", [])
-
-left, right = st.columns([1.6, 1.0], gap="large")
+def main():
+    st.set_page_config(page_title="Invoice Splitter for MYOB", layout="wide")
+
+    st.markdown("""
+    <style>
+      .block-container { max-width: 100%; padding-left: 3rem; padding-right: 3rem; }
+    </style>
+    """, unsafe_allow_html=True)
+
+    st.title("Invoice Splitter for MYOB")
+
+    consignee_state_map = _get_consignee_state_map()
+    _init_session_state()
+
+    # -------------------------
+    # Uploads (3 across)
+    # -------------------------
+    u1, u2, u3 = st.columns(3)
+    with u1:
+        uploaded_pdfs = st.file_uploader("Upload Invoice PDFs", type="pdf", accept_multiple_files=True)
+    with u2:
+        uploaded_excel = st.file_uploader("Upload Consignment Summary Excel", type=["xlsx"])
+
+    with u3:
+        uploaded_maps = st.file_uploader("Upload Account Maps Excel", type=["xlsx"])
+
+    # Build grower dropdown options directly from Account Maps (Supplier column)
+    if uploaded_maps is not None:
+        try:
+            # Only reload if different file (name/size token)
+            token = (getattr(uploaded_maps, "name", None), getattr(uploaded_maps, "size", None))
+            if st.session_state.get("_maps_token") != token:
+                mapping_df_preview = pd.read_excel(uploaded_maps)
+                st.session_state.mapping_df = mapping_df_preview
+                st.session_state.maps_index = MapIndex(mapping_df_preview)
+                st.session_state._maps_token = token
+            mapping_df_for_opts = st.session_state.mapping_df
+            if mapping_df_for_opts is not None and "Supplier" in mapping_df_for_opts.columns:
+                opts = (
+                    mapping_df_for_opts["Supplier"]
+                    .dropna()
+                    .astype(str)
+                    .str.strip()
+                    .loc[lambda s: s.ne("") & s.str.lower().ne("nan") & s.str.lower().ne("none")]
+                    .unique()
+                    .tolist()
+                )
+                st.session_state.grower_options = sorted(opts, key=str.lower)
+            else:
+                st.session_state.grower_options = []
+        except Exception:
+            st.session_state.grower_options = []
 
-# -------------------------
-# LEFT: Processed + Failed
-# -------------------------
-with left:
-     # Success table + download
-     if all_rows:
-         df_out = pd.DataFrame(all_rows)
-         df_export = group_with_blank_lines(df_out, "Supplier Invoice No.")
-         st.subheader("Processed Invoices")
-         st.dataframe(df_export, use_container_width=True)
-         txt = to_tab_delimited_with_header(df_export)
-         st.download_button("Download MYOB Import File", txt, "myob_import.txt", "text/plain")
-     elif run:
-         st.info("No invoices were successfully processed.")
-
-     # Failed table + actions
-     manual_keys = []
-     if failed_rows:
-         st.subheader("Failed Invoices (With Reasons)")
-
-         failed_df = pd.DataFrame(failed_rows)
-
-         # Hide Key from display, but keep it in the data we carry around
-         display_df = failed_df.drop(columns=["Key"], errors="ignore").copy()
-
-         # Add a single action column (editable checkbox)
-         if "Manual Allocation" not in display_df.columns:
-             display_df["Manual Allocation"] = False
-
-         if "failed_actions" not in st.session_state:
-             st.session_state.failed_actions = {}
-
-         keys = failed_df["Key"].tolist()
-
-         display_df["Manual Allocation"] = [
-             st.session_state.failed_actions.get(k, {}).get("Manual Allocation", False)
-             for k in keys
-         ]
-
-         edited = st.data_editor(
-             display_df,
-             use_container_width=True,
-             hide_index=True,
-             disabled=["Company", "Invoice No.", "PO No.", "Reason"],
-             key="failed_actions_editor",
-         )
-
-         for i, k in enumerate(keys):
-             st.session_state.failed_actions[k] = {
-                 "Manual Allocation": bool(edited.loc[i, "Manual Allocation"]),
-             }
+    # Check the maps against the FT growers before any PDF is processed (see maps_check.py)
+    if uploaded_maps is not None and st.session_state.maps_index is not None:
+        ft_token = (uploaded_excel.name, uploaded_excel.size) if uploaded_excel is not None else None
+        report_token = (st.session_state._maps_token, ft_token)
+        if st.session_state.get("_maps_report_token") != report_token:
+            try:
+                ft_df = pd.read_excel(io.BytesIO(uploaded_excel.getvalue())) if uploaded_excel is not None else None
+                st.session_state.maps_report = check_maps(
+                    st.session_state.mapping_df, ft_df, index=st.session_state.maps_index
+                )
+            except Exception as e:
+                st.session_state.maps_report = None
+                st.warning(f"Could not check Account Maps: {e}")
+            st.session_state._maps_report_token = report_token
+
+        report = st.session_state.maps_report
+        if report is not None:
+            problems = has_problems(report)
+            with st.expander("Account Maps check" + (" - problems found" if problems else " - ok"), expanded=problems):
+                if report["missing_columns"]:
+                    st.error(f"Missing columns: {', '.join(report['missing_columns'])}")
+                if uploaded_excel is None:
+                    st.caption("Upload the Consignment Summary to also check its growers against the maps.")
+                st.dataframe(report["summary"], use_container_width=True, hide_index=True)
+                m1, m2, m3 = st.tabs(["Unmapped FT growers", "Duplicate Suppliers", "Blank fields"])
+                m1.dataframe(report["unmapped"], use_container_width=True, hide_index=True)
+                m2.dataframe(report["duplicates"], use_container_width=True, hide_index=True)
+                m3.dataframe(report["blank_fields"], use_container_width=True, hide_index=True)
+
+    use_history = st.checkbox(
+        "Add FT to consignment history (match late invoices against earlier exports)",
+        value=False,
+    )
+    resume = st.checkbox(
+        "Resume interrupted batch (skip invoices already processed for these same files)",
+        value=True,
+    )
+
+    run = st.button(
+        "Run Processing",
+        type="primary",
+        disabled=not (uploaded_pdfs and uploaded_excel and uploaded_maps),
+    )
+
+
+    # -------------------------
+    # Background jobs (local job server, see jobs.py)
+    # -------------------------
+    jobs_url = os.environ.get("INVOICE_JOBS_URL", f"http://127.0.0.1:{jobs.DEFAULT_PORT}")
+
+    with st.expander("Background processing"):
+        st.caption(f"Job server: {jobs_url} (start with `python jobs.py`). Results survive closing this tab.")
+        if st.button("Submit batch to job server", disabled=not (uploaded_pdfs and uploaded_excel and uploaded_maps)):
+            try:
+                job_id = jobs.submit_batch(
+                    jobs_url,
+                    [(p.name, p.getvalue()) for p in uploaded_pdfs],
+                    (uploaded_excel.name, uploaded_excel.getvalue()),
+                    (uploaded_maps.name, uploaded_maps.getvalue()),
+                )
+                st.success(f"Submitted job {job_id}.")
+            except OSError as e:
+                st.error(f"Could not reach job server: {e}")
+
+        try:
+            job_list = jobs.list_jobs(jobs_url)
+        except OSError:
+            job_list = []
+
+        if job_list:
+            st.button("Refresh")
+            st.dataframe(
+                pd.DataFrame(job_list)[["id", "status", "done", "total", "error"]],
+                use_container_width=True,
+                hide_index=True,
+            )
+            done_ids = [j["id"] for j in job_list if j["status"] == "done"]
+            if done_ids:
+                c1, c2 = st.columns([3, 1])
+                pick = c1.selectbox("Finished job", done_ids, label_visibility="collapsed")
+                if c2.button("Load results"):
+                    res = jobs.job_result(jobs_url, pick)
+                    failed_keys = {r["Key"] for r in res["failed"]}
+                    st.session_state.invoice_meta.retain(st.session_state.manual_jobs)
+                    for k, m in res["meta"].items():
+                        # only failed invoices need their meta (manual allocation)
+                        if k in failed_keys:
+                            st.session_state.invoice_meta.put(k, m, pinned=st.session_state.manual_jobs)
+                        st.session_state.all_growers.update(g for g in m.get("Growers", []) if g)
+                    st.session_state.all_rows = RowStore(res["rows"])
+                    st.session_state.failed_rows = res["failed"]
+                    st.session_state.processed_keys = set(res["meta"]) - failed_keys
+                    _results_changed()
+                    _enforce_session_budget()
+                    st.rerun()
+
+
+    # -------------------------
+    # Processing (ONLY when Run clicked)
+    # -------------------------
+    if run and uploaded_pdfs and uploaded_excel and uploaded_maps:
+        # mapping_df was already loaded from uploaded Account Maps
+        mapping_df = st.session_state.mapping_df
+
+        all_rows, failed_rows = RowStore(), []
+
+        # FT lookups go to the uploaded workbook, or to the full history store
+        ft_source = uploaded_excel
+        run_ft_df = None  # this run's FT when lookups go to the history (reconciliation uses it)
+        if use_history:
+            ft_source = ConsignmentStore(Path(__file__).resolve().parent / "data" / "consignments.sqlite")
+            run_ft_df = pd.read_excel(io.BytesIO(uploaded_excel.getvalue()))
+            added = ft_source.ingest(run_ft_df)
+            st.caption(f"Consignment history: {added:+d} row(s), {len(ft_source)} total.")
+
+        maps = st.session_state.maps_index if st.session_state.maps_index is not None else mapping_df
+        pipeline = Pipeline(ft_source, maps, consignee_state_map)
+        parsed_invoices = []  # every parsed invoice, for FT <-> invoice reconciliation
+
+        # Each invoice's outcome is journaled as it completes (see journal.py)
+        file_ids = [file_id(pdf.name, pdf.getvalue()) for pdf in uploaded_pdfs]
+        # Everything process() depends on is in the ID, so changed inputs never resume stale outcomes
+        repack = json.dumps({k: sorted(v) for k, v in st.session_state.repack_growers.items()}, sort_keys=True)
+        batch = batch_id(
+            file_ids, uploaded_excel.getvalue(), uploaded_maps.getvalue(), b"history" if use_history else b"",
+            repack.encode(), CONSIGNEES_PATH.read_bytes() if CONSIGNEES_PATH.exists() else b"",
+        )
+        journal = BatchJournal(batch)
+        if not resume:
+            journal.discard()
+        elif len(journal):
+            st.caption(f"Resuming batch {batch}: {len(journal)} of {len(file_ids)} invoice(s) already done.")
+
+        with st.spinner("Processing invoices..."):
+            progress = st.progress(0.0)
+            for i, (pdf, fid) in enumerate(zip(uploaded_pdfs, file_ids), 1):
+                if fid not in journal:
+                    try:
+                        result = pipeline.process(pdf, st.session_state.repack_growers)
+                    except Exception as e:
+                        result = unreadable_result(pdf.name, e)
+                    journal.record(fid, result)
+                progress.progress(i / len(file_ids))
+
+            # Batch results come from the journal (covers invoices done before a restart).
+            # processed_keys and invoice meta only cover this run's results (+ queued manual jobs).
+            st.session_state.processed_keys = set()
+            st.session_state.invoice_meta.retain(st.session_state.manual_jobs)
+            line_store = LineItemStore.load()
+            for entry in journal.entries():
+                key = entry["key"]
+                meta = entry["meta"]
+                line_store.add(key, meta.get("Company"), meta.get("Invoice No."), entry.get("lines", []))
+                parsed_invoices.append({c: meta.get(c) for c in ("Company", "Invoice No.", "PO No.", "Invoice Trays")})
+
+                # Track growers seen (for dropdowns in repack setup)
+                st.session_state.all_growers.update(g for g in meta.get("Growers", []) if g)
+
+                if entry["failure"]:
+                    # Failed invoices keep their meta so manual allocation can use totals/charges/date
+                    st.session_state.invoice_meta.put(key, meta, pinned=st.session_state.manual_jobs)
+                    failed_rows.append(entry["failure"])
+                    continue
 
-         manual_keys = [k for k in keys if st.session_state.failed_actions[k]["Manual Allocation"]]
+                if key not in st.session_state.processed_keys:
+                    all_rows.extend(entry["rows"])
+                    st.session_state.processed_keys.add(key)
 
-         if st.button("Run Reallocation", type="primary"):
-             for k in manual_keys:
-                 st.session_state.manual_jobs[k] = True
-                 if k not in st.session_state.repack_allocations:
-                     st.session_state.repack_allocations[k] = _default_repack_allocations_for_key(k)
-             st.rerun()
+            line_store.save()
+            # Results are in the session now; the journal only matters for an interrupted run
+            journal.discard()
+            # Against the uploaded FT only: POs from earlier months in the history aren't unbilled
+            st.session_state.reconciliation = reconcile(
+                run_ft_df if run_ft_df is not None else pipeline.ft_frame(), parsed_invoices
+            )
 
-# -------------------------
-# RIGHT: Repack + Reprocess setup panels
-# -------------------------
-with right:
-     # -------------------------
-     # Repack Setup + processing
-     # -------------------------
-     if st.session_state.get("manual_jobs"):
-         st.subheader("Manual Allocation Setup")
-
-         # keys the user has queued for manual allocation
-         keys_for_setup = list(st.session_state.manual_jobs.keys())
-         if not keys_for_setup:
-             st.info("No invoices queued for manual allocation. Select invoices in the Failed table and click Apply.")
-         else:
-             st.caption("Enter tray counts per grower. Percentages are calculated as trays / total trays entered.")
-             st.caption("Tick 'Repack' per grower to route Logistics and Freight to repack accounts. Unticked growers use normal accounts.")
-
-             for k in keys_for_setup:
-                 meta = st.session_state.invoice_meta.get(k, {})
-                 if not meta:
-                     continue
-
-                 header = f"{meta.get('Company','')} | Inv {meta.get('Invoice No.','')} | PO {meta.get('PO No.','')}"
-                 st.markdown(f"**{header}**")
-
-                 inv_trays = meta.get("Invoice Trays", None)
-                 if isinstance(inv_trays, (int, float)) and inv_trays:
-                     st.caption(f"Invoice trays parsed: {int(round(inv_trays))}")
-
-                 # Grower dropdown options: use ALL growers from Account Maps (Supplier column)
-                 grower_options = st.session_state.get("grower_options") or []
-                 # Ensure allocations exist in session
-                 if k not in st.session_state.repack_allocations:
-                     st.session_state.repack_allocations[k] = _default_repack_allocations_for_key(k)
-                 rows = list(st.session_state.repack_allocations.get(k, []))
-                 if not rows:
-                     rows = [{"Grower": "", "Trays": 0.0, "Repack": False}]
-
-                 # Header row
-                 h1, h2, h3, h4 = st.columns([5, 2, 1, 1])
-                 h1.markdown("**Grower**")
-                 h2.markdown("**Trays**")
-                 h3.markdown("**Repack**")
-                 h4.markdown("**Remove**")
-
-                 remove_at = None
-                 updated_rows = []
-                 for idx, r in enumerate(rows):
-                     c1, c2, c3, c4 = st.columns([5, 2, 1, 1])
-                     default_g = str(r.get("Grower","")).strip()
-                     # Keep current selection even if it is not in options
-                     options = list(grower_options)
-                     if default_g and default_g not in options:
-                         options = [default_g] + options
-                     grower = c1.selectbox(
-                         label="Grower",
-                         options=options if options else [""] ,
-                         index=(options.index(default_g) if (options and default_g in options) else 0),
-                         key=f"repack_{k}_grower_{idx}",
-                         label_visibility="collapsed",
-                     )
-                     trays = c2.number_input(
-                         label="Trays",
-                         min_value=0.0,
-                         step=1.0,
-                         value=float(r.get("Trays", 0.0) or 0.0),
-                         key=f"repack_{k}_trays_{idx}",
-                         label_visibility="collapsed",
-                     )
-                     repack_flag = c3.checkbox(
-                         label="Repack",
-                         value=bool(r.get("Repack", False)),
-                         key=f"repack_{k}_flag_{idx}",
-                         label_visibility="collapsed",
-                     )
-                     if c4.button("🗑️", key=f"repack_{k}_remove_{idx}"):
-                         remove_at = idx
-                     updated_rows.append({"Grower": str(grower).strip(), "Trays": float(trays), "Repack": bool(repack_flag)})
-
-                 # Remove row action
-                 if remove_at is not None:
-                     try:
-                         updated_rows.pop(remove_at)
-                     except Exception:
-                         pass
+        # Save results for UI interactions (checkbox ticks won't reprocess)
+        st.session_state.all_rows = all_rows
+        st.session_state.failed_rows = failed_rows
+        _results_changed()
+
+        # Only this run's invoices (and any still queued for manual allocation) stay in memory
+        live = {r["Key"] for r in failed_rows} | set(st.session_state.manual_jobs)
+        st.session_state.invoice_meta.retain(live)
+        st.session_state.failed_actions &= live
+        _enforce_session_budget()
+
+    # -------------------------
+    # Display results from session_state (2-column layout)
+    # -------------------------
+    all_rows = st.session_state.get("all_rows") or RowStore()
+    failed_rows = st.session_state.get("failed_rows", [])
+
+    left, right = st.columns([1.6, 1.0], gap="large")
+
+    # -------------------------
+    # LEFT: Processed + Failed
+    # -------------------------
+    with left:
+         preview = st.session_state.preview
+         preview.sync(st.session_state.results_version, all_rows, failed_rows)
+
+         # Success table + download
+         if all_rows:
+             st.subheader("Processed Invoices")
+             st.dataframe(preview["rows_summary"], use_container_width=True, hide_index=True)
+
+             f1, f2, f3, f4 = st.columns([2, 2, 2, 1])
+             row_filters = {
+                 "Co./Last Name": f1.text_input("Company", key="rows_f_company"),
+                 "Supplier Invoice No.": f2.text_input("Invoice", key="rows_f_invoice"),
+                 "Grower": f3.text_input("Grower", key="rows_f_grower"),
+             }
+             rows_size = f4.selectbox("Rows", PAGE_SIZES, key="rows_page_size")
+             rows_page = st.session_state.get("rows_page", 1)
+             page_df, n_pages, n_lines = preview.page("rows", row_filters, rows_page, rows_size)
+             st.dataframe(page_df, use_container_width=True)
+             st.number_input(
+                 f"Page (of {n_pages}, {n_lines} lines)", min_value=1, max_value=n_pages,
+                 value=min(rows_page, n_pages), key="rows_page",
+             )
+
+             txt = preview.export_text()
+             if st.download_button("Download MYOB Import File", txt, "myob_import.txt", "text/plain"):
+                 # Keep the allocation lines for finance rollups (invoices already kept are skipped)
+                 try:
+                     history_store.write_batch(all_rows.to_records())
+                 except ImportError as e:
+                     st.warning(str(e))
+                 # Exported: per-invoice meta for the processed invoices is no longer needed
+                 st.session_state.invoice_meta.evict(
+                     [k for k in list(st.session_state.invoice_meta) if k in st.session_state.processed_keys]
+                 )
+         elif run:
+             st.info("No invoices were successfully processed.")
+
+         # Failed table + actions
+         manual_keys = []
+         if failed_rows:
+             st.subheader("Failed Invoices (With Reasons)")
+             st.dataframe(preview["failed_summary"], use_container_width=True, hide_index=True)
+
+             failed_all = preview["failed"]
+             f1, f2, f3, f4 = st.columns([2, 2, 2, 1])
+             failed_filters = {
+                 "Company": f1.text_input("Company", key="failed_f_company"),
+                 "Invoice No.": f2.text_input("Invoice", key="failed_f_invoice"),
+                 "Reason": f3.selectbox(
+                     "Reason", [""] + sorted(failed_all["Reason"].map(reason_kind).unique()), key="failed_f_reason"
+                 ),
+             }
+             failed_size = f4.selectbox("Rows", PAGE_SIZES, key="failed_page_size")
+             failed_page = st.session_state.get("failed_page", 1)
+             failed_df, n_pages, n_failed = preview.page("failed", failed_filters, failed_page, failed_size)
+             failed_df = failed_df.reset_index(drop=True)
+
+             # Hide Key from display, but keep it in the data we carry around
+             display_df = failed_df.drop(columns=["Key"], errors="ignore").copy()
+
+             # Add a single action column (editable checkbox)
+             if "Manual Allocation" not in display_df.columns:
+                 display_df["Manual Allocation"] = False
+
+             keys = failed_df["Key"].tolist()
+
+             display_df["Manual Allocation"] = [k in st.session_state.failed_actions for k in keys]
+
+             edited = st.data_editor(
+                 display_df,
+                 use_container_width=True,
+                 hide_index=True,
+                 disabled=["Company", "Invoice No.", "PO No.", "Reason", "Suggested POs"],
+                 key=f"failed_actions_editor_{st.session_state.results_version}_{hash(tuple(failed_filters.values()))}_{failed_page}_{failed_size}",
+             )
+             st.number_input(
+                 f"Page (of {n_pages}, {n_failed} invoices)", min_value=1, max_value=n_pages,
+                 value=min(failed_page, n_pages), key="failed_page",
+             )
+
+             for i, k in enumerate(keys):
+                 if bool(edited.loc[i, "Manual Allocation"]):
+                     st.session_state.failed_actions.add(k)
+                 else:
+                     st.session_state.failed_actions.discard(k)
+
+             # Ticks persist across pages and filters
+             manual_keys = [k for k in failed_all["Key"].tolist() if k in st.session_state.failed_actions]
+
+             if st.button("Run Reallocation", type="primary"):
+                 for k in manual_keys:
+                     st.session_state.manual_jobs[k] = True
+                     if k not in st.session_state.repack_allocations:
+                         st.session_state.repack_allocations[k] = _default_repack_allocations_for_key(k)
+                 st.rerun()
+
+    # -------------------------
+    # RIGHT: Repack + Reprocess setup panels
+    # -------------------------
+    with right:
+         # -------------------------
+         # Repack Setup + processing
+         # -------------------------
+         if st.session_state.get("manual_jobs"):
+             st.subheader("Manual Allocation Setup")
+
+             # keys the user has queued for manual allocation
+             keys_for_setup = list(st.session_state.manual_jobs.keys())
+             if not keys_for_setup:
+                 st.info("No invoices queued for manual allocation. Select invoices in the Failed table and click Apply.")
+             else:
+                 st.caption("Enter tray counts per grower. Percentages are calculated as trays / total trays entered.")
+                 st.caption("Tick 'Repack' per grower to route Logistics and Freight to repack accounts. Unticked growers use normal accounts.")
+
+                 for k in keys_for_setup:
+                     meta = st.session_state.invoice_meta.get(k, {})
+                     if not meta:
+                         st.warning(f"{k}: invoice details no longer in memory, run the batch again.")
+                         continue
+
+                     header = f"{meta.get('Company','')} | Inv {meta.get('Invoice No.','')} | PO {meta.get('PO No.','')}"
+                     st.markdown(f"**{header}**")
+
+                     inv_trays = meta.get("Invoice Trays", None)
+                     if isinstance(inv_trays, (int, float)) and inv_trays:
+                         st.caption(f"Invoice trays parsed: {int(round(inv_trays))}")
+
+                     # Grower dropdown options: use ALL growers from Account Maps (Supplier column)
+                     grower_options = st.session_state.get("grower_options") or []
+                     # Ensure allocations exist in session
+                     if k not in st.session_state.repack_allocations:
+                         st.session_state.repack_allocations[k] = _default_repack_allocations_for_key(k)
+                     rows = list(st.session_state.repack_allocations.get(k, []))
+                     if not rows:
+                         rows = [AllocRow("", 0.0, False)]
+
+                     # Header row
+                     h1, h2, h3, h4 = st.columns([5, 2, 1, 1])
+                     h1.markdown("**Grower**")
+                     h2.markdown("**Trays**")
+                     h3.markdown("**Repack**")
+                     h4.markdown("**Remove**")
+
+                     remove_at = None
+                     updated_rows = []
+                     for idx, r in enumerate(rows):
+                         c1, c2, c3, c4 = st.columns([5, 2, 1, 1])
+                         default_g = str(r.Grower).strip()
+                         # Keep current selection even if it is not in options
+                         options = list(grower_options)
+                         if default_g and default_g not in options:
+                             options = [default_g] + options
+                         grower = c1.selectbox(
+                             label="Grower",
+                             options=options if options else [""] ,
+                             index=(options.index(default_g) if (options and default_g in options) else 0),
+                             key=f"repack_{k}_grower_{idx}",
+                             label_visibility="collapsed",
+                         )
+                         trays = c2.number_input(
+                             label="Trays",
+                             min_value=0.0,
+                             step=1.0,
+                             value=float(r.Trays or 0.0),
+                             key=f"repack_{k}_trays_{idx}",
+                             label_visibility="collapsed",
+                         )
+                         repack_flag = c3.checkbox(
+                             label="Repack",
+                             value=bool(r.Repack),
+                             key=f"repack_{k}_flag_{idx}",
+                             label_visibility="collapsed",
+                         )
+                         if c4.button("🗑️", key=f"repack_{k}_remove_{idx}"):
+                             remove_at = idx
+                         updated_rows.append({"Grower": str(grower).strip(), "Trays": float(trays), "Repack": bool(repack_flag)})
+
+                     # Remove row action
+                     if remove_at is not None:
+                         try:
+                             updated_rows.pop(remove_at)
+                         except Exception:
+                             pass
+                         _save_allocations_rows(k, updated_rows)
+                         st.rerun()
+
+                     a1, a2 = st.columns([1, 3])
+                     if a1.button("Add grower", key=f"repack_{k}_add"):
+                         default_new = {"Grower": (grower_options[0] if grower_options else ""), "Trays": 0.0, "Repack": False}
+                         updated_rows.append(default_new)
+                         _save_allocations_rows(k, updated_rows)
+                         st.rerun()
+
+                     # Save current edits
                      _save_allocations_rows(k, updated_rows)
-                     st.rerun()
 
-                 a1, a2 = st.columns([1, 3])
-                 if a1.button("Add grower", key=f"repack_{k}_add"):
-                     default_new = {"Grower": (grower_options[0] if grower_options else ""), "Trays": 0.0, "Repack": False}
-                     updated_rows.append(default_new)
-                     _save_allocations_rows(k, updated_rows)
-                     st.rerun()
-
-                 # Save current edits
-                 _save_allocations_rows(k, updated_rows)
-
-                 saved = pd.DataFrame(st.session_state.repack_allocations.get(k, []), columns=["Grower", "Trays", "Repack"])
-                 saved = saved.copy()
-                 saved["Trays"] = pd.to_numeric(saved["Trays"], errors="coerce").fillna(0.0)
-                 saved["Grower"] = saved["Grower"].astype(str).str.strip()
-                 preview = saved[(saved["Grower"] != "") & (saved["Trays"] > 0)]
-                 if not preview.empty:
-                     total = float(preview["Trays"].sum())
-                     preview["%"] = (preview["Trays"] / total).round(4)
-                     st.dataframe(preview[["Grower", "Trays", "%", "Repack"]], use_container_width=True, hide_index=True)
-                 else:
-                     st.info("Add growers and tray counts above (rows with 0 trays are ignored).")
+                     saved = pd.DataFrame(st.session_state.repack_allocations.get(k, []), columns=["Grower", "Trays", "Repack"])
+                     saved = saved.copy()
+                     saved["Trays"] = pd.to_numeric(saved["Trays"], errors="coerce").fillna(0.0)
+                     saved["Grower"] = saved["Grower"].astype(str).str.strip()
+                     preview = saved[(saved["Grower"] != "") & (saved["Trays"] > 0)]
+                     if not preview.empty:
+                         total = float(preview["Trays"].sum())
+                         preview["%"] = (preview["Trays"] / total).round(4)
+                         st.dataframe(preview[["Grower", "Trays", "%", "Repack"]], use_container_width=True, hide_index=True)
+                     else:
+                         st.info("Add growers and tray counts above (rows with 0 trays are ignored).")
+
+                 if st.button("Process Manual Allocations → Add to MYOB Export", type="primary"):
+                     _process_manual_keys(keys_for_setup)
+
+    # -------------------------
+    # FT <-> invoice reconciliation (last run)
+    # -------------------------
+    recon = st.session_state.get("reconciliation")
+    if recon is not None:
+        with st.expander("Reconciliation: unbilled POs and tray gaps"):
+            st.dataframe(recon["summary"], use_container_width=True, hide_index=True)
+            t1, t2, t3 = st.tabs(["FT POs with no invoice", "Invoices with no FT PO", "Tray deltas"])
+            t1.dataframe(recon["unmatched_pos"], use_container_width=True, hide_index=True)
+            t2.dataframe(recon["unmatched_invoices"], use_container_width=True, hide_index=True)
+            t3.dataframe(recon["tray_deltas"], use_container_width=True, hide_index=True)
+
+    # -------------------------
+    # Invoice lines (stored at parse time, no PDF needed)
+    # -------------------------
+    with st.expander("Invoice lines"):
+        store = _line_store()
+        st.caption(f"{len(store):,} invoice(s) on file.")
+        c1, c2 = st.columns(2)
+        invoice_q = c1.text_input("Invoice No.", "", key="lines_invoice").strip()
+        picked = c2.selectbox("Or a failed invoice", [""] + [r["Key"] for r in failed_rows], key="lines_failed")
+        keys = [picked] if picked else [k for k in store if invoice_q and k.split("|")[1] == invoice_q]
+        if keys:
+            st.dataframe(store.frame(keys), use_container_width=True, hide_index=True)
+            for k in keys:
+                meta = st.session_state.invoice_meta.get(k)
+                ft_trays = meta.get("FT Trays") if meta else None
+                ft_note = f" v {ft_trays:g} FT trays" if isinstance(ft_trays, (int, float)) else ""
+                st.caption(f"{k}: {store.trays(k)} invoice trays from lines{ft_note}")
+        elif invoice_q:
+            st.info("No stored lines for that invoice.")
+
+    # -------------------------
+    # Allocation history (written on each MYOB download)
+    # -------------------------
+    with st.expander("Allocation history"):
+        h1, h2, h3 = st.columns(3)
+        by = h1.multiselect("Group by", history_store.DIMENSIONS, default=["grower", "account"])
+        period_from = h2.text_input("From period (YYYY-MM)", "")
+        period_to = h3.text_input("To period (YYYY-MM)", "")
+        f1, f2, f3 = st.columns(3)
+        grower_f = f1.text_input("Grower", "")
+        account_f = f2.text_input("Account", "")
+        job_f = f3.text_input("Job", "")
+        if st.button("Run rollup", disabled=not by):
+            try:
+                st.dataframe(
+                    history_store.rollup(
+                        by,
+                        period_from=period_from.strip() or None,
+                        period_to=period_to.strip() or None,
+                        grower=grower_f.strip() or None,
+                        account=account_f.strip() or None,
+                        job=job_f.strip() or None,
+                    ),
+                    use_container_width=True,
+                    hide_index=True,
+                )
+            except ImportError as e:
+                st.warning(str(e))
+
+    # -------------------------
+    # Session memory
+    # -------------------------
+    with st.expander("Session memory"):
+        report, total_bytes, per_invoice = memory_report({
+            name: st.session_state.get(name) for name in _BUDGETED_STATE
+        })
+        st.caption(
+            f"{total_bytes / 1024:,.0f} KiB of {SESSION_BUDGET_BYTES / 1024 / 1024:,.0f} MiB budget"
+            f" · {per_invoice:,.0f} bytes per invoice"
+        )
+        st.dataframe(pd.DataFrame(report), use_container_width=True, hide_index=True)
+
 
-             if st.button("Process Manual Allocations → Add to MYOB Export", type="primary"):
-                 _process_manual_keys(keys_for_setup)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
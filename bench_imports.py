@@ -0,0 +1,76 @@
+"""Import-time benchmark for the core modules.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter for each
+module, reports the cumulative import time against a reference budget and
+fails (exit 1) only if a module pulls in a heavy dependency at import. Timings
+depend on the machine, so over-budget modules are flagged ("slow") but do not
+fail; tests/test_imports.py runs the same heavy-package check under pytest:
+
+    python bench_imports.py
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# module -> reference cumulative import time in milliseconds (informational)
+BUDGETS_MS = {
+    "constants": 20,
+    "utils": 30,
+    "parsers": 60,
+    "excel_ops": 40,
+    "allocator": 30,
+    "exporter": 30,
+    "pipeline": 80,
+}
+
+# Must only be imported on the code path that needs them
+HEAVY = ("pandas", "numpy", "pdfplumber", "pdfminer", "pypdfium2", "pyarrow", "streamlit")
+
+
+def import_profile(module: str, repeat: int = 3):
+    """Returns (best cumulative ms for `module`, set of top-level packages imported)."""
+    best, packages = None, set()
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=BASE_DIR,
+            capture_output=True,
+            text=True,
+            env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+        cumulative = None
+        for line in proc.stderr.splitlines():
+            # "import time: self [us] | cumulative | imported package"
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            parts = [p.strip() for p in line[len("import time:"):].split("|")]
+            if not parts[1].isdigit():
+                continue
+            name = parts[2].strip()
+            packages.add(name.split(".")[0])
+            if name == module:
+                cumulative = int(parts[1]) / 1000
+        if cumulative is not None:
+            best = cumulative if best is None else min(best, cumulative)
+    return best, packages
+
+
+def main():
+    failed = False
+    for module, budget in BUDGETS_MS.items():
+        ms, packages = import_profile(module)
+        heavy = sorted(p for p in HEAVY if p in packages)
+        failed |= bool(heavy)
+        status = "FAIL" if heavy else ("slow" if ms is None or ms > budget else "ok")
+        extra = f"  heavy: {', '.join(heavy)}" if heavy else ""
+        print(f"{module:12s} {ms or 0.0:8.1f} ms  (budget {budget} ms)  {status}{extra}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
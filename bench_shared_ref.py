@@ -0,0 +1,171 @@
+"""Worker start-up benchmark: pickled reference data vs shared-memory tables.
+
+Starts N worker processes (spawn, as on macOS/Windows and for fresh
+interpreters) that each need the Account Maps and FT summary, two ways:
+
+    pickle  mapping_df + FT frame passed to every worker and unpickled there
+    shm     RefTables published once; each worker attaches by segment name
+
+Each worker then runs the same grower-split + account lookups and reports its
+load/attach time, RSS and PSS (proportional set size: shared pages are split
+between the processes mapping them, so it shows what a worker really costs):
+
+    python bench_shared_ref.py [--workers 4] [--suppliers 10000] [--ft-rows 200000]
+"""
+import argparse
+import multiprocessing as mp
+import os
+import random
+import time
+
+
+def synthetic(n_suppliers: int, n_rows: int, seed: int = 7):
+    """(mapping_df, ft_df) shaped like the real uploads."""
+    import pandas as pd
+    from constants import (
+        CONSIGNOR_COL, SUPPLIER_COL, PO_COL, TRAYS_COL, CROP_COL, CONSIGNEE_COL, DATE_COL,
+        COMPANY_CONSIGNORS,
+    )
+
+    rnd = random.Random(seed)
+    growers = [f"Grower {i:05d}" for i in range(n_suppliers)]
+    mapping_df = pd.DataFrame({
+        "Supplier": growers,
+        "Logistics Account": [51000 + i for i in range(n_suppliers)],
+        "Freight Account": [52000 + i for i in range(n_suppliers)],
+        "Repack Logistics Account": [53000 + i if i % 5 == 0 else None for i in range(n_suppliers)],
+        "Repack Freight Account": [54000 + i if i % 5 == 0 else None for i in range(n_suppliers)],
+        "Job Code": [f"J{i % 300:03d}" for i in range(n_suppliers)],
+    })
+    consignors = [c for cs in COMPANY_CONSIGNORS.values() for c in cs] + ["Other Consignor"]
+    crops = ["Blueberries", "Raspberry", "Strawberries", "Cherries"]
+    n_pos = max(1, n_rows // 4)
+    ft_df = pd.DataFrame({
+        CONSIGNOR_COL: [rnd.choice(consignors) for _ in range(n_rows)],
+        PO_COL: [f"PO{rnd.randrange(n_pos)}" for _ in range(n_rows)],
+        SUPPLIER_COL: [rnd.choice(growers) for _ in range(n_rows)],
+        TRAYS_COL: [rnd.randrange(1, 120) for _ in range(n_rows)],
+        CROP_COL: [rnd.choice(crops) for _ in range(n_rows)],
+        CONSIGNEE_COL: [rnd.choice(["Sydney Markets", "Epping", "Rocklea"]) for _ in range(n_rows)],
+        DATE_COL: ["2026-01-05"] * n_rows,
+    })
+    return mapping_df, ft_df
+
+
+def _memory_kb():
+    """(RSS, PSS) of this process in kB (PSS is None where /proc has no smaps_rollup)."""
+    rss = pss = None
+    with open("/proc/self/status") as fh:
+        for line in fh:
+            if line.startswith("VmRSS:"):
+                rss = int(line.split()[1])
+    try:
+        with open("/proc/self/smaps_rollup") as fh:
+            for line in fh:
+                if line.startswith("Pss:"):
+                    pss = int(line.split()[1])
+    except OSError:
+        pass
+    return rss, pss
+
+
+def _lookups(ft_source, mapping, queries):
+    from allocator import mapping_lookup
+    from excel_ops import get_crop_splits
+
+    lookup = mapping_lookup(mapping)
+    hits = 0
+    for po, company in queries:
+        for splits, _, _ in get_crop_splits(ft_source, po, company).values():
+            hits += sum(lookup(g) is not None for g in splits)
+    return hits
+
+
+def _worker(mode, payload, queries, out):
+    import pandas  # noqa: F401  (both modes pay for the import; keep it out of the timing)
+    from excel_ops import FtIndex
+
+    t0 = time.perf_counter()
+    if mode == "pickle":
+        import pickle
+
+        mapping_df, ft_df = pickle.loads(payload)
+        ft_source, mapping = FtIndex(ft_df), mapping_df
+    else:
+        from shared_ref import RefTables
+
+        ft_source = mapping = RefTables.attach(payload)
+    load = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    hits = _lookups(ft_source, mapping, queries)
+    run = time.perf_counter() - t0
+    rss, pss = _memory_kb()
+    out.put((os.getpid(), load, run, hits, rss, pss))
+    if mode == "shm":
+        ft_source.close()
+
+
+def run(mode, payload, queries, workers: int):
+    ctx = mp.get_context("spawn")
+    out = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(mode, payload, queries, out)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    results = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return results
+
+
+def main():
+    import pickle
+
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--suppliers", type=int, default=10_000)
+    ap.add_argument("--ft-rows", type=int, default=200_000)
+    ap.add_argument("--queries", type=int, default=500)
+    args = ap.parse_args()
+
+    from constants import COMPANY_CONSIGNORS
+    from shared_ref import RefTables
+
+    mapping_df, ft_df = synthetic(args.suppliers, args.ft_rows)
+    rnd = random.Random(11)
+    companies = list(COMPANY_CONSIGNORS)
+    queries = [(f"PO{rnd.randrange(args.ft_rows // 4)}", rnd.choice(companies)) for _ in range(args.queries)]
+
+    t0 = time.perf_counter()
+    blob = pickle.dumps((mapping_df, ft_df), protocol=pickle.HIGHEST_PROTOCOL)
+    t_pickle = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    tables = RefTables.compile(mapping_df, ft_df)
+    t_compile = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    shm = tables.publish()
+    t_publish = time.perf_counter() - t0
+
+    print(f"{args.suppliers} suppliers, {args.ft_rows} FT rows, {args.workers} workers, {args.queries} lookups each")
+    print(f"pickle: {len(blob) / 1e6:.1f} MB, dumps {t_pickle * 1000:.0f} ms (once)")
+    print(f"shm:    {shm.size / 1e6:.1f} MB, compile {t_compile * 1000:.0f} ms + publish {t_publish * 1000:.0f} ms (once)")
+    print()
+    print(f"{'mode':6s} {'load/attach':>12s} {'lookups':>9s} {'RSS MB':>8s} {'PSS MB':>8s}")
+    hits = set()
+    try:
+        for mode, payload in (("pickle", blob), ("shm", shm.name)):
+            results = run(mode, payload, queries, args.workers)
+            hits.update(r[3] for r in results)
+            if len(hits) != 1:
+                raise RuntimeError(f"{mode}: lookups disagree with the other workers")
+            for _, load, took, _, rss, pss in results:
+                pss_mb = f"{pss / 1024:8.1f}" if pss is not None else f"{'-':>8s}"
+                print(f"{mode:6s} {load * 1000:9.1f} ms {took * 1000:6.0f} ms {rss / 1024:8.1f} {pss_mb}")
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+if __name__ == "__main__":
+    main()
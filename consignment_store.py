@@ -0,0 +1,141 @@
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Union
+
+import pandas as pd
+
+from utils import norm, digits_only
+from constants import (
+    CONSIGNOR_COL, SUPPLIER_COL, PO_COL, TRAYS_COL, CROP_COL, DATE_COL,
+    COMPANY_CONSIGNORS, CONSIGNEE_COL
+)
+from excel_ops import filter_company_rows
+
+# (sqlite column, FT column) in table order
+_COLUMNS = [
+    ("consignor", CONSIGNOR_COL),
+    ("po", PO_COL),
+    ("supplier", SUPPLIER_COL),
+    ("date", DATE_COL),
+    ("crop", CROP_COL),
+    ("consignee", CONSIGNEE_COL),
+    ("trays", TRAYS_COL),
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS consignments (
+    consignor TEXT NOT NULL,
+    po        TEXT NOT NULL,
+    supplier  TEXT NOT NULL,
+    date      TEXT NOT NULL,
+    crop      TEXT,
+    consignee TEXT,
+    trays     REAL,
+    po_norm   TEXT NOT NULL,
+    po_digits TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_consignments_po_norm   ON consignments (po_norm);
+CREATE INDEX IF NOT EXISTS ix_consignments_po_digits ON consignments (po_digits);
+CREATE INDEX IF NOT EXISTS ix_consignments_shipment  ON consignments (consignor, po, date);
+"""
+
+
+def _cell(v) -> str:
+    if v is None or (isinstance(v, float) and pd.isna(v)) or v is pd.NaT:
+        return ""
+    if isinstance(v, pd.Timestamp):
+        return v.date().isoformat()
+    return str(v).strip()
+
+
+class ConsignmentStore:
+    """Append-only local history of FT Consignment Summary exports.
+
+    An ingest replaces every stored row of each shipment (consignor, PO, date)
+    the export contains, so overlapping exports don't duplicate rows while
+    repeated lines within one export (several pallets or crops of one grower)
+    are all kept. Adding a month costs time proportional to that month's rows.
+    Lookups go through the po_norm / po_digits indexes and cover every
+    ingested export.
+    """
+
+    def __init__(self, db_path: Union[str, Path]):
+        self.db_path = str(db_path)
+        with self._connect() as con:
+            con.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        con = sqlite3.connect(self.db_path)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def ingest(self, excel_file) -> int:
+        """Adds an FT export (path, file-like or DataFrame), replacing the stored rows of
+           every shipment it contains. Returns the change in stored rows."""
+        df = excel_file if isinstance(excel_file, pd.DataFrame) else pd.read_excel(excel_file)
+
+        cols = {}
+        for _, ft_col in _COLUMNS:
+            cols[ft_col] = df[ft_col].tolist() if ft_col in df.columns else [None] * len(df)
+        trays = pd.to_numeric(pd.Series(cols[TRAYS_COL]), errors="coerce").fillna(0).tolist()
+
+        records = []
+        for i in range(len(df)):
+            consignor = _cell(cols[CONSIGNOR_COL][i])
+            po = _cell(cols[PO_COL][i])
+            if not consignor or not po:
+                continue
+            records.append((
+                consignor,
+                po,
+                _cell(cols[SUPPLIER_COL][i]),
+                _cell(cols[DATE_COL][i]),
+                _cell(cols[CROP_COL][i]),
+                _cell(cols[CONSIGNEE_COL][i]),
+                float(trays[i]),
+                norm(po),
+                digits_only(po),
+            ))
+
+        shipments = {(r[0], r[1], r[3]) for r in records}
+        with self._connect() as con:
+            before = con.total_changes
+            con.executemany("DELETE FROM consignments WHERE consignor = ? AND po = ? AND date = ?", shipments)
+            deleted = con.total_changes - before
+            con.executemany("INSERT INTO consignments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", records)
+            return len(records) - deleted
+
+    def _frame(self, sql: str, params=()) -> pd.DataFrame:
+        names = ", ".join(c for c, _ in _COLUMNS)
+        with self._connect() as con:
+            cur = con.execute(f"SELECT {names} FROM consignments {sql} ORDER BY rowid", params)
+            data = cur.fetchall()
+        return pd.DataFrame(data, columns=[ft_col for _, ft_col in _COLUMNS])
+
+    def po_rows(self, cust_po: str, company: str) -> pd.DataFrame:
+        """FT rows for the company matching cust_po (exact or digits-only), across all history."""
+        consignors = COMPANY_CONSIGNORS.get(company, [])
+        if not consignors:
+            return self._frame("WHERE 0")
+
+        cust_po_norm = norm(cust_po)
+        cust_po_digits = digits_only(cust_po)
+        marks = ", ".join("?" for _ in consignors)
+        df = self._frame(
+            f"WHERE consignor IN ({marks}) AND (po_norm = ? OR (? != '' AND po_digits = ?))",
+            (*consignors, cust_po_norm, cust_po_digits, cust_po_digits),
+        )
+        return filter_company_rows(df, company) if not df.empty else df
+
+    def frame(self) -> pd.DataFrame:
+        """Whole history as an FT-shaped DataFrame."""
+        return self._frame("")
+
+    def __len__(self):
+        with self._connect() as con:
+            return con.execute("SELECT COUNT(*) FROM consignments").fetchone()[0]
@@ -16,6 +16,48 @@ SUPPLIER_COL  = "Supplier"
 PO_COL        = "TBC Ref. (Po No)"
 TRAYS_COL     = "Trays"
 CROP_COL      = "Crop"
+DATE_COL      = "Date"
+
+# MYOB import columns, in export order
+MYOB_COLUMNS = [
+    "Co./Last Name", "Date", "Supplier Invoice No.", "Description",
+    "Account No.", "Amount", "Job", "Tax Code", "Comment",
+]
+
+# Crops handled end to end, in invoice/allocation order.
+#   ft_pattern     - regex (case-insensitive) on the FT Crop column
+#   line_pattern   - regex (case-insensitive) on an invoice product line
+#   tray_rate      - logistics $ per tray, used to show the tray count in the description
+#   logistics_desc / freight_desc - MYOB description templates ({trays}, {job})
+# Raspberry/Strawberry rates follow the blueberry rate until the 3PL rate cards say otherwise.
+CROPS = {
+    "Blueberry": {
+        "ft_pattern": r"blue\s*berr",
+        "line_pattern": r"BLUE.*BERR|BERR.*BLUE",
+        "tray_rate": 0.85,
+        "logistics_desc": "{trays} x Blueberry Logistics {job}",
+        "freight_desc": "Blueberry Freight {job}",
+    },
+    "Raspberry": {
+        "ft_pattern": r"rasp",
+        "line_pattern": r"RASP",
+        "tray_rate": 0.85,
+        "logistics_desc": "{trays} x Raspberry Logistics {job}",
+        "freight_desc": "Raspberry Freight {job}",
+    },
+    "Strawberry": {
+        "ft_pattern": r"straw",
+        "line_pattern": r"STRAW",
+        "tray_rate": 0.85,
+        "logistics_desc": "{trays} x Strawberry Logistics {job}",
+        "freight_desc": "Strawberry Freight {job}",
+    },
+}
+# Crop assumed for invoice lines that name no configured crop
+DEFAULT_CROP = "Blueberry"
+
+# Failures file columns (watcher / shard merge), File = source PDF
+FAILURE_COLUMNS = ["File", "Company", "Invoice No.", "PO No.", "Reason", "Suggested POs"]
 
 # Strict company→consignors
 COMPANY_CONSIGNORS = {
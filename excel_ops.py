@@ -1,24 +1,115 @@
-import pandas as pd
-from utils import norm, digits_only
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from utils import norm, digits_only, match_crop
 from constants import (
     CONSIGNOR_COL, SUPPLIER_COL, PO_COL, TRAYS_COL, CROP_COL,
-    COMPANY_CONSIGNORS, CONSIGNEE_COL
+    COMPANY_CONSIGNORS, CONSIGNEE_COL, DEFAULT_CROP
 )
 
-def get_grower_split(excel_file, cust_po: str, company: str):
-    """Strict: filter by consignor -> crop=Blueberry -> PO match (exact or digits-only).
-       Returns (splits: dict[grower->pct], total_trays: float, consignee: str|None)
-    """
-    df = pd.read_excel(excel_file)
+if TYPE_CHECKING:
+    import pandas as pd
+
+# consignor -> company (inverse of COMPANY_CONSIGNORS)
+CONSIGNOR_COMPANY = {c: company for company, cs in COMPANY_CONSIGNORS.items() for c in cs}
+
+
+def crop_series(df: pd.DataFrame) -> pd.Series:
+    """CROPS name for each FT row (None for crops we don't handle).
+       Patterns run once per distinct Crop value, not once per row."""
+    values = df[CROP_COL].astype(str)
+    return values.map({v: match_crop(v, "ft_pattern") for v in values.unique()})
+
+
+def filter_crop_rows(df: pd.DataFrame, crop: str = None) -> pd.DataFrame:
+    """Keep rows for `crop`, or for any configured crop if crop is None."""
+    crops = crop_series(df)
+    return df[crops.notna() if crop is None else (crops == crop)]
 
+
+def filter_company_rows(df: pd.DataFrame, company: str, crop: str = None) -> pd.DataFrame:
+    """Strict: keep rows for the company's consignors with a configured crop (or just `crop`)."""
     target_consignors = COMPANY_CONSIGNORS.get(company, [])
     df1 = df[df[CONSIGNOR_COL].astype(str).isin(target_consignors)]
     if df1.empty:
-        return {}, 0, None
+        return df1
+    return filter_crop_rows(df1, crop)
+
+
+class FtIndex:
+    """In-memory FT summary with a PO index, for long-running processes.
+
+    Built in one pass over the workbook, covering every configured crop; po_rows
+    answers exact / digits-only PO lookups without rescanning, so it can stand in
+    for the workbook in get_grower_split / get_crop_splits (same interface as
+    ConsignmentStore).
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df.reset_index(drop=True)
+        self.by_norm, self.by_digits = {}, {}
+        crops = crop_series(self.df).tolist()
+        for i, po in enumerate(self.df[PO_COL].astype(str).tolist()):
+            if crops[i] is None:
+                continue
+            self.by_norm.setdefault(norm(po), []).append(i)
+            d = digits_only(po)
+            if d:
+                self.by_digits.setdefault(d, []).append(i)
+
+    @classmethod
+    def from_excel(cls, excel_file) -> "FtIndex":
+        import pandas as pd
+        return cls(pd.read_excel(excel_file))
+
+    def po_rows(self, cust_po: str, company: str) -> pd.DataFrame:
+        hits = set(self.by_norm.get(norm(cust_po), ()))
+        d = digits_only(cust_po)
+        if d:
+            hits.update(self.by_digits.get(d, ()))
+        df_po = self.df.iloc[sorted(hits)]
+        return filter_company_rows(df_po, company) if not df_po.empty else df_po
 
-    df1 = df1[df1[CROP_COL].astype(str).str.contains(r"Blueberry", case=False, na=False)]
+    def frame(self) -> pd.DataFrame:
+        return self.df
+
+
+def get_grower_split(excel_file, cust_po: str, company: str, crop: str = DEFAULT_CROP):
+    """Strict: filter by consignor -> crop -> PO match (exact or digits-only).
+       Returns (splits: dict[grower->pct], total_trays: float, consignee: str|None)
+    """
+    return get_crop_splits(excel_file, cust_po, company).get(crop, ({}, 0, None))
+
+
+def get_crop_splits(excel_file, cust_po: str, company: str):
+    """One PO lookup for all crops.
+       Returns dict crop -> (splits, total_trays, consignee) for each crop the PO has in the FT.
+
+    excel_file may also be an FtIndex or ConsignmentStore (anything with .po_rows),
+    in which case the lookup runs against its PO index instead of re-reading a workbook,
+    or shared_ref.RefTables (.crop_splits), which answers from its compiled arrays.
+    """
+    if hasattr(excel_file, "crop_splits"):
+        return excel_file.crop_splits(cust_po, company)
+    df_po = _po_rows(excel_file, cust_po, company)
+    if df_po.empty:
+        return {}
+    crops = crop_series(df_po)
+    return {crop: split_from_po_rows(df_po[crops == crop]) for crop in crops.dropna().unique()}
+
+
+def _po_rows(excel_file, cust_po: str, company: str) -> pd.DataFrame:
+    if hasattr(excel_file, "po_rows"):
+        return excel_file.po_rows(cust_po, company)
+
+    import pandas as pd
+
+    df = pd.read_excel(excel_file)
+
+    df1 = filter_company_rows(df, company)
     if df1.empty:
-        return {}, 0, None
+        return df1
 
     cust_po_norm   = norm(cust_po)
     cust_po_digits = digits_only(cust_po)
@@ -29,7 +120,13 @@ def get_grower_split(excel_file, cust_po: str, company: str):
     po_mask = (po_norm_series == cust_po_norm) | (
         (cust_po_digits != "") & (po_digits_series == cust_po_digits)
     )
-    df_po = df1[po_mask]
+    return df1[po_mask]
+
+
+def split_from_po_rows(df_po: pd.DataFrame):
+    """Grower split from FT rows already matched to one PO (see get_grower_split)."""
+    import pandas as pd
+
     if df_po.empty:
         return {}, 0, None
 
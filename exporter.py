@@ -1,7 +1,16 @@
+from __future__ import annotations
+
 import io
-import pandas as pd
+from typing import TYPE_CHECKING
+
+from constants import MYOB_COLUMNS
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 def group_with_blank_lines(df: pd.DataFrame, group_col: str = "Supplier Invoice No.") -> pd.DataFrame:
+    import pandas as pd
+
     out = df.copy()
     out["_grp"] = out[group_col].astype(str)
     lines = []
@@ -11,6 +20,8 @@ def group_with_blank_lines(df: pd.DataFrame, group_col: str = "Supplier Invoice
     return pd.DataFrame(lines)
 
 def to_tab_delimited_with_header(df_export: pd.DataFrame) -> str:
+    # Only MYOB columns go in the file (rows also carry e.g. Grower for history/preview)
+    df_export = df_export[[c for c in df_export.columns if c in MYOB_COLUMNS]]
     buf = io.StringIO()
     buf.write("{}\n")  # MYOB header row required
     df_export.to_csv(buf, sep="\t", index=False, lineterminator="\r\n")
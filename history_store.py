@@ -0,0 +1,169 @@
+import hashlib
+from pathlib import Path
+from typing import Union
+
+import pandas as pd
+
+HISTORY_DIR = Path(__file__).resolve().parent / "data" / "history"
+
+# Columns a rollup can group or filter by
+DIMENSIONS = ["period", "company", "grower", "crop", "account", "job", "charge_type"]
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError("Allocation history needs pyarrow (pip install pyarrow)") from e
+
+
+def _history_frame(rows) -> pd.DataFrame:
+    """MYOB allocation rows -> typed history frame (one row per allocated line)."""
+    df = pd.DataFrame(rows)
+    df = df[df["Supplier Invoice No."].notna()]  # drop blank separator lines if any
+    dates = pd.to_datetime(df["Date"], dayfirst=True, format="mixed", errors="coerce")
+    return pd.DataFrame({
+        "period": dates.dt.strftime("%Y-%m").fillna("unknown"),
+        "company": df["Co./Last Name"].astype(str),
+        "date": dates.dt.date,
+        "invoice_no": df["Supplier Invoice No."].astype(str),
+        "po": df["Comment"].astype(str),
+        "grower": df["Grower"].astype(str) if "Grower" in df.columns else "",
+        "crop": df["Crop"].astype(str) if "Crop" in df.columns else "",
+        "account": df["Account No."].astype(str),
+        "job": df["Job"].astype(str),
+        "charge_type": df["Charge Type"].astype(str),
+        "description": df["Description"].astype(str),
+        "amount": pd.to_numeric(df["Amount"], errors="coerce").fillna(0.0),
+    })
+
+
+def _history_schema():
+    """Dataset schema, given explicitly so batches written before a column existed still scan (as nulls)."""
+    import pyarrow as pa
+
+    return pa.schema([
+        ("date", pa.date32()),
+        ("invoice_no", pa.string()),
+        ("po", pa.string()),
+        ("grower", pa.string()),
+        ("crop", pa.string()),
+        ("account", pa.string()),
+        ("job", pa.string()),
+        ("charge_type", pa.string()),
+        ("description", pa.string()),
+        ("amount", pa.float64()),
+        ("period", pa.string()),
+        ("company", pa.string()),
+    ])
+
+
+def _persisted_invoices(root: Path, periods) -> set:
+    """(company, invoice_no, po) of every invoice already in the history for `periods`."""
+    import pyarrow.dataset as ds
+
+    if not root.exists():
+        return set()
+    dataset = ds.dataset(str(root), schema=_history_schema(), format="parquet", partitioning="hive")
+    table = dataset.to_table(
+        columns=["company", "invoice_no", "po"], filter=ds.field("period").isin(list(periods))
+    )
+    cols = table.to_pydict()
+    return set(zip(cols["company"], cols["invoice_no"], cols["po"]))
+
+
+def write_batch(rows, root: Union[str, Path] = HISTORY_DIR) -> int:
+    """Persists one export batch to Parquet partitioned by period=YYYY-MM/company=...
+
+    Invoices already in the history are skipped, so downloading the export again
+    (e.g. after adding manual allocations) only adds the invoices that are new.
+    The file name is derived from the rows written, so repeating a write is a no-op.
+    Returns number of rows written.
+    """
+    _require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    rows = list(rows)
+    if not rows:
+        return 0
+    df = _history_frame(rows)
+    if df.empty:
+        return 0
+
+    root = Path(root)
+    done = _persisted_invoices(root, df["period"].unique())
+    if done:
+        new = [k not in done for k in zip(df["company"], df["invoice_no"], df["po"])]
+        df = df[new]
+        if df.empty:
+            return 0
+
+    batch_id = hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()[:16]
+    ds.write_dataset(
+        pa.Table.from_pandas(df, preserve_index=False),
+        str(root),
+        format="parquet",
+        partitioning=["period", "company"],
+        partitioning_flavor="hive",
+        basename_template=f"batch-{batch_id}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    return len(df)
+
+
+def rollup(
+    by=("grower", "account"),
+    root: Union[str, Path] = HISTORY_DIR,
+    period_from: str = None,
+    period_to: str = None,
+    company=None,
+    grower=None,
+    account=None,
+    job=None,
+    crop=None,
+) -> pd.DataFrame:
+    """Sum of amount (and line count) grouped by `by`, e.g. freight per grower per account.
+
+    Filters take a value or a list of values; periods are 'YYYY-MM' and inclusive.
+    Period/company filters prune whole partitions and the rest are pushed down to
+    the Parquet scan, so only matching row groups and the needed columns are read.
+    """
+    _require_pyarrow()
+    import pyarrow.dataset as ds
+
+    by = list(by)
+    unknown = [c for c in by if c not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Cannot group by {', '.join(unknown)} (choose from {', '.join(DIMENSIONS)})")
+
+    root = Path(root)
+    if not root.exists():
+        return pd.DataFrame(columns=by + ["amount", "lines"])
+
+    dataset = ds.dataset(str(root), schema=_history_schema(), format="parquet", partitioning="hive")
+
+    expr = None
+
+    def _and(e):
+        nonlocal expr
+        expr = e if expr is None else (expr & e)
+
+    if period_from:
+        _and(ds.field("period") >= period_from)
+    if period_to:
+        _and(ds.field("period") <= period_to)
+    for col, val in (("company", company), ("grower", grower), ("account", account), ("job", job), ("crop", crop)):
+        if val is None:
+            continue
+        vals = [val] if isinstance(val, str) else [str(v) for v in val]
+        _and(ds.field(col).isin(vals))
+
+    table = dataset.to_table(columns=by + ["amount"], filter=expr)
+    if table.num_rows == 0:
+        return pd.DataFrame(columns=by + ["amount", "lines"])
+
+    out = table.group_by(by).aggregate([("amount", "sum"), ("amount", "count")]).to_pandas()
+    out = out.rename(columns={"amount_sum": "amount", "amount_count": "lines"})
+    out["amount"] = out["amount"].round(2)
+    return out[by + ["amount", "lines"]].sort_values(by).reset_index(drop=True)
@@ -0,0 +1,382 @@
+"""Background batch processing.
+
+A batch (invoice PDFs + FT summary + account maps) is submitted to a SQLite
+queue under data/jobs/, picked up by a pool of worker processes, and its
+progress/results served over a small local HTTP API:
+
+    POST /jobs               {"pdfs": [{"name", "data"}], "ft": {...}, "maps": {...}}  (data = base64)
+    GET  /jobs               all jobs, newest first
+    GET  /jobs/<id>          status + progress
+    GET  /jobs/<id>/result   {"rows": [...], "failed": [...], "meta": {...}} once done
+
+The server compiles each distinct Account Maps / FT pair into RefTables
+(shared_ref.py) once and publishes it to shared memory; workers attach the
+segment instead of each re-reading both workbooks.
+
+Run with:  python jobs.py --port 8765 --workers 4
+"""
+import argparse
+import base64
+import hashlib
+import io
+import json
+import multiprocessing as mp
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib import request as urlrequest
+
+from utils import json_default
+
+BASE_DIR = Path(__file__).resolve().parent
+JOBS_DIR = BASE_DIR / "data" / "jobs"
+DEFAULT_PORT = 8765
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id        TEXT PRIMARY KEY,
+    status    TEXT NOT NULL,       -- queued | running | done | failed
+    submitted REAL NOT NULL,
+    started   REAL,
+    finished  REAL,
+    total     INTEGER NOT NULL,
+    done      INTEGER NOT NULL DEFAULT 0,
+    error     TEXT,
+    ref       TEXT                 -- shared memory segment with the compiled maps/FT, if published
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status, submitted);
+"""
+
+
+class JobQueue:
+    """Persistent queue; every method opens its own connection so it is safe across processes."""
+
+    def __init__(self, root=JOBS_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.db_path = str(self.root / "jobs.sqlite")
+        with self._connect() as con:
+            con.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        con = sqlite3.connect(self.db_path, timeout=30)
+        con.row_factory = sqlite3.Row
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def job_dir(self, job_id: str) -> Path:
+        return self.root / job_id
+
+    def submit(self, pdfs, ft, maps, ref=None) -> str:
+        """pdfs: list[(name, bytes)], ft/maps: (name, bytes), ref: RefTables segment name.
+           Returns job id."""
+        job_id = uuid.uuid4().hex[:12]
+        d = self.job_dir(job_id)
+        (d / "pdfs").mkdir(parents=True)
+        for i, (name, data) in enumerate(pdfs):
+            # index prefix keeps upload order and avoids name clashes
+            (d / "pdfs" / f"{i:05d}_{Path(name).name}").write_bytes(data)
+        (d / "ft.xlsx").write_bytes(ft[1])
+        (d / "maps.xlsx").write_bytes(maps[1])
+        with self._connect() as con:
+            con.execute(
+                "INSERT INTO jobs (id, status, submitted, total, ref) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, time.time(), len(pdfs), ref),
+            )
+        return job_id
+
+    def claim(self):
+        """Atomically moves the oldest queued job to running. Returns job id or None."""
+        with self._connect() as con:
+            con.execute("BEGIN IMMEDIATE")
+            row = con.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY submitted LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            con.execute(
+                "UPDATE jobs SET status = 'running', started = ?, done = 0 WHERE id = ?",
+                (time.time(), row["id"]),
+            )
+            return row["id"]
+
+    def progress(self, job_id: str, done: int):
+        with self._connect() as con:
+            con.execute("UPDATE jobs SET done = ? WHERE id = ?", (done, job_id))
+
+    def finish(self, job_id: str, result=None, error=None):
+        if result is not None:
+            tmp = self.job_dir(job_id) / "result.json.tmp"
+            tmp.write_text(json.dumps(result, default=json_default))
+            os.replace(tmp, self.job_dir(job_id) / "result.json")
+        with self._connect() as con:
+            con.execute(
+                "UPDATE jobs SET status = ?, finished = ?, error = ? WHERE id = ?",
+                ("failed" if error else "done", time.time(), error, job_id),
+            )
+
+    def requeue_running(self) -> int:
+        """Jobs left 'running' by a crashed server go back to the queue."""
+        with self._connect() as con:
+            return con.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'").rowcount
+
+    def get(self, job_id: str):
+        with self._connect() as con:
+            row = con.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self):
+        with self._connect() as con:
+            return [dict(r) for r in con.execute("SELECT * FROM jobs ORDER BY submitted DESC")]
+
+    def result(self, job_id: str):
+        p = self.job_dir(job_id) / "result.json"
+        return json.loads(p.read_text()) if p.exists() else None
+
+
+# -------------------------
+# Shared reference data
+# -------------------------
+class RefPublisher:
+    """Compiles each distinct maps/FT pair into RefTables once and keeps it published
+    in shared memory. Only the last `keep` pairs stay published; a job whose segment
+    has since been unlinked reads its workbooks instead."""
+
+    def __init__(self, keep: int = 4):
+        self.keep = keep
+        self._segments = OrderedDict()  # (ft digest, maps digest) -> SharedMemory
+        self._lock = threading.Lock()
+
+    def publish(self, ft: bytes, maps: bytes) -> str:
+        """Returns the segment name for this maps/FT pair, compiling it on first use."""
+        import pandas as pd
+        from shared_ref import RefTables
+
+        key = (hashlib.sha256(ft).hexdigest(), hashlib.sha256(maps).hexdigest())
+        with self._lock:
+            shm = self._segments.get(key)
+            if shm is None:
+                tables = RefTables.compile(pd.read_excel(io.BytesIO(maps)), pd.read_excel(io.BytesIO(ft)))
+                shm = self._segments[key] = tables.publish()
+                while len(self._segments) > self.keep:
+                    _, old = self._segments.popitem(last=False)
+                    old.close()
+                    old.unlink()
+            self._segments.move_to_end(key)
+            return shm.name
+
+    def close(self):
+        with self._lock:
+            while self._segments:
+                _, shm = self._segments.popitem()
+                shm.close()
+                shm.unlink()
+
+
+def _attach_ref(name):
+    """The job's published RefTables, or None if there is none (or it was unlinked since)."""
+    if not name:
+        return None
+    from shared_ref import RefTables
+
+    try:
+        return RefTables.attach(name)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+# -------------------------
+# Workers
+# -------------------------
+def run_job(queue: JobQueue, job_id: str):
+    import pandas as pd
+    from journal import BatchJournal, file_id
+    from pipeline import Pipeline, unreadable_result
+    from utils import load_consignee_state_map
+
+    d = queue.job_dir(job_id)
+    consignee_state_map = load_consignee_state_map(BASE_DIR / "data" / "consignees.xlsx")
+    tables = _attach_ref(queue.get(job_id)["ref"])
+    if tables is not None:
+        pipeline = Pipeline(tables, tables, consignee_state_map)
+    else:
+        pipeline = Pipeline(d / "ft.xlsx", pd.read_excel(d / "maps.xlsx"), consignee_state_map)
+
+    # A job requeued after a worker crash carries on from its journal
+    journal = BatchJournal(job_id, root=d)
+    try:
+        for i, path in enumerate(sorted(p for p in (d / "pdfs").iterdir() if p.suffix.lower() == ".pdf"), 1):
+            data = path.read_bytes()
+            fid = file_id(path.name, data)
+            if fid not in journal:
+                try:
+                    with open(path, "rb") as fh:
+                        result = pipeline.process(fh)
+                except Exception as e:
+                    result = unreadable_result(path.name, e)
+                journal.record(fid, result)
+            queue.progress(job_id, i)
+    finally:
+        if tables is not None:
+            tables.close()
+
+    rows, failed, meta = [], [], {}
+    seen = set()
+    for entry in journal.entries():
+        key = entry["key"]
+        meta[key] = entry["meta"]
+        if entry["failure"]:
+            failed.append(entry["failure"])
+        elif key not in seen:
+            rows.extend(entry["rows"])
+            seen.add(key)
+
+    return {"rows": rows, "failed": failed, "meta": meta}
+
+
+def worker_loop(root=JOBS_DIR, poll_seconds: float = 1.0):
+    from journal import BatchJournal
+
+    queue = JobQueue(root)
+    while True:
+        job_id = queue.claim()
+        if job_id is None:
+            time.sleep(poll_seconds)
+            continue
+        try:
+            queue.finish(job_id, result=run_job(queue, job_id))
+            # result.json holds the outcomes now; the journal was only for a crashed worker
+            BatchJournal(job_id, root=queue.job_dir(job_id)).discard()
+        except Exception as e:
+            queue.finish(job_id, error=f"{type(e).__name__}: {e}")
+
+
+# -------------------------
+# HTTP API
+# -------------------------
+def _make_handler(queue: JobQueue, publisher: RefPublisher = None):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code, payload):
+            body = json.dumps(payload, default=json_default).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            parts = [p for p in self.path.split("/") if p]
+            if parts == ["jobs"]:
+                return self._send(200, queue.list())
+            if len(parts) >= 2 and parts[0] == "jobs":
+                job = queue.get(parts[1])
+                if job is None:
+                    return self._send(404, {"error": "unknown job"})
+                if len(parts) == 2:
+                    return self._send(200, job)
+                if parts[2:] == ["result"]:
+                    if job["status"] != "done":
+                        return self._send(409, {"error": f"job is {job['status']}"})
+                    return self._send(200, queue.result(parts[1]))
+            self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/jobs":
+                return self._send(404, {"error": "not found"})
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                pdfs = [(p["name"], base64.b64decode(p["data"])) for p in body["pdfs"]]
+                ft = (body["ft"]["name"], base64.b64decode(body["ft"]["data"]))
+                maps = (body["maps"]["name"], base64.b64decode(body["maps"]["data"]))
+            except (ValueError, KeyError, TypeError) as e:
+                return self._send(400, {"error": f"bad request: {e}"})
+            ref = None
+            if publisher is not None:
+                try:
+                    ref = publisher.publish(ft[1], maps[1])
+                except Exception:
+                    pass  # unreadable workbook: the worker reads it and fails the job with the error
+            self._send(201, {"id": queue.submit(pdfs, ft, maps, ref=ref)})
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=DEFAULT_PORT, workers=None, root=JOBS_DIR):
+    from multiprocessing import resource_tracker
+
+    queue = JobQueue(root)
+    queue.requeue_running()
+    publisher = RefPublisher()
+    # Started before the workers fork so they share it: a worker with its own tracker
+    # would unlink every segment it attached when it exits
+    resource_tracker.ensure_running()
+
+    procs = []
+    for _ in range(workers or os.cpu_count() or 1):
+        p = mp.Process(target=worker_loop, args=(root,), daemon=True)
+        p.start()
+        procs.append(p)
+
+    server = ThreadingHTTPServer((host, port), _make_handler(queue, publisher))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        for p in procs:
+            p.terminate()
+        publisher.close()
+
+
+# -------------------------
+# Client helpers (used by app.py)
+# -------------------------
+def _call(url, payload=None):
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urlrequest.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urlrequest.urlopen(req, timeout=30) as resp:
+        return json.loads(resp.read())
+
+
+def submit_batch(base_url, pdfs, ft, maps) -> str:
+    """pdfs: list[(name, bytes)], ft/maps: (name, bytes). Returns job id."""
+    enc = lambda name, data: {"name": name, "data": base64.b64encode(data).decode()}
+    payload = {
+        "pdfs": [enc(n, b) for n, b in pdfs],
+        "ft": enc(*ft),
+        "maps": enc(*maps),
+    }
+    return _call(f"{base_url}/jobs", payload)["id"]
+
+
+def list_jobs(base_url):
+    return _call(f"{base_url}/jobs")
+
+
+def job_status(base_url, job_id):
+    return _call(f"{base_url}/jobs/{job_id}")
+
+
+def job_result(base_url, job_id):
+    return _call(f"{base_url}/jobs/{job_id}/result")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Local invoice job server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("--workers", type=int, default=None)
+    args = ap.parse_args()
+    serve(args.host, args.port, args.workers)
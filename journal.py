@@ -0,0 +1,101 @@
+"""Per-batch journal of invoice outcomes, so an interrupted run can resume.
+
+Each invoice's outcome (parsed fields, line items, grower split, rows or
+failure) is appended as one JSON line and fsynced as soon as it completes. Running the
+same batch again skips every file already in the journal, and the batch
+results are then read back from the journal in a single pass.
+
+A batch ID is derived from the invoice files and everything processing
+depends on (FT, maps, consignees, repack growers, options), so re-uploading
+the same files resumes, while any changed input starts a new batch. A
+journal is deleted once its results have been loaded.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Union
+
+from utils import json_default
+
+JOURNAL_DIR = Path(__file__).resolve().parent / "data" / "journal"
+
+
+def file_id(name: str, data: bytes) -> str:
+    """Identifies one invoice file in a batch (same name + same content)."""
+    return f"{name}|{hashlib.sha1(data).hexdigest()[:16]}"
+
+
+def batch_id(file_ids, *ref_data: bytes) -> str:
+    """Same invoice files + same reference data (FT, maps, options) -> same batch ID."""
+    h = hashlib.sha1()
+    for fid in sorted(file_ids):
+        h.update(fid.encode())
+        h.update(b"\0")
+    for data in ref_data:
+        h.update(hashlib.sha1(data).digest())
+    return h.hexdigest()[:16]
+
+
+class BatchJournal:
+    """Append-only JSONL journal for one batch under data/journal/<batch id>.jsonl."""
+
+    def __init__(self, batch: str, root: Union[str, Path] = JOURNAL_DIR):
+        self.path = Path(root) / f"{batch}.jsonl"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.done = set()
+        self._recover()
+
+    def _recover(self):
+        """Loads completed file ids and drops a partially written last line (crash mid-write)."""
+        if not self.path.exists():
+            return
+        good = 0
+        with open(self.path, "rb") as fh:
+            for line in fh:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                good += len(line)
+                self.done.add(entry["file"])
+        if good < self.path.stat().st_size:
+            with open(self.path, "r+b") as fh:
+                fh.truncate(good)
+
+    def __contains__(self, fid):
+        return fid in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def record(self, fid: str, result: dict):
+        """Appends one Pipeline.process result; durable once this returns."""
+        entry = {
+            "file": fid,
+            "key": result["Key"],
+            "meta": result["Meta"],
+            "rows": result["Rows"],
+            "failure": result["Failure"],
+            "lines": result.get("Lines", []),
+        }
+        with open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(entry, default=json_default) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        self.done.add(fid)
+
+    def entries(self):
+        """Journal entries in the order the invoices completed."""
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as fh:
+            for line in fh:
+                yield json.loads(line)
+
+    def discard(self):
+        """Forget the batch (next run starts from scratch)."""
+        self.path.unlink(missing_ok=True)
+        self.done.clear()
@@ -0,0 +1,229 @@
+"""Invoice line items, kept after parsing for audits and tray-mismatch checks.
+
+Parsers emit one LineItem per charge line; an invoice's charges, tray total
+and per-crop grouping are derived from its lines (summarize). LineItemStore
+keeps every line in typed arrays with an invoice-key index and persists them
+to data/line_items.bin, so looking at an invoice's lines never means
+re-extracting the PDF.
+"""
+import json
+import math
+import os
+import struct
+from array import array
+from collections import namedtuple
+from pathlib import Path
+from typing import Union
+
+from constants import CROPS
+
+LINE_ITEMS_PATH = Path(__file__).resolve().parent / "data" / "line_items.bin"
+
+# qty / unit_price / tax are NaN when the vendor's line does not show them
+LineItem = namedtuple("LineItem", ["line_type", "crop", "qty", "unit_price", "tax", "amount"])
+
+LINE_TYPES = ["Logistics", "Freight"]
+
+_MAGIC = b"LIS1"
+_NUMERIC = ("qty", "unit_price", "tax", "amount")
+
+
+def _num(v) -> float:
+    return float("nan") if v is None else float(v)
+
+
+def _same_lines(a, b) -> bool:
+    """Line lists equal, treating NaN fields as equal."""
+    if len(a) != len(b):
+        return False
+    for x, y in zip(a, b):
+        for u, v in zip(x, y):
+            if u != v and not (isinstance(u, float) and isinstance(v, float) and math.isnan(u) and math.isnan(v)):
+                return False
+    return True
+
+
+def summarize(lines, charge_order=None, ndigits=None):
+    """Invoice lines -> (charges, total_trays, crops).
+
+    charges: charge type -> amount, in charge_order if given, else first-appearance order.
+    crops: crop -> {"Logistics": $, "Trays": n} over the crop (product) lines.
+    ndigits: round the charge and per-crop logistics totals.
+    """
+    charges = dict.fromkeys(charge_order or (), 0.0)
+    total_trays = 0
+    crops = {}
+    for li in lines:
+        charges[li.line_type] = charges.get(li.line_type, 0) + li.amount
+        if li.crop:
+            trays = int(round(li.qty))
+            total_trays += trays
+            c = crops.setdefault(li.crop, {"Logistics": 0.0, "Trays": 0})
+            c["Logistics"] += li.amount
+            c["Trays"] += trays
+
+    charges = {k: v for k, v in charges.items() if v}
+    if ndigits is not None:
+        charges = {k: round(v, ndigits) for k, v in charges.items()}
+        for c in crops.values():
+            c["Logistics"] = round(c["Logistics"], ndigits)
+    return charges, total_trays, crops
+
+
+class LineItemStore:
+    """All invoice lines in column arrays, indexed by invoice key.
+
+    Lines of one invoice are contiguous, so a key lookup is one dict hit plus
+    array slices. Adding an invoice again with different lines (re-parsed)
+    replaces it; the old lines are dropped on save.
+    """
+
+    def __init__(self):
+        self.keys, self.vendors, self.invoices = [], [], []
+        self._index = {}  # key -> (start, end) into the line arrays
+        self._dead = 0
+        self._codes = {"line_type": list(LINE_TYPES), "crop": [""] + list(CROPS)}
+        self.line_type = array("B")
+        self.crop = array("B")
+        self.qty = array("d")
+        self.unit_price = array("d")
+        self.tax = array("d")
+        self.amount = array("d")
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def _code(self, field: str, value) -> int:
+        codes = self._codes[field]
+        value = value or ""
+        try:
+            return codes.index(value)
+        except ValueError:
+            codes.append(value)
+            return len(codes) - 1
+
+    def add(self, key: str, vendor: str, invoice_no: str, lines) -> bool:
+        """Stores an invoice's lines. Returns False if identical lines were already stored."""
+        lines = [LineItem(li[0], li[1] or None, *(_num(v) for v in li[2:])) for li in lines]
+        if key in self._index:
+            if _same_lines(self.lines(key), lines):
+                return False
+            start, end = self._index[key]
+            self._dead += end - start
+        start = len(self.amount)
+        for li in lines:
+            self.line_type.append(self._code("line_type", li.line_type))
+            self.crop.append(self._code("crop", li.crop))
+            self.qty.append(_num(li.qty))
+            self.unit_price.append(_num(li.unit_price))
+            self.tax.append(_num(li.tax))
+            self.amount.append(_num(li.amount))
+        if key not in self._index:
+            self.keys.append(key)
+            self.vendors.append(vendor)
+            self.invoices.append(invoice_no)
+        self._index[key] = (start, len(self.amount))
+        return True
+
+    def lines(self, key: str):
+        """LineItems for one invoice key ([] if unknown)."""
+        start, end = self._index.get(key, (0, 0))
+        lt, cr = self._codes["line_type"], self._codes["crop"]
+        return [
+            LineItem(lt[self.line_type[i]], cr[self.crop[i]] or None,
+                     self.qty[i], self.unit_price[i], self.tax[i], self.amount[i])
+            for i in range(start, end)
+        ]
+
+    def trays(self, key: str) -> int:
+        """Invoice tray total from the stored lines (as the parsers compute it)."""
+        return summarize(self.lines(key))[1]
+
+    def frame(self, keys=None):
+        """Lines as a DataFrame (Key, Vendor, Invoice No., Line Type, Crop, Qty, Unit Price, Tax, Amount)."""
+        import pandas as pd
+
+        pos = {k: i for i, k in enumerate(self.keys)}
+        records = []
+        for key in (self.keys if keys is None else keys):
+            if key not in self._index:
+                continue
+            i = pos[key]
+            for li in self.lines(key):
+                records.append((key, self.vendors[i], self.invoices[i], *li))
+        return pd.DataFrame(records, columns=[
+            "Key", "Vendor", "Invoice No.", "Line Type", "Crop", "Qty", "Unit Price", "Tax", "Amount",
+        ])
+
+    # -------------------------
+    # Persistence
+    # -------------------------
+    def _compact(self):
+        """Rewrites the arrays in key order without replaced lines."""
+        if not self._dead:
+            return
+        fresh = LineItemStore()
+        fresh._codes = self._codes
+        for key, vendor, inv in zip(self.keys, self.vendors, self.invoices):
+            fresh.add(key, vendor, inv, self.lines(key))
+        self.__dict__.update(fresh.__dict__)
+
+    def save(self, path: Union[str, Path] = LINE_ITEMS_PATH):
+        """One file: magic, header length, JSON header, then each array's bytes. Replaced atomically."""
+        self._compact()
+        counts = [self._index[k][1] - self._index[k][0] for k in self.keys]
+        vendor_names = sorted(set(self.vendors), key=str)
+        vendor_code = {v: i for i, v in enumerate(vendor_names)}
+        header = json.dumps({
+            "keys": self.keys,
+            "vendor_names": vendor_names,
+            "vendors": [vendor_code[v] for v in self.vendors],
+            "invoices": self.invoices,
+            "counts": counts,
+            "codes": self._codes,
+        }).encode()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as fh:
+            fh.write(_MAGIC + struct.pack("<I", len(header)) + header)
+            for name in ("line_type", "crop") + _NUMERIC:
+                getattr(self, name).tofile(fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Union[str, Path] = LINE_ITEMS_PATH) -> "LineItemStore":
+        store = cls()
+        path = Path(path)
+        if not path.exists():
+            return store
+        data = path.read_bytes()
+        if data[:4] != _MAGIC:
+            raise ValueError(f"{path} is not a line item store")
+        (hlen,) = struct.unpack_from("<I", data, 4)
+        header = json.loads(data[8:8 + hlen])
+        n = sum(header["counts"])
+        offset = 8 + hlen
+        for name in ("line_type", "crop") + _NUMERIC:
+            arr = getattr(store, name)
+            size = n * arr.itemsize
+            arr.frombytes(data[offset:offset + size])
+            offset += size
+        names = header["vendor_names"]
+        store.keys, store.invoices = header["keys"], header["invoices"]
+        store.vendors = [names[i] for i in header["vendors"]]
+        store._codes = header["codes"]
+        start = 0
+        for key, count in zip(store.keys, header["counts"]):
+            store._index[key] = (start, start + count)
+            start += count
+        return store
+
@@ -0,0 +1,171 @@
+"""Account Maps validation, run once when the maps file is uploaded.
+
+allocate only finds mapping problems one invoice at a time ("X not in
+mapping"), and silently takes the first of duplicate Supplier rows. check_maps
+compiles the maps into a supplier-key index and joins every grower the FT
+summary has for the uploaded companies against it as sets, so unmapped
+growers, duplicate Supplier rows and blank account/job cells are all reported
+before any PDF is processed.
+"""
+import pandas as pd
+
+from allocator import MAP_COLUMNS
+from constants import CONSIGNOR_COL, SUPPLIER_COL, TRAYS_COL
+from excel_ops import CONSIGNOR_COMPANY, crop_series
+
+# Columns every grower needs; the repack columns are only needed for repack growers
+REQUIRED_COLUMNS = ["Supplier", "Logistics Account", "Freight Account", "Job Code"]
+
+
+def _supplier_keys(mapping_df: pd.DataFrame) -> pd.Series:
+    """Normalised Supplier per row, as allocate matches growers (NA where no grower can match)."""
+    return mapping_df["Supplier"].astype(str).str.strip().str.lower()
+
+
+def _blank(s: pd.Series) -> pd.Series:
+    return s.isna() | s.astype(str).str.strip().isin(["", "nan", "None"])
+
+
+class MapIndex:
+    """Account Maps compiled to supplier key -> {column: value} (first row per supplier).
+
+    Stands in for mapping_df in allocate / Pipeline (see allocator.mapping_lookup):
+    a dict hit per grower instead of a scan of the Supplier column.
+    """
+
+    def __init__(self, mapping_df: pd.DataFrame):
+        self.columns = list(mapping_df.columns)
+        if "Supplier" in mapping_df.columns:
+            self.keys = _supplier_keys(mapping_df)
+        else:
+            self.keys = pd.Series([None] * len(mapping_df), index=mapping_df.index, dtype=object)
+        first = self.keys.dropna().drop_duplicates()
+        cols = [c for c in MAP_COLUMNS if c in mapping_df.columns]
+        pos = mapping_df.index.get_indexer(first.index)
+        values = zip(*(mapping_df[c].values[pos] for c in cols)) if cols else [()] * len(first)
+        self.rows = {key: dict(zip(cols, vals)) for key, vals in zip(first.tolist(), values)}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, grower):
+        return str(grower).strip().lower() in self.rows
+
+    def account_row(self, grower):
+        return self.rows.get(str(grower).strip().lower())
+
+
+def ft_growers(ft_df: pd.DataFrame) -> pd.DataFrame:
+    """Growers the FT has for the uploaded companies (company consignors, configured crops):
+       one row per (Company, Crop, Grower) with FT rows and trays."""
+    df = ft_df[ft_df[CONSIGNOR_COL].astype(str).isin(CONSIGNOR_COMPANY)]
+    out = pd.DataFrame({
+        "Consignor": df[CONSIGNOR_COL].astype(str),
+        "Crop": crop_series(df),
+        "Supplier": df[SUPPLIER_COL],
+        "FT Trays": pd.to_numeric(df[TRAYS_COL], errors="coerce").fillna(0.0),
+    })
+    out = out[out["Crop"].notna() & (out["FT Trays"] > 0)]
+    # aggregate on the raw cells first, so names are cleaned once per distinct value
+    out = (
+        out.groupby(["Consignor", "Crop", "Supplier"], sort=False, dropna=False)
+        .agg(**{"FT Rows": ("FT Trays", "size"), "FT Trays": ("FT Trays", "sum")})
+        .reset_index()
+    )
+    out["Company"] = out["Consignor"].map(CONSIGNOR_COMPANY)
+    out["Grower"] = [str(v).strip() for v in out["Supplier"].tolist()]  # as split_from_po_rows
+    return (
+        out[out["Grower"] != ""]
+        .groupby(["Company", "Crop", "Grower"], sort=True)[["FT Rows", "FT Trays"]]
+        .sum()
+        .reset_index()
+    )
+
+
+def check_maps(mapping_df: pd.DataFrame, ft_df: pd.DataFrame = None, index: MapIndex = None):
+    """Validates the Account Maps, against the FT summary's growers if ft_df is given.
+       index: MapIndex already compiled from mapping_df (built here if None).
+
+    Returns dict:
+        index            - MapIndex for allocate
+        missing_columns  - REQUIRED_COLUMNS the file lacks
+        duplicates       - DataFrame: Supplier, Rows (Excel row numbers), Conflicting
+                           (the rows disagree on an account/job column; allocate uses the first)
+        blank_fields     - DataFrame: Supplier, Row, Blank (columns), In FT
+        unmapped         - DataFrame: Company, Crop, Grower, FT Rows, FT Trays
+        summary          - DataFrame of counts
+    """
+    missing_columns = [c for c in REQUIRED_COLUMNS if c not in mapping_df.columns]
+    index = index if index is not None else MapIndex(mapping_df)
+    cols = [c for c in MAP_COLUMNS if c in mapping_df.columns]
+    excel_row = pd.Series(range(2, len(mapping_df) + 2), index=mapping_df.index)  # header is row 1
+
+    keys = index.keys
+
+    growers = ft_growers(ft_df) if ft_df is not None else None
+    grower_keys = growers["Grower"].str.lower() if growers is not None else pd.Series(dtype=object)
+    ft_keys = grower_keys.unique().tolist()
+
+    # Duplicate Supplier rows (same normalised key)
+    dup_mask = keys.notna() & keys.duplicated(keep=False)
+    dup = mapping_df[dup_mask]
+    if dup.empty:
+        duplicates = pd.DataFrame(columns=["Supplier", "Rows", "Conflicting"])
+    else:
+        dkeys = keys[dup_mask]
+        conflicting = (
+            dup[cols].astype(str).groupby(dkeys).nunique().gt(1).any(axis=1)
+            if cols else pd.Series(False, index=dkeys.unique())
+        )
+        duplicates = pd.DataFrame({
+            "Supplier": dup["Supplier"].astype(str).str.strip().groupby(dkeys).first(),
+            "Rows": excel_row[dup_mask].astype(str).groupby(dkeys).agg(", ".join),
+            "Conflicting": conflicting,
+        }).sort_index().reset_index(drop=True)
+
+    # Blank required cells on the rows allocate actually uses (first row per supplier)
+    used = keys.notna() & ~keys.duplicated()
+    required = [c for c in REQUIRED_COLUMNS[1:] if c in mapping_df.columns]
+    blank = pd.DataFrame({c: _blank(mapping_df.loc[used, c]) for c in required}, index=mapping_df.index[used])
+    blank_any = blank.any(axis=1) if required else pd.Series(False, index=blank.index)
+    if blank_any.any():
+        rows = blank[blank_any]
+        blank_fields = pd.DataFrame({
+            "Supplier": mapping_df.loc[rows.index, "Supplier"].astype(str).str.strip(),
+            "Row": excel_row[rows.index],
+            "Blank": rows.apply(lambda r: ", ".join(c for c in required if r[c]), axis=1),
+            "In FT": keys[rows.index].isin(ft_keys),
+        }).sort_values(["In FT", "Row"], ascending=[False, True]).reset_index(drop=True)
+    else:
+        blank_fields = pd.DataFrame(columns=["Supplier", "Row", "Blank", "In FT"])
+
+    # FT growers with no Supplier row
+    if growers is not None:
+        unmapped = growers[~grower_keys.isin(list(index.rows))].reset_index(drop=True)
+    else:
+        unmapped = pd.DataFrame(columns=["Company", "Crop", "Grower", "FT Rows", "FT Trays"])
+
+    summary = pd.DataFrame([
+        {"Check": "Suppliers in maps", "Count": len(index)},
+        {"Check": "FT growers (uploaded companies)", "Count": len(ft_keys) if growers is not None else None},
+        {"Check": "Unmapped FT growers", "Count": unmapped["Grower"].str.lower().nunique() if len(unmapped) else 0},
+        {"Check": "Duplicate Suppliers", "Count": len(duplicates)},
+        {"Check": "Suppliers with blank fields", "Count": len(blank_fields)},
+    ])
+    return {
+        "index": index,
+        "missing_columns": missing_columns,
+        "duplicates": duplicates,
+        "blank_fields": blank_fields,
+        "unmapped": unmapped,
+        "summary": summary,
+    }
+
+
+def has_problems(report) -> bool:
+    return bool(
+        report["missing_columns"]
+        or len(report["duplicates"])
+        or len(report["blank_fields"])
+        or len(report["unmapped"])
+    )
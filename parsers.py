@@ -1,7 +1,8 @@
 import re
-import pdfplumber
-from constants import COMPANIES
-from utils import norm
+from constants import COMPANIES, DEFAULT_CROP
+from utils import norm, match_crop
+from line_items import LineItem, summarize
+from pdf_backends import read_pdf_text
 
 def identify_company(text: str) -> str:
     lines = [l.strip() for l in text.splitlines() if l.strip()]
@@ -35,8 +36,7 @@ def parse_valleyfresh(text: str):
 
     lines = text.splitlines()
 
-    total_trays = 0
-    charges = {"Logistics": 0.0, "Freight": 0.0}
+    items = []
 
     i = 0
     while i < len(lines) - 1:
@@ -57,14 +57,13 @@ def parse_valleyfresh(text: str):
 
                 # Freight
                 if "FREIGHT" in up:
-                    charges["Freight"] += amt
+                    items.append(LineItem("Freight", None, qty, price, tax, amt))
 
                 # Logistics (this line ALSO contains the product qty!)
                 elif "LOGISTIC" in up:
-                    charges["Logistics"] += amt
-
                     # Product code is on NEXT line → treat as product
-                    total_trays += int(round(qty))
+                    crop = match_crop(line) or match_crop(next_line) or DEFAULT_CROP
+                    items.append(LineItem("Logistics", crop, qty, price, tax, amt))
 
                 # Unexpected numeric-looking line → ignore
 
@@ -73,10 +72,8 @@ def parse_valleyfresh(text: str):
 
         i += 1
 
-    # Clean empty charges
-    charges = {k: v for k, v in charges.items() if v}
-
-    return invoice_no, cust_po, invoice_date, charges, total_trays
+    charges, total_trays, crops = summarize(items, charge_order=("Logistics", "Freight"))
+    return invoice_no, cust_po, invoice_date, charges, total_trays, crops, items
 
 
 def parse_deluca(text: str):
@@ -89,34 +86,28 @@ def parse_deluca(text: str):
     date_m = re.search(r"Date\s+(\d{1,2}/\d{1,2}/\d{4})", text, re.IGNORECASE)
     invoice_date = date_m.group(1) if date_m else None
 
-    total_trays = 0
-    logistics_ex = 0
-    freight_ex = 0
+    items = []
 
     for line in text.splitlines():
         up = line.upper()
+        crop = match_crop(up) if "BERR" in up else None
 
-        if "BLUEBERRIES" in up:
+        # Freight first: a line like "BLUEBERRY FREIGHT" names the crop but is freight
+        if "TSPT" in up or " DD " in f" {up} " or "FREIGHT" in up:
             nums = re.findall(r"\d+(?:\.\d+)?", line)
             if len(nums) >= 5:
-                qty = float(nums[-5])
-                amount_ex = float(nums[-3])
-                logistics_ex += amount_ex
-                total_trays += int(round(qty))
+                # qty, price, amount ex GST, GST, amount inc GST
+                qty, price, amount_ex, tax = (float(n) for n in nums[-5:-1])
+                items.append(LineItem("Freight", None, qty, price, tax, amount_ex))
 
-        elif "TSPT" in up or " DD " in f" {up} " or "FREIGHT" in up:
+        elif crop:
             nums = re.findall(r"\d+(?:\.\d+)?", line)
             if len(nums) >= 5:
-                amount_ex = float(nums[-3])
-                freight_ex += amount_ex
+                qty, price, amount_ex, tax = (float(n) for n in nums[-5:-1])
+                items.append(LineItem("Logistics", crop, qty, price, tax, amount_ex))
 
-    charges = {}
-    if logistics_ex:
-        charges["Logistics"] = round(logistics_ex, 2)
-    if freight_ex:
-        charges["Freight"] = round(freight_ex, 2)
-
-    return invoice_no, cust_po, invoice_date, charges, total_trays
+    charges, total_trays, crops = summarize(items, charge_order=("Logistics", "Freight"), ndigits=2)
+    return invoice_no, cust_po, invoice_date, charges, total_trays, crops, items
 
 def extract_bache_invoice_date(text: str):
     # Find "Invoice" followed by whitespace then "Date"
@@ -154,28 +145,33 @@ def parse_bache(text: str):
     )
     cust_po = po.group(1) if po else None
 
-    charges = {}
-    total_trays = 0
+    items = []
 
     for line in text.splitlines():
         up = line.upper()
+        crop = match_crop(up) if "BERR" in up else None
 
-        if "BERRY" in up and "BLUE" in up:
+        if crop:
             nums = [float(n) for n in re.findall(r"\d+(?:\.\d+)?", line)]
             if len(nums) >= 6:
-                total_trays += int(round(nums[2]))
-                charges["Logistics"] = charges.get("Logistics", 0) + nums[-1]
+                # ..., qty, ..., unit price, GST, amount
+                items.append(LineItem("Logistics", crop, nums[2], nums[-3], nums[-2], nums[-1]))
 
         elif "FREIGHT" in up:
             nums = [float(n) for n in re.findall(r"\d+(?:\.\d+)?", line)]
             if nums:
-                charges["Freight"] = charges.get("Freight", 0) + nums[-1]
+                items.append(LineItem("Freight", None, None, None, None, nums[-1]))
+
+    charges, total_trays, crops = summarize(items)
+    return invoice_no, cust_po, invoice_date, charges, total_trays, crops, items
 
-    return invoice_no, cust_po, invoice_date, charges, total_trays
+def parse_text(text: str):
+    """Extracted invoice text -> (company, parsed fields).
 
-def parse_pdf_filelike(file_like):
-    with pdfplumber.open(file_like) as pdf:
-        text = "\n".join([p.extract_text() or "" for p in pdf.pages])
+    parsed: (invoice_no, cust_po, invoice_date, charges, total_trays, crops, lines) where
+    lines are the invoice's LineItems and charges / total_trays / crops are derived
+    from them (crops: crop -> {"Logistics": $, "Trays": n}).
+    """
     company = identify_company(text)
     if company == "FRESHMAX NATIONAL PTY LTD":
         return company, parse_valleyfresh(text)
@@ -183,4 +179,23 @@ def parse_pdf_filelike(file_like):
         return company, parse_deluca(text)
     elif company == "Bache Bros Pty Ltd":
         return company, parse_bache(text)
-    return company, (None, None, None, {}, 0)
+    return company, (None, None, None, {}, 0, {}, [])
+
+
+def parse_pdf_filelike(file_like, backend=None):
+    """Returns (company, parsed fields, backend used) - see parse_text."""
+    text, backend = read_pdf_text(file_like, backend)
+    company, fields = parse_text(text)
+    return company, fields, backend
+
+
+if __name__ == "__main__":
+    # Quick check: python parsers.py invoice.pdf [invoice.txt ...]
+    # .txt files take the text-only path (no PDF library is imported).
+    import sys
+    for path in sys.argv[1:]:
+        if path.lower().endswith(".txt"):
+            with open(path, encoding="utf-8") as fh:
+                print(path, parse_text(fh.read()))
+        else:
+            print(path, parse_pdf_filelike(path))
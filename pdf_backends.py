@@ -0,0 +1,223 @@
+"""PDF text extraction backends.
+
+pdfplumber is the reference. pdfminer.six (which pdfplumber sits on) and
+pypdfium2 are used where installed and where they conform, i.e. the vendor
+parser reads their text exactly as it reads pdfplumber's.
+
+Pick the fastest conforming backend per vendor from a fixture corpus with:
+
+    python pdf_backends.py path/to/fixtures/*.pdf
+
+which writes data/pdf_backends.json, read by read_pdf_text.
+"""
+import io
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+REFERENCE_BACKEND = "pdfplumber"
+SELECTION_PATH = Path(__file__).resolve().parent / "data" / "pdf_backends.json"
+
+
+def _pdfplumber_text(data: bytes) -> str:
+    import pdfplumber
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        return "\n".join([p.extract_text() or "" for p in pdf.pages])
+
+
+def _pdfminer_text(data: bytes) -> str:
+    from pdfminer.high_level import extract_text
+    from pdfminer.layout import LAParams
+    # Line grouping close to pdfplumber's; no column detection (boxes_flow=None) is
+    # both faster and keeps each invoice line on one text line.
+    laparams = LAParams(line_margin=0.3, char_margin=3.0, word_margin=0.1, boxes_flow=None)
+    return extract_text(io.BytesIO(data), laparams=laparams)
+
+
+def _pypdfium2_text(data: bytes) -> str:
+    import pypdfium2 as pdfium
+    pdf = pdfium.PdfDocument(data)
+    try:
+        pages = []
+        for page in pdf:
+            textpage = page.get_textpage()
+            pages.append(textpage.get_text_range().replace("\r\n", "\n"))
+            textpage.close()
+            page.close()
+        return "\n".join(pages)
+    finally:
+        pdf.close()
+
+
+# name -> (module to probe, extractor)
+BACKENDS = {
+    "pdfplumber": ("pdfplumber", _pdfplumber_text),
+    "pdfminer": ("pdfminer", _pdfminer_text),
+    "pypdfium2": ("pypdfium2", _pypdfium2_text),
+}
+
+
+# Cheapest first: read_pdf_text identifies the vendor from the first one installed
+SCAN_ORDER = ("pypdfium2", "pdfminer", "pdfplumber")
+
+
+def available_backends():
+    import importlib.util
+    return [name for name, (mod, _) in BACKENDS.items() if importlib.util.find_spec(mod) is not None]
+
+
+def _read_bytes(file_like) -> bytes:
+    if isinstance(file_like, (str, Path)):
+        return Path(file_like).read_bytes()
+    if isinstance(file_like, (bytes, bytearray)):
+        return bytes(file_like)
+    if hasattr(file_like, "seek"):
+        file_like.seek(0)
+    return file_like.read()
+
+
+def extract_text(data: bytes, backend: str = REFERENCE_BACKEND) -> str:
+    return BACKENDS[backend][1](data)
+
+
+_selection = (None, None)  # (file mtime_ns or None if absent, selection)
+
+
+def load_selection():
+    """{"default": backend, "vendors": {company: backend}} from data/pdf_backends.json.
+       Re-read whenever the file's mtime changes, so long-running processes pick up a new selection."""
+    global _selection
+    try:
+        mtime = SELECTION_PATH.stat().st_mtime_ns
+    except OSError:
+        mtime = None
+    if _selection[1] is None or _selection[0] != mtime:
+        sel = {"default": REFERENCE_BACKEND, "vendors": {}}
+        if mtime is not None:
+            try:
+                sel.update(json.loads(SELECTION_PATH.read_text()))
+            except (OSError, ValueError):
+                pass
+        # Ignore picks whose library is not installed here
+        avail = set(available_backends())
+        if sel["default"] not in avail:
+            sel["default"] = REFERENCE_BACKEND
+        sel["vendors"] = {v: b for v, b in sel["vendors"].items() if b in avail}
+        _selection = (mtime, sel)
+    return _selection[1]
+
+
+def read_pdf_text(file_like, backend: str = None):
+    """Returns (text, backend used).
+
+    Without an explicit backend, identifies the vendor from the fastest
+    installed backend's text, then extracts with the vendor's pick (or the
+    default) - reusing the first text when that is the same backend.
+    """
+    from parsers import identify_company
+
+    data = _read_bytes(file_like)
+    if backend:
+        return extract_text(data, backend), backend
+
+    sel = load_selection()
+    avail = available_backends()
+    scan = next((b for b in SCAN_ORDER if b in avail), REFERENCE_BACKEND)
+    text = extract_text(data, scan)
+    backend = sel["vendors"].get(identify_company(text), sel["default"])
+    if backend != scan:
+        text = extract_text(data, backend)
+    return text, backend
+
+
+# -------------------------
+# Conformance + benchmark
+# -------------------------
+def check_conformance(paths, backends=None):
+    """For each fixture, parse text from every backend and compare with pdfplumber's.
+       Returns {backend: {vendor: bool}} - True only if every fixture of that vendor matched."""
+    from parsers import parse_text
+
+    backends = backends or available_backends()
+    out = {b: {} for b in backends}
+    for path in paths:
+        data = Path(path).read_bytes()
+        ref = parse_text(extract_text(data, REFERENCE_BACKEND))
+        vendor = ref[0]
+        for b in backends:
+            try:
+                ok = parse_text(extract_text(data, b)) == ref
+            except Exception:
+                ok = False
+            out[b][vendor] = out[b].get(vendor, True) and ok
+    return out
+
+
+def benchmark(paths, backends=None, repeat: int = 3):
+    """Best-of-`repeat` extraction seconds per backend per vendor, summed over fixtures."""
+    from parsers import identify_company
+
+    backends = backends or available_backends()
+    fixtures = []
+    for path in paths:
+        data = Path(path).read_bytes()
+        fixtures.append((identify_company(extract_text(data, REFERENCE_BACKEND)), data))
+
+    out = {b: {} for b in backends}
+    for b in backends:
+        for vendor, data in fixtures:
+            best = float("inf")
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                try:
+                    extract_text(data, b)
+                except Exception:
+                    best = float("inf")
+                    break
+                best = min(best, time.perf_counter() - t0)
+            out[b][vendor] = out[b].get(vendor, 0.0) + best
+    return out
+
+
+def select_backends(paths, backends=None, repeat: int = 3):
+    """Fastest conforming backend per vendor (and overall default). Returns the selection dict."""
+    conformance = check_conformance(paths, backends)
+    timings = benchmark(paths, list(conformance), repeat)
+
+    vendors = sorted({v for per in timings.values() for v in per})
+    picks = {}
+    for vendor in vendors:
+        ok = [b for b in conformance if conformance[b].get(vendor)]
+        picks[vendor] = min(ok, key=lambda b: timings[b][vendor]) if ok else REFERENCE_BACKEND
+
+    # Default: fastest backend that conforms for every vendor in the corpus
+    universal = [b for b in conformance if all(conformance[b].get(v) for v in vendors)]
+    default = min(universal, key=lambda b: sum(timings[b].values())) if universal else REFERENCE_BACKEND
+
+    return {"default": default, "vendors": picks, "conformance": conformance, "timings": timings}
+
+
+def save_selection(selection, path=SELECTION_PATH):
+    """Written atomically, so a running process never reads a half-written file."""
+    global _selection
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(selection, indent=2))
+    os.replace(tmp, path)
+    _selection = (None, None)
+
+
+if __name__ == "__main__":
+    fixture_paths = sys.argv[1:]
+    if not fixture_paths:
+        sys.exit("usage: python pdf_backends.py FIXTURE.pdf [...]")
+    selection = select_backends(fixture_paths)
+    save_selection(selection)
+    for b, per in selection["timings"].items():
+        for v, secs in per.items():
+            flag = "ok" if selection["conformance"][b].get(v) else "MISMATCH"
+            print(f"{b:12s} {v:30s} {secs * 1000:8.1f} ms  {flag}")
+    print(f"default: {selection['default']}  vendors: {selection['vendors']}")
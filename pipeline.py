@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from parsers import parse_text
+from pdf_backends import read_pdf_text
+from excel_ops import get_crop_splits
+from allocator import allocate
+from utils import norm_consignee, make_payload_key
+from constants import GROWER_NAME, CROPS, DEFAULT_CROP
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def unreadable_result(file_name: str, exc: Exception) -> dict:
+    """Pipeline.process-shaped result for a PDF that could not be processed at all
+       (corrupt file, extractor crash), so a batch records it and moves on."""
+    key = make_payload_key("Unknown", file_name, "")
+    reason = f"Could not process PDF: {type(exc).__name__}: {exc}"
+    return {
+        "Key": key,
+        "Meta": {"Company": "Unknown", "Invoice No.": file_name, "Key": key},
+        "Rows": [],
+        "Failure": {"Company": "Unknown", "Invoice No.": file_name, "PO No.": None, "Reason": reason, "Key": key},
+        "Lines": [],
+    }
+
+class Pipeline:
+    """One invoice PDF -> parse -> FT grower split -> Kinglake rules -> tray checks -> allocate.
+
+    Invoices carrying several crops get one FT split, tray check and set of
+    allocation lines per crop; freight is shared across crops by tray count.
+
+    Holds the reference data for a batch (FT source, account maps, consignee
+    state map) so the Streamlit app, the job workers and other batch runners
+    all apply the same rules.
+    """
+
+    def __init__(self, ft_source, mapping_df, consignee_state_map):
+        self.ft_source = ft_source
+        self.mapping_df = mapping_df
+        self.consignee_state_map = consignee_state_map or {}
+        # company -> POSuggester, built on first "No Growers Found in FT" failure
+        self._po_suggesters = {}
+        self._ft_df = None
+
+    def ft_frame(self) -> pd.DataFrame:
+        """The whole FT source as a DataFrame (read once per batch)."""
+        if self._ft_df is None:
+            if hasattr(self.ft_source, "frame"):
+                self._ft_df = self.ft_source.frame()
+            else:
+                import pandas as pd
+                self._ft_df = pd.read_excel(self.ft_source)
+        return self._ft_df
+
+    def _suggester(self, company):
+        from po_suggest import POSuggester
+
+        if company not in self._po_suggesters:
+            self._po_suggesters[company] = POSuggester.from_frame(self.ft_frame(), company)
+        return self._po_suggesters[company]
+
+    def process(self, pdf, repack_growers=None):
+        """Returns dict with:
+             Key     - company|invoice|po
+             Meta    - invoice fields needed later (kept even when it fails)
+             Rows    - MYOB rows (empty on failure)
+             Failure - failed-table row, or None
+             Lines   - the invoice's parsed LineItems (see line_items.py)
+        repack_growers: optional dict key -> set[grower] routed to repack accounts.
+        """
+        text, backend = read_pdf_text(pdf)
+        company, (invoice_no, cust_po, invoice_date, charges, invoice_trays, crops, lines) = parse_text(text)
+
+        # Build a stable key early (cust_po might be missing)
+        key = make_payload_key(company, invoice_no, cust_po or "")
+
+        # Save invoice meta (even if it fails) so repack can use totals/charges/date later
+        meta = {
+            "Company": company,
+            "Invoice No.": invoice_no,
+            "PO No.": cust_po,
+            "Invoice Date": invoice_date,
+            "Charges": charges or {},
+            "Invoice Trays": invoice_trays,
+            "Key": key,
+            "Backend": backend,
+            # main crop (most trays) - used when the invoice is allocated manually
+            "Crop": max(crops, key=lambda c: crops[c]["Trays"]) if crops else DEFAULT_CROP,
+        }
+
+        def fail(reason, **extra):
+            row = {"Company": company, "Invoice No.": invoice_no, "PO No.": cust_po, "Reason": reason}
+            row.update(extra)
+            row["Key"] = key
+            return {"Key": key, "Meta": meta, "Rows": [], "Failure": row, "Lines": lines}
+
+        # Fail 1: missing PO
+        if not cust_po:
+            return fail("Could not read PO")
+
+        crop_splits = get_crop_splits(self.ft_source, cust_po, company)
+
+        # Whole-PO view (all crops) for the repack UI and the Kinglake rules
+        grower_split, excel_trays, consignee = {}, 0.0, None
+        for splits, trays, cons in crop_splits.values():
+            for g, pct in splits.items():
+                grower_split[g] = grower_split.get(g, 0.0) + pct * trays
+            excel_trays += trays
+            consignee = consignee or cons
+        if excel_trays > 0:
+            grower_split = {g: t / excel_trays for g, t in grower_split.items()}
+
+        # Add growers + excel meta for repack UI
+        meta.update({
+            "Growers": sorted([str(g).strip() for g in grower_split.keys()]),
+            "Split": grower_split,
+            "FT Trays": excel_trays,
+            "Consignee": consignee,
+        })
+
+        # Fail 2: no growers
+        if not grower_split:
+            from po_suggest import format_suggestions
+            suggestions = self._suggester(company).suggest(cust_po, invoice_trays)
+            return fail("No Growers Found in FT", **{"Suggested POs": format_suggestions(suggestions)})
+
+        # ---------------- KINGLAKE: Block if consignee is outside VIC ----------------
+        has_kinglake = any(
+            str(g).strip().lower() == GROWER_NAME.strip().lower()
+            for g in grower_split.keys()
+        )
+
+        if has_kinglake:
+            # If consignee missing, block (safer)
+            if not consignee or not str(consignee).strip():
+                return fail("Consignee not in FT")
+
+            state = self.consignee_state_map.get(norm_consignee(consignee))
+
+            # If not found in list, block (safer)
+            if not state:
+                return fail("Consignee not in list")
+
+            if state != "VIC":
+                return fail("KING Outside of VIC")
+        # ---------------------------------------------------------------------------
+
+        inv_ok = isinstance(invoice_trays, (int, float)) and invoice_trays > 0
+        ex_ok = isinstance(excel_trays, (int, float)) and excel_trays > 0
+
+        # Fail 3: invoice trays missing
+        if not inv_ok:
+            return fail("Invoice Tray Error")
+
+        # Fail 4: consignment trays missing
+        if not ex_ok:
+            return fail("0 FT Trays")
+
+        # Fail 5: tray mismatch (per crop when the PO has more than one)
+        crop_names = [c for c in CROPS if c in crops or c in crop_splits]
+        for crop in crop_names:
+            inv_t = int(round(crops.get(crop, {}).get("Trays", 0)))
+            ft_t = int(round(crop_splits.get(crop, ({}, 0, None))[1]))
+            if inv_t != ft_t:
+                label = "Mismatch" if len(crop_names) == 1 else f"{crop} Mismatch"
+                return fail(f"{label}, {inv_t} v {ft_t}")
+
+        repack_set = (repack_growers or {}).get(key, set())
+
+        # Allocation (normal path), one pass per crop
+        rows = []
+        freight_left = charges.get("Freight", 0.0)
+        invoice_crops = [c for c in crop_names if c in crops]
+        for i, crop in enumerate(invoice_crops):
+            if len(invoice_crops) == 1:
+                crop_charges = charges
+            else:
+                crop_charges = {"Logistics": crops[crop]["Logistics"]}
+                if freight_left:
+                    # cents per crop by tray share; the last crop takes the rounding remainder
+                    last = i == len(invoice_crops) - 1
+                    share = freight_left if last else round(charges["Freight"] * crops[crop]["Trays"] / invoice_trays, 2)
+                    crop_charges["Freight"] = share
+                    freight_left = round(freight_left - share, 2)
+            crop_rows, fail_reason = allocate(
+                invoice_no, cust_po, crop_charges, crop_splits.get(crop, ({},))[0], company, invoice_date,
+                self.mapping_df, repack_set, crop=crop,
+            )
+            if fail_reason:
+                return fail(fail_reason)
+            rows.extend(crop_rows)
+
+        return {"Key": key, "Meta": meta, "Rows": rows, "Failure": None, "Lines": lines}
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from utils import norm, digits_only
+from constants import PO_COL, TRAYS_COL
+from excel_ops import filter_company_rows
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def edit_distance(a: str, b: str, max_distance: int = None) -> int:
+    """Levenshtein distance (insert / delete / substitute all cost 1).
+
+    With max_distance, only the diagonal band of width max_distance is computed
+    and any distance over it is returned as max_distance + 1 (early exit once a
+    whole row is over).
+    """
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is None:
+        max_distance = len(a)
+    over = max_distance + 1
+    if len(a) - len(b) > max_distance:
+        return over
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        lo, hi = max(1, i - max_distance), min(len(b), i + max_distance)
+        cur = [over] * (len(b) + 1)
+        if i <= max_distance:
+            cur[0] = i
+        best = cur[0]
+        for j in range(lo, hi + 1):
+            v = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != b[j - 1]))
+            cur[j] = v
+            if v < best:
+                best = v
+        if best > max_distance:
+            return over
+        prev = cur
+    return min(prev[-1], over)
+
+
+def _deletions(key: str, n: int) -> set:
+    """key plus every string made by deleting up to n characters from it."""
+    out = {key}
+    frontier = {key}
+    for _ in range(n):
+        frontier = {s[:i] + s[i + 1:] for s in frontier for i in range(len(s))}
+        out |= frontier
+    return out
+
+
+class DeletionIndex:
+    """Symmetric-deletion index over normalised PO strings.
+
+    Every key is filed under each string reachable by deleting up to
+    max_distance characters. Two strings within edit distance d share such a
+    deletion, so a query only verifies the keys found under its own deletions
+    (a few dict lookups for short POs) instead of walking all keys.
+    """
+
+    def __init__(self, max_distance: int = 2):
+        self.max_distance = max_distance
+        self.index = {}  # deletion -> [key]
+
+    def add(self, key: str):
+        index = self.index
+        for d in _deletions(key, self.max_distance):
+            keys = index.get(d)
+            if keys is None:
+                index[d] = [key]
+            elif keys[-1] != key:
+                keys.append(key)
+
+    def search(self, key: str, max_distance: int):
+        """Returns list[(distance, key)] for every key within max_distance
+           (at most the index's max_distance)."""
+        max_distance = min(max_distance, self.max_distance)
+        cands = set()
+        for d in _deletions(key, max_distance):
+            cands.update(self.index.get(d, ()))
+        out = []
+        for c in cands:
+            if abs(len(c) - len(key)) > max_distance:
+                continue
+            dist = edit_distance(key, c, max_distance)
+            if dist <= max_distance:
+                out.append((dist, c))
+        return out
+
+
+class DigitTrie:
+    """Prefix trie over the digits-only form of each PO."""
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, digits: str, key: str):
+        node = self.root
+        for ch in digits:
+            node = node.setdefault(ch, {})
+            node.setdefault("_keys", set()).add(key)
+
+    def longest_prefix(self, digits: str, min_len: int = 4):
+        """Keys sharing the longest digit prefix with `digits` (at least min_len long).
+           Returns (prefix_len, set[key])."""
+        node = self.root
+        best_len, best = 0, set()
+        for i, ch in enumerate(digits, 1):
+            node = node.get(ch)
+            if node is None:
+                break
+            if i >= min_len:
+                best_len, best = i, node["_keys"]
+        return best_len, set(best)
+
+
+class POSuggester:
+    """Similarity index over FT PO values for one company.
+
+    Built once per FT file/company; `suggest` is then cheap enough to run for
+    every "No Growers Found in FT" failure in a batch.
+    """
+
+    def __init__(self, po_trays: dict, max_distance: int = 2):
+        # po_trays: normalised PO -> (display PO, total trays)
+        self.po_trays = po_trays
+        self.index = DeletionIndex(max_distance)
+        self.trie = DigitTrie()
+        for key in po_trays:
+            self.index.add(key)
+            d = digits_only(key)
+            if d:
+                self.trie.add(d, key)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, company: str) -> "POSuggester":
+        import pandas as pd
+
+        df1 = filter_company_rows(df, company)
+        po_trays = {}
+        if df1.empty:
+            return cls(po_trays)
+        trays = pd.to_numeric(df1[TRAYS_COL], errors="coerce").fillna(0)
+        for po, t in zip(df1[PO_COL].astype(str), trays):
+            key = norm(po)
+            if not key or key == "NAN":
+                continue
+            shown, total = po_trays.get(key, (po.strip(), 0.0))
+            po_trays[key] = (shown, total + float(t))
+        return cls(po_trays)
+
+    def suggest(self, cust_po: str, invoice_trays=None, k: int = 5, max_distance: int = 2):
+        """Top-k candidate POs for a PO with no exact match.
+           Returns list[(po, ft_trays, distance)] ranked by closeness, then by
+           how close the FT tray total is to the invoice's parsed trays.
+        """
+        key = norm(cust_po or "")
+        if not key or not self.po_trays:
+            return []
+
+        cands = {c: d for d, c in self.index.search(key, max_distance)}
+
+        # Suffix / truncated POs: same leading digits, different tail length
+        digits = digits_only(key)
+        if digits:
+            plen, keys = self.trie.longest_prefix(digits)
+            for c in keys:
+                if c not in cands:
+                    cands[c] = max(len(digits), len(digits_only(c))) - plen
+
+        try:
+            inv_trays = float(invoice_trays) if invoice_trays else None
+        except (TypeError, ValueError):
+            inv_trays = None
+
+        def rank(c):
+            tray_gap = abs(self.po_trays[c][1] - inv_trays) if inv_trays is not None else 0.0
+            return (cands[c], tray_gap, c)
+
+        ranked = sorted(cands, key=rank)[:k]
+        return [(self.po_trays[c][0], self.po_trays[c][1], cands[c]) for c in ranked]
+
+
+def format_suggestions(suggestions) -> str:
+    """'PO (N trays), PO (N trays)' for the failed table."""
+    return ", ".join(f"{po} ({int(round(trays))} trays)" for po, trays, _ in suggestions)
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import re
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+from exporter import group_with_blank_lines, to_tab_delimited_with_header
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+PAGE_SIZES = [50, 100, 250, 500]
+
+
+# Failure reasons that carry details (growers, counts, errors) -> their reason type
+_REASON_KINDS = [
+    (re.compile(r"not in mapping$"), "Not in mapping"),
+    (re.compile(r"^Missing repack columns"), "Missing repack columns"),
+    (re.compile(r"^Mapping file missing"), "Mapping file missing Supplier"),
+    (re.compile(r"^(\w+ )?Mismatch,"), "Mismatch"),
+    (re.compile(r"^Could not process PDF"), "Could not process PDF"),
+]
+
+
+def reason_kind(reason) -> str:
+    """'G1, G2 not in mapping' -> 'Not in mapping', 'Raspberry Mismatch, 12 v 10' -> 'Mismatch',
+       so failures group by reason type. Reasons without details are their own type."""
+    reason = str(reason or "").strip()
+    for pattern, kind in _REASON_KINDS:
+        if pattern.search(reason):
+            return kind
+    return reason
+
+
+def filter_frame(df: pd.DataFrame, filters: dict) -> pd.DataFrame:
+    """filters: column -> value. Empty values are ignored; 'Reason' matches by reason_kind,
+       every other column by case-insensitive substring."""
+    for col, val in filters.items():
+        if not val or col not in df.columns:
+            continue
+        if col == "Reason":
+            df = df[df[col].map(reason_kind) == val]
+        else:
+            df = df[df[col].astype(str).str.contains(str(val), case=False, regex=False, na=False)]
+    return df
+
+
+def page_slice(df: pd.DataFrame, page: int, page_size: int):
+    """Returns (rows for page (1-based), number of pages)."""
+    n_pages = max(1, -(-len(df) // page_size))
+    page = min(max(1, page), n_pages)
+    start = (page - 1) * page_size
+    return df.iloc[start:start + page_size], n_pages
+
+
+def rows_summary(df: pd.DataFrame) -> pd.DataFrame:
+    """Processed rows: invoices, lines and amount per company."""
+    import pandas as pd
+
+    if df.empty:
+        return pd.DataFrame(columns=["Company", "Invoices", "Lines", "Amount"])
+    g = df.groupby("Co./Last Name", sort=True)
+    return pd.DataFrame({
+        "Invoices": g["Supplier Invoice No."].nunique(),
+        "Lines": g.size(),
+        "Amount": g["Amount"].sum().round(2),
+    }).reset_index().rename(columns={"Co./Last Name": "Company"})
+
+
+def failed_summary(df: pd.DataFrame) -> pd.DataFrame:
+    """Failed invoices: count per company and reason type."""
+    import pandas as pd
+
+    if df.empty:
+        return pd.DataFrame(columns=["Company", "Reason", "Invoices"])
+    kinds = df["Reason"].map(reason_kind)
+    return (
+        df.assign(Reason=kinds)
+        .groupby(["Company", "Reason"], sort=True)
+        .size()
+        .reset_index(name="Invoices")
+    )
+
+
+class PreviewCache:
+    """Frames, summaries, the export text and recently viewed pages for one result version.
+
+    Everything is computed once per result change; filter/page changes only
+    slice the cached frames.
+    """
+
+    def __init__(self, max_pages: int = 32):
+        self.version = None
+        self.max_pages = max_pages
+        self._data = {}
+        self._filters = OrderedDict()
+        self._pages = OrderedDict()
+
+    def sync(self, version, all_rows, failed_rows):
+        import pandas as pd
+
+        if version == self.version:
+            return
+        rows_df = all_rows.to_frame() if all_rows else pd.DataFrame()
+        failed_df = pd.DataFrame(failed_rows)
+        self._data = {
+            "rows": rows_df,
+            "failed": failed_df,
+            "rows_summary": rows_summary(rows_df) if not rows_df.empty else None,
+            "failed_summary": failed_summary(failed_df) if not failed_df.empty else None,
+        }
+        self._filters.clear()
+        self._pages.clear()
+        self.version = version
+
+    def __getitem__(self, name):
+        return self._data[name]
+
+    def __sizeof__(self):
+        """Bytes held by the cached frames and export text (counted by session_store.memory_report)."""
+        import sys
+
+        def size(v):
+            if hasattr(v, "memory_usage"):
+                return int(v.memory_usage(index=True, deep=True).sum())
+            return sys.getsizeof(v) if v is not None else 0
+
+        n = object.__sizeof__(self) + sum(size(v) for v in self._data.values())
+        n += sum(size(df) for df, _ in self._filters.values())
+        n += sum(size(df) for df, _, _ in self._pages.values())
+        return n
+
+    def drop_caches(self):
+        """Frees the filtered frames, pages and export text; they are rebuilt on demand.
+           The result frames and summaries the preview shows stay."""
+        self._filters.clear()
+        self._pages.clear()
+        self._data.pop("export_text", None)
+
+    def export_text(self) -> str:
+        """MYOB file for the full result (grouped with blank lines), built once per version."""
+        if "export_text" not in self._data:
+            self._data["export_text"] = to_tab_delimited_with_header(
+                group_with_blank_lines(self._data["rows"], "Supplier Invoice No.")
+            )
+        return self._data["export_text"]
+
+    def _filtered(self, name: str, filters: dict):
+        fkey = (name, tuple(sorted(filters.items())))
+        if fkey not in self._filters:
+            df = filter_frame(self._data[name], filters)
+            n = len(df)
+            if name == "rows" and n:
+                df = group_with_blank_lines(df, "Supplier Invoice No.")
+            self._filters[fkey] = (df, n)
+            if len(self._filters) > 8:
+                self._filters.popitem(last=False)
+        else:
+            self._filters.move_to_end(fkey)
+        return fkey, self._filters[fkey]
+
+    def page(self, name: str, filters: dict, page: int, page_size: int):
+        """(page frame, n_pages, n_filtered) for the rows or failed table."""
+        fkey, (filtered, n) = self._filtered(name, filters)
+        key = fkey + (page, page_size)
+        if key not in self._pages:
+            sliced, n_pages = page_slice(filtered, page, page_size)
+            self._pages[key] = (sliced, n_pages, n)
+            if len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(key)
+        return self._pages[key]
@@ -0,0 +1,115 @@
+import pandas as pd
+
+from utils import norm, digits_only
+from constants import CONSIGNOR_COL, PO_COL, TRAYS_COL
+from excel_ops import CONSIGNOR_COMPANY, filter_crop_rows
+
+
+def _ft_po_totals(ft_df: pd.DataFrame) -> pd.DataFrame:
+    """Filtered FT (company consignors + configured crops) -> one row per (Company, PO key) with trays."""
+    df = ft_df[ft_df[CONSIGNOR_COL].astype(str).isin(CONSIGNOR_COMPANY)]
+    df = filter_crop_rows(df)
+    po = df[PO_COL].astype(str).str.strip()
+    out = pd.DataFrame({
+        "Company": df[CONSIGNOR_COL].astype(str).map(CONSIGNOR_COMPANY),
+        "PO No.": po,
+        "po_key": po.str.replace(r"\s+", "", regex=True).str.upper(),  # vectorised utils.norm
+        "FT Trays": pd.to_numeric(df[TRAYS_COL], errors="coerce").fillna(0.0),
+    })
+    out = out[(out["po_key"] != "") & (out["po_key"] != "NAN")]
+    return (
+        out.groupby(["Company", "po_key"], sort=False)
+        .agg({"PO No.": "first", "FT Trays": "sum"})
+        .reset_index()
+    )
+
+
+def reconcile(ft_df: pd.DataFrame, invoices):
+    """Invoice <-> FT reconciliation on normalised PO keys.
+
+    invoices: iterable of dicts (or InvoiceMeta) with Company, Invoice No., PO No., Invoice Trays.
+    PO keys match exactly (norm) or digits-only, like get_grower_split. One pass
+    builds hash indexes over the FT POs; one pass probes them with the invoices.
+
+    Returns dict of DataFrames:
+        unmatched_pos      - FT POs no invoice referenced
+        unmatched_invoices - invoices with no FT PO
+        tray_deltas        - matched POs where invoice trays != FT trays
+        summary            - counts and tray totals per company
+    """
+    ft = _ft_po_totals(ft_df)
+
+    # (company, norm key) -> FT row index ; (company, digits) -> [FT row index]
+    by_norm, by_digits = {}, {}
+    for i, (company, key) in enumerate(zip(ft["Company"].tolist(), ft["po_key"].tolist())):
+        by_norm[(company, key)] = i
+        d = digits_only(key)
+        if d:
+            by_digits.setdefault((company, d), []).append(i)
+
+    unmatched_invoices = []
+    covered = {}  # FT row index -> anchor FT row index of its PO group
+    groups = {}   # anchor -> (set[FT row index], list[(invoice_no, trays)])
+    for inv in invoices:
+        company = inv.get("Company")
+        cust_po = inv.get("PO No.") or ""
+        trays = inv.get("Invoice Trays") or 0
+        key = norm(cust_po)
+
+        hits = set()
+        if key and (company, key) in by_norm:
+            hits.add(by_norm[(company, key)])
+        d = digits_only(cust_po)
+        if d:
+            hits.update(by_digits.get((company, d), ()))
+
+        if not hits:
+            unmatched_invoices.append({
+                "Company": company,
+                "Invoice No.": inv.get("Invoice No."),
+                "PO No.": cust_po,
+                "Invoice Trays": trays,
+            })
+            continue
+        # An invoice matching several FT keys (e.g. "123" and "123-A") covers them as one PO
+        anchor = min(covered.get(h, h) for h in hits)
+        for h in hits:
+            covered[h] = anchor
+        members, invs = groups.setdefault(anchor, (set(), []))
+        members.update(hits)
+        invs.append((inv.get("Invoice No."), float(trays)))
+
+    unmatched_pos = ft.loc[[i not in covered for i in range(len(ft))], ["Company", "PO No.", "FT Trays"]]
+
+    ft_company, ft_po, ft_trays_col = ft["Company"].tolist(), ft["PO No."].tolist(), ft["FT Trays"].tolist()
+    deltas = []
+    for anchor, (members, invs) in groups.items():
+        ft_trays = sum(ft_trays_col[i] for i in members)
+        inv_trays = sum(t for _, t in invs)
+        if round(inv_trays) != round(ft_trays):
+            deltas.append({
+                "Company": ft_company[anchor],
+                "PO No.": ft_po[anchor],
+                "Invoices": ", ".join(str(n) for n, _ in invs),
+                "Invoice Trays": inv_trays,
+                "FT Trays": ft_trays,
+                "Delta": ft_trays - inv_trays,
+            })
+
+    unmatched_invoices = pd.DataFrame(unmatched_invoices, columns=["Company", "Invoice No.", "PO No.", "Invoice Trays"])
+    tray_deltas = pd.DataFrame(deltas, columns=["Company", "PO No.", "Invoices", "Invoice Trays", "FT Trays", "Delta"])
+
+    summary = pd.DataFrame({
+        "Unmatched POs": unmatched_pos.groupby("Company").size(),
+        "Unbilled FT Trays": unmatched_pos.groupby("Company")["FT Trays"].sum(),
+        "Unmatched Invoices": unmatched_invoices.groupby("Company").size(),
+        "Tray Deltas": tray_deltas.groupby("Company").size(),
+        "Delta Trays": tray_deltas.groupby("Company")["Delta"].sum(),
+    }).fillna(0).reset_index().rename(columns={"index": "Company"})
+
+    return {
+        "unmatched_pos": unmatched_pos.reset_index(drop=True),
+        "unmatched_invoices": unmatched_invoices,
+        "tray_deltas": tray_deltas,
+        "summary": summary,
+    }
@@ -0,0 +1,217 @@
+import sys
+from collections import OrderedDict, namedtuple
+
+from constants import MYOB_COLUMNS
+
+# Rough ceiling for everything the app keeps per session (see memory_report)
+SESSION_BUDGET_BYTES = 64 * 1024 * 1024
+
+# Invoices kept in InvoiceMetaStore before the oldest unpinned ones are evicted
+MAX_INVOICES = 5000
+
+# MYOB row columns, plus the grower, crop and charge type each line was allocated to
+ROW_COLUMNS = MYOB_COLUMNS + ["Grower", "Crop", "Charge Type"]
+
+# One manual-allocation line (tuple-backed, so no per-row dict)
+AllocRow = namedtuple("AllocRow", ["Grower", "Trays", "Repack"])
+
+
+def _intern(v):
+    return sys.intern(v) if isinstance(v, str) else v
+
+
+class InvoiceMeta:
+    """Per-invoice fields kept for the repack / manual allocation UI.
+
+    Supports .get(label) with the failed-table labels ("Company", "PO No.", ...)
+    so it reads like the dicts the pipeline produces.
+    """
+
+    _FIELDS = {
+        "Company": "company",
+        "Invoice No.": "invoice_no",
+        "PO No.": "po_no",
+        "Invoice Date": "invoice_date",
+        "Charges": "charges",
+        "Invoice Trays": "invoice_trays",
+        "Key": "key",
+        "Growers": "growers",
+        "FT Trays": "ft_trays",
+        "Consignee": "consignee",
+        "Backend": "backend",
+        "Crop": "crop",
+    }
+    __slots__ = tuple(_FIELDS.values())
+
+    def __init__(self, company=None, invoice_no=None, po_no=None, invoice_date=None, charges=None,
+                 invoice_trays=None, key=None, growers=(), ft_trays=None, consignee=None, backend=None,
+                 crop=None):
+        self.company = _intern(company)
+        self.invoice_no = invoice_no
+        self.po_no = po_no
+        self.invoice_date = _intern(invoice_date)
+        # charge type names repeat on every invoice
+        self.charges = {_intern(k): float(v) for k, v in (charges or {}).items()}
+        self.invoice_trays = invoice_trays
+        self.key = _intern(key)
+        self.growers = tuple(_intern(g) for g in (growers or ()))
+        self.ft_trays = ft_trays
+        self.consignee = _intern(consignee)
+        self.backend = _intern(backend)
+        self.crop = _intern(crop)
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "InvoiceMeta":
+        return cls(**{attr: d[label] for label, attr in cls._FIELDS.items() if label in d})
+
+    def get(self, label, default=None):
+        attr = self._FIELDS.get(label)
+        if attr is None:
+            return default
+        v = getattr(self, attr)
+        return default if v is None else v
+
+
+class InvoiceMetaStore:
+    """key -> InvoiceMeta, bounded to max_items.
+
+    When full, the oldest entries that are not pinned (queued for manual
+    allocation) are evicted first.
+    """
+
+    def __init__(self, max_items: int = MAX_INVOICES):
+        self.max_items = max_items
+        self._items = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def get(self, key, default=None):
+        return self._items.get(key, default)
+
+    def values(self):
+        return self._items.values()
+
+    def put(self, key, meta, pinned=()):
+        if not isinstance(meta, InvoiceMeta):
+            meta = InvoiceMeta.from_dict(meta)
+        key = _intern(key)
+        self._items[key] = meta
+        self._items.move_to_end(key)
+        if len(self._items) > self.max_items:
+            for old in list(self._items):
+                if len(self._items) <= self.max_items:
+                    break
+                if old not in pinned and old != key:
+                    del self._items[old]
+
+    def evict(self, keys):
+        for k in keys:
+            self._items.pop(k, None)
+
+    def evict_oldest(self, n: int, pinned=()) -> int:
+        """Drops up to n of the oldest unpinned entries. Returns how many were dropped."""
+        old = [k for k in self._items if k not in pinned][:max(0, n)]
+        self.evict(old)
+        return len(old)
+
+    def retain(self, keys):
+        """Drop everything not in keys."""
+        keys = set(keys)
+        for k in [k for k in self._items if k not in keys]:
+            del self._items[k]
+
+
+class RowStore:
+    """Column-oriented MYOB rows.
+
+    Strings are interned so the card name, date and comment repeated on every
+    line of an invoice are stored once. Row order is preserved.
+    """
+
+    def __init__(self, rows=None):
+        self.columns = {c: [] for c in ROW_COLUMNS}
+        self._n = 0
+        if rows:
+            self.extend(rows)
+
+    def __len__(self):
+        return self._n
+
+    def __bool__(self):
+        return self._n > 0
+
+    def extend(self, rows):
+        for r in rows:
+            for c in r:
+                if c not in self.columns:
+                    self.columns[c] = [None] * self._n
+            for c, col in self.columns.items():
+                col.append(_intern(r.get(c)))
+            self._n += 1
+
+    def to_records(self):
+        names = list(self.columns)
+        return [dict(zip(names, vals)) for vals in zip(*self.columns.values())]
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame(self.columns)
+
+
+def deep_sizeof(obj, _seen=None) -> int:
+    """Approximate bytes held by obj, counting shared objects once."""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, _seen) + deep_sizeof(v, _seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(v, _seen) for v in obj)
+    elif isinstance(obj, (InvoiceMetaStore, RowStore)):
+        size += deep_sizeof(vars(obj), _seen)
+    elif hasattr(obj, "__slots__"):
+        size += sum(deep_sizeof(getattr(obj, s, None), _seen) for s in obj.__slots__)
+    return size
+
+
+def memory_report(state: dict):
+    """state: name -> object (e.g. selected st.session_state entries).
+       Returns (rows: list[dict], total_bytes: int, bytes_per_invoice: float)."""
+    seen = set()
+    rows = []
+    for name, obj in state.items():
+        n = deep_sizeof(obj, seen)
+        rows.append({"Item": name, "Entries": len(obj) if hasattr(obj, "__len__") else None, "Bytes": n})
+    total = sum(r["Bytes"] for r in rows)
+    n_invoices = len(state.get("invoice_meta") or ())
+    return rows, total, (total / n_invoices if n_invoices else 0.0)
+
+
+def trim_to_budget(state: dict, budget: int = SESSION_BUDGET_BYTES, pinned=()) -> int:
+    """Drops derived caches (entries with drop_caches(), e.g. the preview), then evicts
+       the oldest unpinned invoice meta until state (as for memory_report) fits in
+       budget. Returns the total bytes afterwards, which is still over budget when
+       the results themselves (rows, pinned invoices) don't fit."""
+    _, total, _ = memory_report(state)
+    if total > budget:
+        for obj in state.values():
+            if hasattr(obj, "drop_caches"):
+                obj.drop_caches()
+        total = memory_report(state)[1]
+    meta = state.get("invoice_meta")
+    while total > budget and meta:
+        per_invoice = max(1, deep_sizeof(meta) // len(meta))
+        if not meta.evict_oldest(-(-(total - budget) // per_invoice), pinned):
+            break
+        total = memory_report(state)[1]
+    return total
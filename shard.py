@@ -0,0 +1,181 @@
+"""Deterministic sharding of large invoice batches across machines.
+
+Each PDF goes to shard sha1(file name or content) mod N, so every machine
+agrees on the split without coordinating:
+
+    python shard.py run --pdfs INBOX --ft ft.xlsx --maps maps.xlsx --out shards/ --shard 0 --of 4
+    python shard.py merge shards/ --out myob_import.txt --failures failures.csv
+
+A shard runs the full Pipeline over its PDFs, journaling every outcome to
+<out>/shard-<i>-of-<n>.jsonl (so a crashed shard resumes), and writes a
+manifest of the files it covered once complete. merge checks that every shard
+of the run is complete and used the same reference data, orders all outcomes
+by file name, keeps the first rows for each invoice key and exports through
+group_with_blank_lines. A single-node run is the same run with --of 1, so
+sharded and single-node exports are byte-identical.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Union
+
+from constants import MYOB_COLUMNS, FAILURE_COLUMNS
+from journal import BatchJournal, batch_id, file_id
+
+BASE_DIR = Path(__file__).resolve().parent
+
+
+def shard_of(key: Union[str, bytes], n_shards: int) -> int:
+    """Stable shard for a file name or file content (same on every machine and Python run)."""
+    if isinstance(key, str):
+        key = key.encode()
+    return int.from_bytes(hashlib.sha1(key).digest()[:8], "big") % n_shards
+
+
+def list_pdfs(pdf_dir):
+    """(name relative to pdf_dir, path) for every PDF below pdf_dir, sorted by name."""
+    pdf_dir = Path(pdf_dir)
+    files = [(p.relative_to(pdf_dir).as_posix(), p) for p in pdf_dir.rglob("*") if p.suffix.lower() == ".pdf"]
+    return sorted(files)
+
+
+def _shard_name(shard: int, of: int) -> str:
+    return f"shard-{shard}-of-{of}"
+
+
+def run_shard(pdf_dir, ft_path, maps_path, out_dir, shard: int, of: int, by: str = "name",
+              consignees_path=BASE_DIR / "data" / "consignees.xlsx") -> int:
+    """Processes this shard's PDFs. Returns number of PDFs in the shard."""
+    from pipeline import unreadable_result
+    from watcher import RefData
+
+    if not 0 <= shard < of:
+        raise ValueError(f"--shard must be in 0..{of - 1}")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    ref = RefData(maps_path, ft_path, consignees_path)
+    ref.refresh()
+    journal = BatchJournal(_shard_name(shard, of), root=out_dir)
+
+    fids = []
+    for name, path in list_pdfs(pdf_dir):
+        if by == "name" and shard_of(name, of) != shard:
+            continue
+        data = path.read_bytes()
+        if by == "content" and shard_of(data, of) != shard:
+            continue
+        fid = file_id(name, data)
+        fids.append(fid)
+        if fid in journal:
+            continue
+        try:
+            with open(path, "rb") as fh:
+                result = ref.pipeline.process(fh)
+        except Exception as e:
+            result = unreadable_result(name, e)
+        journal.record(fid, result)
+
+    manifest = {
+        "shard": shard,
+        "of": of,
+        "by": by,
+        "ref": batch_id([], Path(ft_path).read_bytes(), Path(maps_path).read_bytes()),
+        "files": fids,
+    }
+    path = out_dir / f"{_shard_name(shard, of)}.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest))
+    os.replace(tmp, path)
+    return len(fids)
+
+
+def _file_name(fid: str) -> str:
+    return fid.rsplit("|", 1)[0]
+
+
+def merge(shard_dir):
+    """Combines complete shards. Returns (rows in export order, failures)."""
+    shard_dir = Path(shard_dir)
+    manifests = [json.loads(p.read_text()) for p in sorted(shard_dir.glob("shard-*-of-*.json"))]
+    if not manifests:
+        raise ValueError(f"No shard manifests in {shard_dir}")
+    of = {m["of"] for m in manifests}
+    if len(of) != 1 or len({m["by"] for m in manifests}) != 1 or len({m["ref"] for m in manifests}) != 1:
+        raise ValueError("Shards come from different runs (shard count, --by or FT/maps differ)")
+    of = of.pop()
+    missing = sorted(set(range(of)) - {m["shard"] for m in manifests})
+    if missing:
+        raise ValueError(f"Shards not finished: {', '.join(map(str, missing))} of {of}")
+
+    entries = {}
+    for m in manifests:
+        wanted = set(m["files"])
+        for entry in BatchJournal(_shard_name(m["shard"], of), root=shard_dir).entries():
+            if entry["file"] in wanted:
+                entries.setdefault(entry["file"], entry)
+
+    rows, failures, seen = [], [], set()
+    for fid in sorted(entries, key=lambda f: (_file_name(f), f)):
+        entry = entries[fid]
+        if entry["failure"]:
+            failures.append(dict(entry["failure"], File=_file_name(fid)))
+        elif entry["key"] not in seen:
+            rows.extend(entry["rows"])
+            seen.add(entry["key"])
+    return rows, failures
+
+
+def export_text(rows) -> str:
+    import pandas as pd
+    from exporter import group_with_blank_lines, to_tab_delimited_with_header
+
+    if not rows:
+        return to_tab_delimited_with_header(pd.DataFrame(columns=MYOB_COLUMNS))
+    return to_tab_delimited_with_header(group_with_blank_lines(pd.DataFrame(rows), "Supplier Invoice No."))
+
+
+def write_failures(failures, path):
+    with open(path, "w", encoding="utf-8", newline="") as fh:
+        w = csv.writer(fh, lineterminator="\n")
+        w.writerow(FAILURE_COLUMNS)
+        for f in failures:
+            w.writerow(["" if f.get(c) is None else str(f.get(c)) for c in FAILURE_COLUMNS])
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Shard a batch of invoice PDFs across machines, then merge")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    r = sub.add_parser("run", help="process one shard")
+    r.add_argument("--pdfs", required=True, help="directory of invoice PDFs (searched recursively)")
+    r.add_argument("--ft", required=True, help="Consignment Summary .xlsx, or a consignment history .sqlite")
+    r.add_argument("--maps", required=True, help="Account Maps .xlsx")
+    r.add_argument("--consignees", default=str(BASE_DIR / "data" / "consignees.xlsx"))
+    r.add_argument("--out", required=True, help="shard output directory (shared, or copied together for merge)")
+    r.add_argument("--shard", type=int, default=0)
+    r.add_argument("--of", type=int, default=1)
+    r.add_argument("--by", choices=["name", "content"], default="name", help="hash the file name or its content")
+
+    m = sub.add_parser("merge", help="combine finished shards into one MYOB import + failures file")
+    m.add_argument("shard_dir")
+    m.add_argument("--out", required=True, help="MYOB import .txt")
+    m.add_argument("--failures", required=True, help="failures .csv")
+
+    args = ap.parse_args()
+    if args.cmd == "run":
+        n = run_shard(args.pdfs, args.ft, args.maps, args.out, args.shard, args.of, args.by, args.consignees)
+        print(f"{_shard_name(args.shard, args.of)}: {n} PDF(s)")
+    else:
+        try:
+            rows, failures = merge(args.shard_dir)
+        except ValueError as e:
+            sys.exit(str(e))
+        with open(args.out, "w", encoding="utf-8", newline="") as fh:
+            fh.write(export_text(rows))
+        write_failures(failures, args.failures)
+        print(f"{len(rows)} line(s), {len(failures)} failure(s)")
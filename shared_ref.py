@@ -0,0 +1,331 @@
+"""Reference data compiled into flat tables that worker processes share.
+
+RefTables holds what allocate and get_crop_splits need - normalised supplier
+keys with their account/job columns, and the FT rows for the uploaded
+companies grouped per PO with grower trays - as typed arrays plus one UTF-8
+string blob. publish() copies them once into a multiprocessing.shared_memory
+segment; attach() in a worker maps the segment and reads the arrays in place
+(memoryview casts, no unpickling, no per-worker copy).
+
+RefTables can be passed wherever allocate expects mapping_df and wherever
+get_grower_split / get_crop_splits expect the FT source.
+
+Benchmark against pickling: python bench_shared_ref.py
+"""
+from __future__ import annotations
+
+import json
+import struct
+from array import array
+from typing import TYPE_CHECKING
+
+from allocator import MAP_COLUMNS
+from constants import (
+    CONSIGNOR_COL, SUPPLIER_COL, PO_COL, TRAYS_COL, CONSIGNEE_COL, CROP_COL, CROPS,
+)
+from utils import norm, digits_only
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+_MAGIC = b"REF1"
+_SEP = "\x1f"
+
+# value tags, so account numbers come back as the type pandas gave allocate
+_NONE, _STR, _INT, _FLOAT = 0, 1, 2, 3
+
+# name -> typecode, in segment order
+_ARRAYS = {
+    "str_offsets": "Q",
+    "str_blob": "B",
+    "m_key": "I",                # supplier key string id, sorted by key
+    **{f"m_{i}_val": "I" for i in range(len(MAP_COLUMNS))},
+    **{f"m_{i}_tag": "B" for i in range(len(MAP_COLUMNS))},
+    "r_order": "I",              # FT row number (rows are stored grouped by PO)
+    "r_consignor": "I",
+    "r_po": "I",
+    "r_supplier": "I",
+    "r_consignee": "I",
+    "r_crop": "B",               # index into crop names
+    "r_trays": "d",
+    "g_key": "I",                # "company<US>po_norm" string id, sorted
+    "g_start": "I",
+    "g_end": "I",
+    "d_key": "I",                # "company<US>po_digits" string id, sorted
+    "d_group": "I",
+}
+
+
+def _tag(v):
+    """(tag, text) for one Account Maps cell."""
+    import math
+
+    if v is None or (isinstance(v, float) and math.isnan(v)):
+        return _NONE, ""
+    if isinstance(v, str):
+        return _STR, v
+    if hasattr(v, "item"):
+        v = v.item()
+    if isinstance(v, bool) or not isinstance(v, (int, float)):
+        return _STR, str(v)
+    return (_INT, str(v)) if isinstance(v, int) else (_FLOAT, repr(v))
+
+
+def _untag(tag, text):
+    if tag == _NONE:
+        return float("nan")
+    if tag == _INT:
+        return int(text)
+    if tag == _FLOAT:
+        return float(text)
+    return text
+
+
+class _StringBuilder:
+    def __init__(self):
+        self.ids = {}
+        self.items = []
+
+    def add(self, s: str) -> int:
+        i = self.ids.get(s)
+        if i is None:
+            i = self.ids[s] = len(self.items)
+            self.items.append(s)
+        return i
+
+
+class RefTables:
+    """Account maps + FT PO index as flat arrays (see module docstring)."""
+
+    def __init__(self, arrays: dict, meta: dict, shm=None):
+        self.a = arrays
+        self.meta = meta
+        self.columns = meta["columns"]
+        self._crops = meta["crops"]
+        self._shm = shm  # keeps an attached segment mapped
+
+    # -------------------------
+    # Build
+    # -------------------------
+    @classmethod
+    def compile(cls, mapping_df: pd.DataFrame, ft_df: pd.DataFrame) -> "RefTables":
+        """ft_df: FT summary (e.g. FtIndex.frame()); only company consignors with a configured crop are kept."""
+        import pandas as pd
+        from excel_ops import CONSIGNOR_COMPANY, crop_series
+
+        strings = _StringBuilder()
+        a = {name: array(code) for name, code in _ARRAYS.items()}
+
+        # Account maps: first row per normalised supplier (as allocate's .values[0])
+        columns = ["Supplier"] + [c for c in MAP_COLUMNS if c in mapping_df.columns]
+        present = [c in mapping_df.columns for c in MAP_COLUMNS]
+        suppliers = mapping_df["Supplier"].astype(str).str.strip().str.lower().tolist()
+        col_values = [mapping_df[c].values if ok else None for c, ok in zip(MAP_COLUMNS, present)]
+        first = {}
+        for i, key in enumerate(suppliers):
+            if isinstance(key, str):  # blank Supplier cells never match a grower
+                first.setdefault(key, i)
+        for key in sorted(first, key=lambda k: k.encode()):
+            i = first[key]
+            a["m_key"].append(strings.add(key))
+            for j, vals in enumerate(col_values):
+                tag, text = _tag(vals[i]) if vals is not None else (_NONE, "")
+                a[f"m_{j}_val"].append(strings.add(text))
+                a[f"m_{j}_tag"].append(tag)
+
+        # FT rows, grouped by (company, normalised PO), original order kept within a group
+        ft = ft_df.reset_index(drop=True)
+        consignors = ft[CONSIGNOR_COL].astype(str)
+        crops = crop_series(ft)
+        keep = consignors.isin(CONSIGNOR_COMPANY) & crops.notna()
+        ft, consignors, crops = ft[keep], consignors[keep], crops[keep]
+        crop_names = list(CROPS)
+        pos = ft[PO_COL].astype(str).tolist()
+        trays = pd.to_numeric(ft[TRAYS_COL], errors="coerce").fillna(0).tolist()
+        suppliers = [str(v).strip() for v in ft[SUPPLIER_COL].tolist()]  # as split_from_po_rows
+        if CONSIGNEE_COL in ft.columns:
+            consignees = ft[CONSIGNEE_COL].map(lambda v: "" if pd.isna(v) else str(v).strip()).tolist()
+        else:
+            consignees = [""] * len(ft)
+
+        po_norm = {po: norm(po) for po in set(pos)}
+        groups = {}
+        for i, (consignor, po) in enumerate(zip(consignors.tolist(), pos)):
+            key = f"{CONSIGNOR_COMPANY[consignor]}{_SEP}{po_norm[po]}"
+            groups.setdefault(key, []).append(i)
+
+        order = ft.index.tolist()
+        crop_list = [crop_names.index(c) for c in crops.tolist()]
+        consignor_list = consignors.tolist()
+        digits = []
+        for g, key in enumerate(sorted(groups, key=lambda k: k.encode())):
+            a["g_key"].append(strings.add(key))
+            a["g_start"].append(len(a["r_order"]))
+            for i in groups[key]:
+                a["r_order"].append(order[i])
+                a["r_consignor"].append(strings.add(consignor_list[i]))
+                a["r_po"].append(strings.add(str(pos[i]).strip()))
+                a["r_supplier"].append(strings.add(suppliers[i]))
+                a["r_consignee"].append(strings.add(consignees[i]))
+                a["r_crop"].append(crop_list[i])
+                a["r_trays"].append(float(trays[i]))
+            a["g_end"].append(len(a["r_order"]))
+            company, po_norm = key.split(_SEP, 1)
+            d = digits_only(po_norm)
+            if d:
+                digits.append((f"{company}{_SEP}{d}".encode(), g))
+        for dkey, g in sorted(digits):
+            a["d_key"].append(strings.add(dkey.decode()))
+            a["d_group"].append(g)
+
+        blob = bytearray()
+        a["str_offsets"].append(0)
+        for s in strings.items:
+            blob += s.encode()
+            a["str_offsets"].append(len(blob))
+        a["str_blob"] = array("B", bytes(blob))
+
+        return cls(a, {"columns": columns, "present": present, "crops": crop_names})
+
+    # -------------------------
+    # Shared memory
+    # -------------------------
+    def to_bytes(self) -> bytes:
+        header = json.dumps({
+            "meta": self.meta,
+            "lengths": {name: len(self.a[name]) for name in _ARRAYS},
+        }).encode()
+        head = _MAGIC + struct.pack("<I", len(header)) + header
+        head += b"\0" * (-len(head) % 8)  # keep the arrays 8-byte aligned
+        return head + b"".join(self.a[name].tobytes() for name in _ARRAYS)
+
+    def publish(self, name: str = None):
+        """Copies the tables into a new shared memory segment. Returns the SharedMemory
+           (keep it referenced; call .close() and .unlink() when the workers are done)."""
+        from multiprocessing import shared_memory
+
+        data = self.to_bytes()
+        shm = shared_memory.SharedMemory(name=name, create=True, size=len(data))
+        shm.buf[:len(data)] = data
+        return shm
+
+    @classmethod
+    def from_buffer(cls, buf, shm=None) -> "RefTables":
+        """Tables as views into buf (no copy)."""
+        mv = memoryview(buf)
+        if bytes(mv[:4]) != _MAGIC:
+            raise ValueError("Not a reference table segment")
+        (hlen,) = struct.unpack_from("<I", mv, 4)
+        header = json.loads(bytes(mv[8:8 + hlen]))
+        offset = 8 + hlen
+        offset += -offset % 8
+        arrays = {}
+        for name, code in _ARRAYS.items():
+            n = header["lengths"][name]
+            size = n * array(code).itemsize
+            arrays[name] = mv[offset:offset + size].cast(code)
+            offset += size
+        return cls(arrays, header["meta"], shm)
+
+    @classmethod
+    def attach(cls, name: str) -> "RefTables":
+        """Maps a segment published by another process."""
+        from multiprocessing import shared_memory
+
+        shm = shared_memory.SharedMemory(name=name)
+        return cls.from_buffer(shm.buf, shm)
+
+    def close(self):
+        """Releases the views and unmaps an attached segment (does not unlink it)."""
+        for v in self.a.values():
+            if isinstance(v, memoryview):
+                v.release()
+        self.a = {}
+        if self._shm is not None:
+            self._shm.close()
+            self._shm = None
+
+    # -------------------------
+    # Lookups
+    # -------------------------
+    def _bytes(self, sid: int) -> bytes:
+        offs = self.a["str_offsets"]
+        return bytes(self.a["str_blob"][offs[sid]:offs[sid + 1]])
+
+    def _str(self, sid: int) -> str:
+        return self._bytes(sid).decode()
+
+    def _range(self, ids, key: bytes):
+        """[lo, hi) of entries in sorted string-id array `ids` equal to key."""
+        lo, hi = 0, len(ids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(ids[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        start, hi = lo, len(ids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(ids[mid]) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return start, lo
+
+    def account_row(self, grower):
+        """Same contract as allocator.mapping_lookup: {column: value} or None."""
+        lo, hi = self._range(self.a["m_key"], str(grower).strip().lower().encode())
+        if lo == hi:
+            return None
+        out = {}
+        for j, (col, ok) in enumerate(zip(MAP_COLUMNS, self.meta["present"])):
+            if ok:
+                out[col] = _untag(self.a[f"m_{j}_tag"][lo], self._str(self.a[f"m_{j}_val"][lo]))
+        return out
+
+    def _po_row_ids(self, cust_po: str, company: str):
+        groups = set()
+        lo, hi = self._range(self.a["g_key"], f"{company}{_SEP}{norm(cust_po)}".encode())
+        groups.update(range(lo, hi))
+        d = digits_only(cust_po)
+        if d:
+            lo, hi = self._range(self.a["d_key"], f"{company}{_SEP}{d}".encode())
+            groups.update(self.a["d_group"][lo:hi])
+        rows = [r for g in groups for r in range(self.a["g_start"][g], self.a["g_end"][g])]
+        return sorted(rows, key=lambda r: self.a["r_order"][r])
+
+    def crop_splits(self, cust_po: str, company: str):
+        """Same result as excel_ops.get_crop_splits on the FT these tables were compiled from."""
+        by_crop = {}
+        for r in self._po_row_ids(cust_po, company):
+            by_crop.setdefault(self._crops[self.a["r_crop"][r]], []).append(r)
+
+        out = {}
+        for crop, rows in by_crop.items():
+            consignee = next((c for c in (self._str(self.a["r_consignee"][r]) for r in rows) if c), None)
+            total = float(sum(self.a["r_trays"][r] for r in rows))
+            if total <= 0:
+                out[crop] = ({}, 0, consignee)
+                continue
+            splits = {}
+            for r in rows:
+                grower, trays = self._str(self.a["r_supplier"][r]), self.a["r_trays"][r]
+                if grower and trays > 0:
+                    splits[grower] = splits.get(grower, 0.0) + (trays / total)
+            out[crop] = (splits, total, consignee)
+        return out
+
+    def frame(self) -> pd.DataFrame:
+        """The compiled FT rows as an FT-shaped DataFrame (for PO suggestions / reconciliation)."""
+        import pandas as pd
+
+        rows = sorted(range(len(self.a["r_order"])), key=lambda r: self.a["r_order"][r])
+        return pd.DataFrame({
+            CONSIGNOR_COL: [self._str(self.a["r_consignor"][r]) for r in rows],
+            PO_COL: [self._str(self.a["r_po"][r]) for r in rows],
+            SUPPLIER_COL: [self._str(self.a["r_supplier"][r]) for r in rows],
+            CROP_COL: [self._crops[self.a["r_crop"][r]] for r in rows],
+            CONSIGNEE_COL: [self._str(self.a["r_consignee"][r]) or None for r in rows],
+            TRAYS_COL: [self.a["r_trays"][r] for r in rows],
+        })
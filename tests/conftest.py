@@ -0,0 +1,93 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The app modules live at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+CONSIGNEES = Path(__file__).resolve().parent.parent / "data" / "consignees.xlsx"
+
+
+@pytest.fixture
+def ft_frame():
+    """FT summary rows: (consignor, po, supplier, crop, trays[, date]) -> DataFrame."""
+    import pandas as pd
+    from constants import CONSIGNOR_COL, SUPPLIER_COL, PO_COL, TRAYS_COL, CROP_COL, DATE_COL, CONSIGNEE_COL
+
+    def build(rows):
+        return pd.DataFrame([
+            {
+                CONSIGNOR_COL: r[0], PO_COL: r[1], SUPPLIER_COL: r[2], CROP_COL: r[3], TRAYS_COL: r[4],
+                DATE_COL: r[5] if len(r) > 5 else "2026-01-05", CONSIGNEE_COL: "Sydney Markets",
+            }
+            for r in rows
+        ])
+
+    return build
+
+
+def make_pdf(lines) -> bytes:
+    """One-page PDF showing `lines` of text, one per text line."""
+    def esc(s):
+        return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    content = "BT /F1 10 Tf 40 800 Td 14 TL\n" + "".join(f"({esc(l)}) Tj T*\n" for l in lines) + "ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R "
+        "/Resources << /Font << /F1 5 0 R >> >> >>",
+        f"<< /Length {len(content)} >>\nstream\n{content}\nendstream",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out, offsets = b"%PDF-1.4\n", []
+    for i, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+# Invoice text per vendor, as the parsers expect it
+VALLEY_FRESH_LINES = [
+    "TAX INVOICE 123456", "Vendor", "ABN 61 050 197 343", "Date: 12/01/2026", "Cust. Order No: PO7788-1",
+    "LOGISTIC CHARGE 120 0.85 10.20 102.00", "BB125 punnet", "FREIGHT 1 50.00 5.00 50.00", "TOTAL 167.20",
+]
+BACHE_LINES = [
+    "Vendor ABN 29 612 732 064", "Invoice Number", "BB-1234", "Invoice Date", "3 Feb 2026", "Reference", "PO5544",
+    "FREIGHT 20.00", "BLUEBERRY 12x125g 40 0.85 3.40 34.00",
+]
+
+DE_LUCA_LINES = [
+    "Tax Invoice No: 556677", "Vendor", "ABN 45 105 141 553", "Date 14/01/2026", "Cust Order No", "PO9911-2",
+    "BLUEBERRIES 12x125g 50 0.85 42.50 4.25 46.75",
+    "BLUEBERRY FREIGHT 1 20.00 20.00 2.00 22.00",
+    "TSPT SYD 1 10.00 10.00 1.00 11.00",
+]
+
+
+@pytest.fixture
+def batch_files(ft_frame):
+    """(ft.xlsx bytes, maps.xlsx bytes) matching VALLEY_FRESH_LINES / BACHE_LINES."""
+    import io
+    import pandas as pd
+
+    ft = ft_frame([
+        ("Valley Fresh Sydney", "PO7788", "Grower A", "Blueberry", 80),
+        ("Valley Fresh Sydney", "PO7788", "Grower B", "Blueberry", 40),
+        ("Bache Bros Warehouse", "PO5544", "Grower C", "Blueberry", 40),
+    ])
+    maps = pd.DataFrame([
+        {"Supplier": g, "Logistics Account": f"5-{i}100", "Freight Account": f"5-{i}200", "Job Code": f"J{i}"}
+        for i, g in enumerate(["Grower A", "Grower B", "Grower C"])
+    ])
+    out = []
+    for df in (ft, maps):
+        buf = io.BytesIO()
+        df.to_excel(buf, index=False)
+        out.append(buf.getvalue())
+    return tuple(out)
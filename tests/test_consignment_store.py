@@ -0,0 +1,34 @@
+from consignment_store import ConsignmentStore
+from excel_ops import get_grower_split
+
+
+def test_ingest_keeps_repeated_lines_and_replaces_shipments(tmp_path, ft_frame):
+    store = ConsignmentStore(tmp_path / "ft.sqlite")
+    january = ft_frame([
+        ("Bache Bros Warehouse", "PO100", "G1", "Blueberry", 10),
+        ("Bache Bros Warehouse", "PO100", "G1", "Blueberry", 10),  # second pallet
+        ("Bache Bros Warehouse", "PO100", "G2", "Blueberry", 4),
+    ])
+    assert store.ingest(january) == 3
+    assert store.ingest(january) == 0  # overlapping export: no duplicates
+    assert len(store) == 3
+
+    corrected = ft_frame([("Bache Bros Warehouse", "PO100", "G1", "Blueberry", 12)])
+    assert store.ingest(corrected) == -2
+    later = ft_frame([("Bache Bros Warehouse", "PO100", "G2", "Blueberry", 6, "2026-02-01")])
+    assert store.ingest(later) == 1
+    assert store.frame()["Trays"].tolist() == [12.0, 6.0]
+
+
+def test_po_lookup_covers_all_history(tmp_path, ft_frame):
+    store = ConsignmentStore(tmp_path / "ft.sqlite")
+    store.ingest(ft_frame([("Bache Bros Warehouse", "PO 100", "G1", "Blueberry", 30)]))
+    store.ingest(ft_frame([
+        ("Bache Bros Warehouse", "100", "G2", "Blueberry", 10, "2026-02-01"),
+        ("Valley Fresh Sydney", "PO100", "G3", "Blueberry", 99, "2026-02-01"),
+    ]))
+
+    assert store.po_rows("po100", "Bache Bros Pty Ltd")["Supplier"].tolist() == ["G1", "G2"]
+    assert store.po_rows("PO100", "Unknown Co").empty
+    splits, trays, _ = get_grower_split(store, "PO100", "Bache Bros Pty Ltd")
+    assert (splits, trays) == ({"G1": 0.75, "G2": 0.25}, 40.0)
@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import history_store  # noqa: E402
+
+
+def _rows(invoice, date, lines, company="Bache Bros Pty Ltd", po="PO1"):
+    """lines: (grower, account, charge type, amount)."""
+    return [
+        {"Co./Last Name": company, "Date": date, "Supplier Invoice No.": invoice, "Description": f"{ch} line",
+         "Account No.": account, "Amount": amount, "Job": "J1", "Tax Code": "GST", "Comment": po,
+         "Grower": grower, "Charge Type": ch}
+        for grower, account, ch, amount in lines
+    ]
+
+
+JAN = _rows("1", "12/01/2026", [("G1", "5-100", "Logistics", 30.0), ("G1", "5-200", "Freight", 5.0),
+                                ("G2", "5-100", "Logistics", 10.0)])
+FEB = _rows("2", "03/02/2026", [("G1", "5-100", "Logistics", 20.0), ("G1", "5-200", "Freight", 2.5)])
+
+
+def test_repeat_downloads_only_add_new_invoices(tmp_path):
+    root = tmp_path / "history"
+    assert history_store.write_batch(JAN, root) == 3
+    assert history_store.write_batch(JAN, root) == 0
+    assert history_store.write_batch(JAN + FEB, root) == 2  # export downloaded again after more invoices
+    assert history_store.write_batch([], root) == 0
+
+    out = history_store.rollup(by=["period"], root=root)
+    assert out.to_dict("records") == [
+        {"period": "2026-01", "amount": 45.0, "lines": 3},
+        {"period": "2026-02", "amount": 22.5, "lines": 2},
+    ]
+
+
+def test_rollup_groups_and_filters(tmp_path):
+    root = tmp_path / "history"
+    history_store.write_batch(JAN + FEB, root)
+
+    out = history_store.rollup(by=["grower", "charge_type"], root=root)
+    assert out.values.tolist() == [
+        ["G1", "Freight", 7.5, 2], ["G1", "Logistics", 50.0, 2], ["G2", "Logistics", 10.0, 1],
+    ]
+    out = history_store.rollup(by=["account"], root=root, period_from="2026-02", grower=["G1", "G2"])
+    assert out.values.tolist() == [["5-100", 20.0, 1], ["5-200", 2.5, 1]]
+    assert history_store.rollup(root=root, company="Nobody").empty
+    assert history_store.rollup(root=tmp_path / "missing").empty
+    with pytest.raises(ValueError, match="Cannot group by"):
+        history_store.rollup(by=["amount"], root=root)
@@ -0,0 +1,10 @@
+import pytest
+
+from bench_imports import BUDGETS_MS, HEAVY, import_profile
+
+
+@pytest.mark.parametrize("module", sorted(BUDGETS_MS))
+def test_core_module_imports_no_heavy_dependency(module):
+    _, packages = import_profile(module, repeat=1)
+    assert module in packages
+    assert not sorted(p for p in HEAVY if p in packages)
@@ -0,0 +1,119 @@
+import io
+import threading
+from http.server import ThreadingHTTPServer
+from urllib.error import HTTPError
+
+import pandas as pd
+import pytest
+
+import jobs
+from conftest import BACHE_LINES, VALLEY_FRESH_LINES, make_pdf
+
+
+def _submit(queue, batch_files, names=("vf.pdf", "bache.pdf")):
+    ft, maps = batch_files
+    pdfs = {"vf": make_pdf(VALLEY_FRESH_LINES), "bache": make_pdf(BACHE_LINES)}
+    return queue.submit([(n, pdfs[n.split(".")[0].split("_")[0]]) for n in names], ("ft.xlsx", ft), ("maps.xlsx", maps))
+
+
+def test_queue_lifecycle(tmp_path):
+    queue = jobs.JobQueue(tmp_path)
+    first = queue.submit([("a.pdf", b"%PDF")], ("ft.xlsx", b""), ("maps.xlsx", b""))
+    second = queue.submit([], ("ft.xlsx", b""), ("maps.xlsx", b""))
+    assert queue.get(first)["status"] == "queued" and queue.get(first)["total"] == 1
+    assert [j["id"] for j in queue.list()] == [second, first]
+
+    assert queue.claim() == first  # oldest first
+    assert queue.get(first)["status"] == "running"
+    queue.progress(first, 1)
+    assert queue.get(first)["done"] == 1
+
+    assert queue.requeue_running() == 1
+    assert queue.claim() == first
+    queue.finish(first, result={"rows": [], "failed": [], "meta": {}})
+    assert queue.get(first)["status"] == "done"
+    assert queue.result(first) == {"rows": [], "failed": [], "meta": {}}
+
+    assert queue.claim() == second
+    queue.finish(second, error="ValueError: bad workbook")
+    assert queue.get(second)["status"] == "failed"
+    assert queue.claim() is None
+    assert queue.get("missing") is None and queue.result(second) is None
+
+
+def test_run_job_allocates_each_invoice_once(tmp_path, batch_files):
+    queue = jobs.JobQueue(tmp_path)
+    job_id = _submit(queue, batch_files, ("vf.pdf", "bache.pdf", "vf_resent.pdf"))
+    result = jobs.run_job(queue, job_id)
+
+    assert result["failed"] == []
+    assert {r["Supplier Invoice No."] for r in result["rows"]} == {"123456", "BB-1234"}
+    assert sum(r["Supplier Invoice No."] == "123456" for r in result["rows"]) == 4  # 2 growers x 2 charges
+    assert round(sum(r["Amount"] for r in result["rows"]), 2) == 206.0
+    assert queue.get(job_id)["done"] == 3
+
+
+def test_run_job_reads_upper_case_pdf_names(tmp_path, batch_files):
+    queue = jobs.JobQueue(tmp_path)
+    job_id = _submit(queue, batch_files, ("vf.PDF", "bache.Pdf"))
+    result = jobs.run_job(queue, job_id)
+    assert {r["Supplier Invoice No."] for r in result["rows"]} == {"123456", "BB-1234"}
+    assert queue.get(job_id)["done"] == 2
+
+
+def test_run_job_on_published_ref_tables_matches_the_workbooks(tmp_path, batch_files):
+    queue = jobs.JobQueue(tmp_path)
+    publisher = jobs.RefPublisher(keep=1)
+    try:
+        ft, maps = batch_files
+        ref = publisher.publish(ft, maps)
+        assert publisher.publish(ft, maps) == ref  # compiled once per maps/FT pair
+
+        names = ("vf.pdf", "bache.pdf", "vf_resent.pdf")
+        plain = jobs.run_job(queue, _submit(queue, batch_files, names))
+        pdfs = {"vf": make_pdf(VALLEY_FRESH_LINES), "bache": make_pdf(BACHE_LINES)}
+        shared = queue.submit([(n, pdfs[n.split(".")[0].split("_")[0]]) for n in names],
+                              ("ft.xlsx", ft), ("maps.xlsx", maps), ref=ref)
+        assert queue.get(shared)["ref"] == ref
+        assert jobs.run_job(queue, shared) == plain
+
+        other = io.BytesIO()
+        pd.read_excel(io.BytesIO(maps)).head(1).to_excel(other, index=False)
+        publisher.publish(ft, other.getvalue())  # another pair: the oldest segment is unlinked
+        assert jobs._attach_ref(ref) is None
+        stale = queue.submit([], ("ft.xlsx", ft), ("maps.xlsx", maps), ref=ref)
+        assert jobs.run_job(queue, stale) == {"rows": [], "failed": [], "meta": {}}
+    finally:
+        publisher.close()
+
+
+@pytest.fixture
+def server(tmp_path):
+    queue = jobs.JobQueue(tmp_path)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), jobs._make_handler(queue))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield queue, f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_http_api(server, batch_files):
+    queue, url = server
+    ft, maps = batch_files
+    job_id = jobs.submit_batch(url, [("vf.pdf", make_pdf(VALLEY_FRESH_LINES))], ("ft.xlsx", ft), ("maps.xlsx", maps))
+    assert jobs.job_status(url, job_id)["status"] == "queued"
+    assert [j["id"] for j in jobs.list_jobs(url)] == [job_id]
+    with pytest.raises(HTTPError) as e:
+        jobs.job_result(url, job_id)
+    assert e.value.code == 409
+
+    assert queue.claim() == job_id  # what a worker does
+    queue.finish(job_id, result=jobs.run_job(queue, job_id))
+    result = jobs.job_result(url, job_id)
+    assert jobs.job_status(url, job_id)["status"] == "done"
+    assert len(result["rows"]) == 4 and result["failed"] == []
+
+    with pytest.raises(HTTPError) as e:
+        jobs.job_status(url, "missing")
+    assert e.value.code == 404
@@ -0,0 +1,49 @@
+import jobs
+import pipeline
+from conftest import BACHE_LINES, VALLEY_FRESH_LINES, make_pdf
+from journal import BatchJournal, batch_id, file_id
+
+
+def _result(key, rows=(), reason=None):
+    failure = {"Company": "Co", "Invoice No.": key, "PO No.": "PO1", "Reason": reason, "Key": key} if reason else None
+    return {"Key": key, "Meta": {"Key": key}, "Rows": list(rows), "Failure": failure}
+
+
+def test_batch_id_depends_on_files_and_reference_data():
+    a, b = file_id("a.pdf", b"1"), file_id("b.pdf", b"2")
+    assert batch_id([a, b], b"ft") == batch_id([b, a], b"ft")
+    assert batch_id([a, b], b"ft") != batch_id([a, b], b"ft2")
+    assert file_id("a.pdf", b"1") != file_id("a.pdf", b"changed")
+
+
+def test_journal_resumes_and_drops_partial_line(tmp_path):
+    j = BatchJournal("b1", root=tmp_path)
+    j.record("a|1", _result("k1", [{"Amount": 1.0}]))
+    j.record("b|2", _result("k2", reason="Mismatch, 1 v 2"))
+    with open(j.path, "a") as fh:
+        fh.write('{"file": "c|3", "key"')  # crash mid-write
+
+    j2 = BatchJournal("b1", root=tmp_path)
+    assert "a|1" in j2 and "b|2" in j2 and "c|3" not in j2
+    assert [(e["key"], e["rows"], bool(e["failure"])) for e in j2.entries()] == [
+        ("k1", [{"Amount": 1.0}], False), ("k2", [], True),
+    ]
+    j2.record("c|3", _result("k3"))
+    assert len(BatchJournal("b1", root=tmp_path)) == 3
+    j2.discard()
+    assert len(BatchJournal("b1", root=tmp_path)) == 0
+
+
+def test_requeued_job_carries_on_from_its_journal(tmp_path, batch_files, monkeypatch):
+    queue = jobs.JobQueue(tmp_path)
+    ft, maps = batch_files
+    job_id = queue.submit([("vf.pdf", make_pdf(VALLEY_FRESH_LINES)), ("bache.pdf", make_pdf(BACHE_LINES))],
+                          ("ft.xlsx", ft), ("maps.xlsx", maps))
+    first = jobs.run_job(queue, job_id)
+
+    def crash(self, pdf, repack_growers=None):
+        raise AssertionError("journaled PDF processed again")
+
+    monkeypatch.setattr(pipeline.Pipeline, "process", crash)
+    assert jobs.run_job(queue, job_id) == first
+    assert len(first["rows"]) == 6
@@ -0,0 +1,72 @@
+import math
+
+import pytest
+
+from conftest import BACHE_LINES, DE_LUCA_LINES, VALLEY_FRESH_LINES
+from line_items import LineItem, LineItemStore, summarize
+from parsers import parse_text
+
+NAN = float("nan")
+
+LINES = [
+    LineItem("Logistics", "Blueberry", 10, 0.85, NAN, 8.5),
+    LineItem("Logistics", "Raspberry", 4, 0.85, NAN, 3.4),
+    LineItem("Freight", None, NAN, NAN, NAN, 5.0),
+]
+
+
+def _same(a, b):
+    """LineItem equality with NaN == NaN."""
+    return a[:2] == b[:2] and all(x == y or (math.isnan(x) and math.isnan(y)) for x, y in zip(a[2:], b[2:]))
+
+
+def test_summarize_charges_trays_and_crops():
+    charges, trays, crops = summarize(LINES, charge_order=("Freight", "Logistics"), ndigits=2)
+    assert list(charges) == ["Freight", "Logistics"]
+    assert charges == {"Freight": 5.0, "Logistics": 11.9}
+    assert trays == 14
+    assert crops == {"Blueberry": {"Logistics": 8.5, "Trays": 10}, "Raspberry": {"Logistics": 3.4, "Trays": 4}}
+
+
+def test_store_add_replace_and_identical_readd():
+    store = LineItemStore()
+    assert store.add("k1", "Vendor A", "1", LINES)
+    assert not store.add("k1", "Vendor A", "1", [tuple(li) for li in LINES])  # identical (NaN == NaN)
+    assert store.add("k2", "Vendor B", "2", LINES[:1])
+    assert store.add("k1", "Vendor A", "1", LINES[2:])  # re-parsed: replaces
+    assert len(store) == 2
+    assert [li.line_type for li in store.lines("k1")] == ["Freight"]
+    assert store.trays("k2") == 10
+    assert store.lines("missing") == []
+
+
+def test_store_save_load_round_trip(tmp_path):
+    store = LineItemStore()
+    store.add("k1", "Vendor A", "1", LINES)
+    store.add("k2", "Vendor B", "2", LINES[:1])
+    store.add("k1", "Vendor A", "1", LINES[:2])  # leaves replaced lines to compact on save
+    path = tmp_path / "lines.bin"
+    store.save(path)
+
+    loaded = LineItemStore.load(path)
+    assert list(loaded) == ["k1", "k2"]
+    assert [_same(a, b) for a, b in zip(loaded.lines("k1"), LINES[:2])] == [True, True]
+    frame = loaded.frame(["k2"])
+    assert frame[["Key", "Vendor", "Invoice No.", "Crop", "Qty"]].values.tolist() == [["k2", "Vendor B", "2", "Blueberry", 10.0]]
+    assert LineItemStore.load(tmp_path / "absent.bin").keys == []
+
+
+@pytest.mark.parametrize("lines", [VALLEY_FRESH_LINES, BACHE_LINES, DE_LUCA_LINES])
+def test_parsers_derive_charges_and_trays_from_their_lines(lines):
+    _, (_, _, _, charges, trays, crops, items) = parse_text("\n".join(lines))
+    assert items and summarize(items) == (charges, trays, crops)
+    assert {li.line_type for li in items} == {"Logistics", "Freight"}
+
+
+def test_deluca_freight_line_naming_the_crop_stays_freight():
+    # Same charges and trays as the parser before line items: a "BLUEBERRY FREIGHT" line is freight
+    company, (invoice_no, cust_po, invoice_date, charges, trays, crops, _) = parse_text("\n".join(DE_LUCA_LINES))
+    assert company == "De Luca Banana Marketing"
+    assert (invoice_no, cust_po, invoice_date) == ("556677", "PO9911", "14/01/2026")
+    assert (charges, trays) == ({"Logistics": 42.5, "Freight": 30.0}, 50)
+    assert crops == {"Blueberry": {"Logistics": 42.5, "Trays": 50}}
@@ -0,0 +1,62 @@
+import pandas as pd
+
+from conftest import BACHE_LINES, make_pdf
+from excel_ops import FtIndex
+from maps_check import MapIndex, check_maps, has_problems
+from pipeline import Pipeline
+
+MAPS = pd.DataFrame([
+    {"Supplier": "G1", "Logistics Account": "5-100", "Freight Account": "5-200", "Job Code": "J1"},
+    {"Supplier": " g1 ", "Logistics Account": "5-100", "Freight Account": "5-200", "Job Code": "J1"},  # same
+    {"Supplier": "G2", "Logistics Account": "5-110", "Freight Account": "5-210", "Job Code": "J2"},
+    {"Supplier": "g2", "Logistics Account": "5-999", "Freight Account": "5-210", "Job Code": "J2"},  # conflicts
+    {"Supplier": "G3", "Logistics Account": None, "Freight Account": "5-220", "Job Code": " "},
+    {"Supplier": "G4", "Logistics Account": "5-130", "Freight Account": None, "Job Code": "J4"},
+    {"Supplier": None, "Logistics Account": "5-140", "Freight Account": "5-240", "Job Code": "J5"},
+])
+
+
+def test_map_index_uses_the_first_row_per_supplier():
+    index = MapIndex(MAPS)
+    assert {"g1", "g2", "g3", "g4"} <= set(index.rows)
+    assert "  G2" in index and "G9" not in index
+    assert index.account_row("g2")["Logistics Account"] == "5-110"
+    assert index.account_row("G9") is None
+    assert index.columns == list(MAPS.columns)
+
+
+def test_check_maps_reports_every_problem(ft_frame):
+    ft = ft_frame([
+        ("Bache Bros Warehouse", "PO1", "G1", "Blueberries", 10),
+        ("Bache Bros Warehouse", "PO2", "G3", "Blueberries", 5),
+        ("Bache Bros Warehouse", "PO2", "G7", "Raspberries", 4),
+        ("Bache Bros Warehouse", "PO3", "G7", "Raspberries", 6),
+        ("Bache Bros Warehouse", "PO4", "G8", "Cherries", 6),     # crop not handled
+        ("Other Consignor", "PO5", "G9", "Blueberries", 6),       # not an uploaded company
+    ])
+    report = check_maps(MAPS, ft)
+
+    assert report["missing_columns"] == []
+    assert report["duplicates"].values.tolist() == [["G1", "2, 3", False], ["G2", "4, 5", True]]
+    assert report["blank_fields"].values.tolist() == [
+        ["G3", 6, "Logistics Account, Job Code", True], ["G4", 7, "Freight Account", False],
+    ]
+    assert report["unmapped"].values.tolist() == [["Bache Bros Pty Ltd", "Raspberry", "G7", 2, 10.0]]
+    assert dict(report["summary"].values.tolist())["Unmapped FT growers"] == 1
+    assert has_problems(report)
+
+
+def test_clean_maps_have_no_problems(ft_frame):
+    maps = MAPS.iloc[[0, 2]]
+    report = check_maps(maps, ft_frame([("Bache Bros Warehouse", "PO1", "G2", "Blueberries", 10)]))
+    assert not has_problems(report)
+    assert check_maps(maps.drop(columns=["Job Code"]))["missing_columns"] == ["Job Code"]
+
+
+def test_pipeline_gives_the_same_result_with_the_index(ft_frame):
+    ft = FtIndex(ft_frame([("Bache Bros Warehouse", "PO5544", "G2", "Blueberries", 40)]))
+    maps = MAPS.iloc[[2, 3, 4]]
+    pdf = make_pdf(BACHE_LINES)
+    want = Pipeline(ft, maps, {}).process(pdf)
+    assert want["Failure"] is None
+    assert Pipeline(ft, MapIndex(maps), {}).process(pdf)["Rows"] == want["Rows"]
@@ -0,0 +1,104 @@
+import json
+import os
+
+import pytest
+
+import pdf_backends
+import parsers
+from conftest import BACHE_LINES, VALLEY_FRESH_LINES, make_pdf
+
+
+@pytest.fixture
+def fixtures(tmp_path):
+    paths = []
+    for name, lines in (("vf.pdf", VALLEY_FRESH_LINES), ("bache.pdf", BACHE_LINES)):
+        p = tmp_path / name
+        p.write_bytes(make_pdf(lines))
+        paths.append(p)
+    return paths
+
+
+@pytest.fixture
+def selection_path(tmp_path, monkeypatch):
+    path = tmp_path / "pdf_backends.json"
+    monkeypatch.setattr(pdf_backends, "SELECTION_PATH", path)
+    monkeypatch.setattr(pdf_backends, "_selection", (None, None))
+    return path
+
+
+def _garbled(data):
+    return pdf_backends.extract_text(data).replace("PO", "P0")
+
+
+def test_conformance_flags_backends_whose_text_parses_differently(fixtures, monkeypatch):
+    monkeypatch.setitem(pdf_backends.BACKENDS, "garbled", ("json", _garbled))
+    out = pdf_backends.check_conformance(fixtures, ["pdfplumber", "garbled"])
+    assert out == {
+        "pdfplumber": {"FRESHMAX NATIONAL PTY LTD": True, "Bache Bros Pty Ltd": True},
+        "garbled": {"FRESHMAX NATIONAL PTY LTD": False, "Bache Bros Pty Ltd": False},
+    }
+
+
+def test_select_backends_never_picks_a_non_conforming_backend(fixtures, monkeypatch):
+    monkeypatch.setitem(pdf_backends.BACKENDS, "garbled", ("json", _garbled))
+    sel = pdf_backends.select_backends(fixtures, ["pdfplumber", "garbled"], repeat=1)
+    assert sel["default"] == "pdfplumber"
+    assert sel["vendors"] == {"Bache Bros Pty Ltd": "pdfplumber", "FRESHMAX NATIONAL PTY LTD": "pdfplumber"}
+
+
+def test_selection_round_trip_drops_unavailable_backends(selection_path):
+    pdf_backends.save_selection({"default": "no-such-lib", "vendors": {"A": "pdfplumber", "B": "no-such-lib"}},
+                                selection_path)
+    assert json.loads(selection_path.read_text())["default"] == "no-such-lib"
+    assert pdf_backends.load_selection() == {"default": "pdfplumber", "vendors": {"A": "pdfplumber"}}
+
+
+def test_read_pdf_text_uses_the_vendor_pick(fixtures, selection_path):
+    if "pypdfium2" not in pdf_backends.available_backends():
+        pytest.skip("needs pypdfium2")
+    pdf_backends.save_selection({"default": "pdfplumber", "vendors": {"Bache Bros Pty Ltd": "pypdfium2"}},
+                                selection_path)
+    vf, bache = fixtures
+    assert pdf_backends.read_pdf_text(vf)[1] == "pdfplumber"
+    text, backend = pdf_backends.read_pdf_text(bache)
+    assert backend == "pypdfium2" and "BB-1234" in text
+    assert pdf_backends.read_pdf_text(bache.read_bytes(), "pdfplumber")[1] == "pdfplumber"
+
+
+def test_load_selection_rereads_a_changed_file(selection_path):
+    assert pdf_backends.load_selection() == {"default": "pdfplumber", "vendors": {}}
+    selection_path.write_text(json.dumps({"default": "pdfplumber", "vendors": {"A": "pdfplumber"}}))
+    assert pdf_backends.load_selection()["vendors"] == {"A": "pdfplumber"}
+    selection_path.write_text(json.dumps({"default": "pdfplumber", "vendors": {"B": "pdfplumber"}}))
+    st = selection_path.stat()
+    os.utime(selection_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert pdf_backends.load_selection()["vendors"] == {"B": "pdfplumber"}
+
+
+def test_parse_pdf_filelike_returns_the_backend_used(fixtures, selection_path):
+    company, fields, backend = parsers.parse_pdf_filelike(fixtures[1])
+    assert company == "Bache Bros Pty Ltd" and fields[0] == "BB-1234"
+    assert backend == "pdfplumber"
+
+
+def test_read_pdf_text_extracts_once_when_the_scan_backend_is_the_pick(fixtures, selection_path, monkeypatch):
+    avail = pdf_backends.available_backends()
+    if "pypdfium2" not in avail:
+        pytest.skip("needs pypdfium2")
+    calls = []
+    for name in avail:
+        mod, fn = pdf_backends.BACKENDS[name]
+        monkeypatch.setitem(pdf_backends.BACKENDS, name,
+                            (mod, lambda data, name=name, fn=fn: calls.append(name) or fn(data)))
+    pdf_backends.save_selection({"default": "pdfplumber", "vendors": {"Bache Bros Pty Ltd": "pypdfium2"}},
+                                selection_path)
+    vf, bache = fixtures
+
+    assert pdf_backends.read_pdf_text(bache)[1] == "pypdfium2"
+    assert calls == ["pypdfium2"]
+    calls.clear()
+    assert pdf_backends.read_pdf_text(vf)[1] == "pdfplumber"
+    assert calls == ["pypdfium2", "pdfplumber"]
+    calls.clear()
+    assert pdf_backends.read_pdf_text(vf, "pdfminer")[1] == "pdfminer"
+    assert calls == ["pdfminer"]
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from conftest import BACHE_LINES, make_pdf
+from excel_ops import FtIndex
+from pipeline import Pipeline
+
+HEADER = BACHE_LINES[:7]
+MAPS = pd.DataFrame([
+    {"Supplier": g, "Logistics Account": f"5-{i}100", "Freight Account": f"5-{i}200", "Job Code": f"J{i}"}
+    for i, g in enumerate(["G1", "G2", "G3", "G4"])
+])
+
+
+@pytest.fixture
+def pipeline(ft_frame):
+    ft = ft_frame([
+        ("Bache Bros Warehouse", "PO5544", "G1", "Blueberries", 30),
+        ("Bache Bros Warehouse", "PO5544", "G2", "Blueberries", 10),
+        ("Bache Bros Warehouse", "PO5544", "G3", "Raspberries", 20),
+        ("Bache Bros Warehouse", "PO5544", "G4", "Strawberries", 7),
+    ])
+    return Pipeline(FtIndex(ft), MAPS, {})
+
+
+def _invoice(*lines):
+    return make_pdf(HEADER + list(lines))
+
+
+def test_multi_crop_invoice_allocates_per_crop_and_shares_freight(pipeline):
+    result = pipeline.process(_invoice(
+        "FREIGHT 10.00",
+        "BLUEBERRY 12x125g 40 0.85 3.40 34.00",
+        "RASPBERRY 12x125g 20 0.85 1.70 17.00",
+        "STRAWBERRY 12x250g 7 0.85 0.60 5.95",
+    ))
+    assert result["Failure"] is None
+    rows = pd.DataFrame(result["Rows"])
+    by_crop = rows.groupby(["Crop", "Charge Type"])["Amount"].sum().round(2).to_dict()
+    assert by_crop == {
+        ("Blueberry", "Freight"): 5.97, ("Blueberry", "Logistics"): 34.0,
+        ("Raspberry", "Freight"): 2.99, ("Raspberry", "Logistics"): 17.0,
+        ("Strawberry", "Freight"): 1.04, ("Strawberry", "Logistics"): 5.95,
+    }
+    assert round(rows.loc[rows["Charge Type"] == "Freight", "Amount"].sum(), 2) == 10.0
+    assert set(rows.loc[rows["Crop"] == "Raspberry", "Grower"]) == {"G3"}
+    assert "20 x Raspberry Logistics J2" in rows["Description"].tolist()
+    assert result["Meta"]["Crop"] == "Blueberry"
+
+
+def test_single_crop_invoice_keeps_the_whole_freight(ft_frame):
+    ft = ft_frame([("Bache Bros Warehouse", "PO5544", "G1", "Blueberries", 40)])
+    result = Pipeline(FtIndex(ft), MAPS, {}).process(_invoice("FREIGHT 10.00", "BLUEBERRY 12x125g 40 0.85 3.40 34.00"))
+    assert [(r["Charge Type"], r["Amount"], r["Description"]) for r in result["Rows"]] == [
+        ("Freight", 10.0, "Blueberry Freight J0"), ("Logistics", 34.0, "40 x Blueberry Logistics J0"),
+    ]
+
+
+def test_tray_mismatch_names_the_crop(pipeline):
+    result = pipeline.process(_invoice(
+        "BLUEBERRY 12x125g 40 0.85 3.40 34.00",
+        "RASPBERRY 12x125g 19 0.85 1.62 16.15",
+        "STRAWBERRY 12x250g 7 0.85 0.60 5.95",
+    ))
+    assert result["Rows"] == []
+    assert result["Failure"]["Reason"] == "Raspberry Mismatch, 19 v 20"
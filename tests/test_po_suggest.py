@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from po_suggest import DeletionIndex, POSuggester, edit_distance, format_suggestions
+
+
+def _levenshtein(a, b):
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+@pytest.mark.parametrize("a, b, expected", [
+    ("", "", 0), ("PO123", "PO123", 0), ("PO123", "PO124", 1), ("PO123", "P0123", 1),
+    ("PO123", "PO12", 1), ("123", "PO123", 2), ("ABC", "", 3),
+])
+def test_edit_distance(a, b, expected):
+    assert edit_distance(a, b) == expected
+    assert edit_distance(b, a) == expected
+
+
+def test_bounded_edit_distance_matches_full_distance():
+    rnd = random.Random(3)
+    for _ in range(2000):
+        a = "".join(rnd.choice("PO12-") for _ in range(rnd.randrange(8)))
+        b = "".join(rnd.choice("PO12-") for _ in range(rnd.randrange(8)))
+        full = _levenshtein(a, b)
+        for k in range(4):
+            assert edit_distance(a, b, k) == min(full, k + 1)
+
+
+def test_deletion_index_finds_every_key_within_distance():
+    rnd = random.Random(5)
+    keys = {f"PO{rnd.randrange(1000, 3000)}" for _ in range(300)}
+    index = DeletionIndex(2)
+    for k in keys:
+        index.add(k)
+        index.add(k)  # repeated adds are ignored
+    for query in ["PO1234", "PO2999", "1500", "PO12", "XYZ"]:
+        expected = sorted((_levenshtein(query, k), k) for k in keys if _levenshtein(query, k) <= 2)
+        assert sorted(index.search(query, 2)) == expected
+        assert sorted(index.search(query, 1)) == [(d, k) for d, k in expected if d <= 1]
+
+
+def test_suggest_ranks_by_distance_then_tray_gap():
+    s = POSuggester({"PO1234": ("PO1234", 40.0), "PO1235": ("PO1235", 12.0), "PO9999": ("PO9999", 12.0)})
+    assert s.suggest("PO1236", invoice_trays=12) == [("PO1235", 12.0, 1), ("PO1234", 40.0, 1)]
+    assert s.suggest("") == []
+
+
+def test_suggest_truncated_po_by_digit_prefix():
+    s = POSuggester({"PO12345678": ("PO12345678", 10.0)})
+    assert [po for po, _, _ in s.suggest("12345")] == ["PO12345678"]
+
+
+def test_from_frame_totals_trays_per_normalised_po(ft_frame):
+    df = ft_frame([
+        ("Bache Bros Warehouse", "PO 77", "G1", "Blueberry", 10),
+        ("Bache Bros Warehouse", "po77", "G2", "Blueberry", 5),
+        ("Valley Fresh Sydney", "PO78", "G1", "Blueberry", 3),
+    ])
+    s = POSuggester.from_frame(df, "Bache Bros Pty Ltd")
+    assert s.po_trays == {"PO77": ("PO 77", 15.0)}
+    assert format_suggestions(s.suggest("PO76")) == "PO 77 (15 trays)"
+    assert format_suggestions([]) == ""
@@ -0,0 +1,95 @@
+import sys
+
+import pandas as pd
+import pytest
+
+from preview import PreviewCache, failed_summary, filter_frame, page_slice, reason_kind, rows_summary
+from session_store import RowStore
+
+
+def _row(company, inv, amount, grower="G1"):
+    return {"Co./Last Name": company, "Date": "12/01/2026", "Supplier Invoice No.": inv, "Description": "d",
+            "Account No.": "5-100", "Amount": amount, "Job": "J1", "Tax Code": "GST", "Comment": "PO1",
+            "Grower": grower}
+
+
+ROWS = [_row("Bache Bros Pty Ltd", "1", 10.0), _row("Bache Bros Pty Ltd", "1", 5.0, "G2"),
+        _row("De Luca Banana Marketing", "7", 2.5)]
+FAILED = [
+    {"Company": "Bache Bros Pty Ltd", "Invoice No.": "2", "PO No.": "PO2", "Reason": "Mismatch, 12 v 10"},
+    {"Company": "Bache Bros Pty Ltd", "Invoice No.": "3", "PO No.": "PO3", "Reason": "Mismatch, 4 v 5"},
+    {"Company": "De Luca Banana Marketing", "Invoice No.": "8", "PO No.": None, "Reason": "Could not read PO"},
+]
+
+
+def test_filter_frame_matches_substrings_and_reason_types():
+    rows, failed = pd.DataFrame(ROWS), pd.DataFrame(FAILED)
+    assert filter_frame(rows, {"Co./Last Name": "bache", "Grower": ""})["Amount"].tolist() == [10.0, 5.0]
+    assert filter_frame(failed, {"Reason": "Mismatch"})["Invoice No."].tolist() == ["2", "3"]
+    assert filter_frame(failed, {"PO No.": "po3", "Missing column": "x"})["Invoice No."].tolist() == ["3"]
+
+
+def test_page_slice_clamps_the_page():
+    df = pd.DataFrame({"n": range(120)})
+    page, n_pages = page_slice(df, 3, 50)
+    assert n_pages == 3 and page["n"].tolist() == list(range(100, 120))
+    assert page_slice(df, 9, 50)[0]["n"].iloc[0] == 100
+    assert page_slice(df.iloc[:0], 1, 50)[1] == 1
+
+
+def test_summaries():
+    assert rows_summary(pd.DataFrame(ROWS)).values.tolist() == [
+        ["Bache Bros Pty Ltd", 1, 2, 15.0], ["De Luca Banana Marketing", 1, 1, 2.5],
+    ]
+    assert failed_summary(pd.DataFrame(FAILED)).values.tolist() == [
+        ["Bache Bros Pty Ltd", "Mismatch", 2], ["De Luca Banana Marketing", "Could not read PO", 1],
+    ]
+
+
+def test_cache_rebuilds_only_on_a_new_version():
+    cache = PreviewCache(max_pages=2)
+    cache.sync(1, RowStore(ROWS), FAILED)
+    page, n_pages, n = cache.page("rows", {"Co./Last Name": "bache"}, 1, 50)
+    assert (n_pages, n) == (1, 2)
+    assert page["Amount"].tolist()[:2] == [10.0, 5.0] and page.iloc[2].isna().all()  # blank line per invoice
+    assert cache.page("rows", {"Co./Last Name": "bache"}, 1, 50)[0] is page
+
+    txt = cache.export_text()
+    assert txt.startswith("{}\n") and "Grower" not in txt
+    cache.sync(1, RowStore(ROWS[:1]), [])  # same version: nothing recomputed
+    assert cache.export_text() is txt
+
+    cache.sync(2, RowStore(ROWS[:1]), [])
+    assert cache["failed_summary"] is None
+    assert cache.page("rows", {}, 1, 50)[2] == 1
+
+
+@pytest.mark.parametrize("reason, kind", [
+    ("G1, G2 not in mapping", "Not in mapping"),
+    ("G7 not in mapping", "Not in mapping"),
+    ("Missing repack columns for G1", "Missing repack columns"),
+    ("Mismatch, 12 v 10", "Mismatch"),
+    ("Raspberry Mismatch, 12 v 10", "Mismatch"),
+    ("Could not process PDF: bad xref", "Could not process PDF"),
+    (" No Growers Found in FT ", "No Growers Found in FT"),
+    (None, ""),
+])
+def test_reason_kind_groups_detailed_reasons(reason, kind):
+    assert reason_kind(reason) == kind
+
+
+def test_preview_cache_size_and_drop_caches():
+    cache = PreviewCache()
+    cache.sync(1, RowStore(ROWS * 200), FAILED)
+    base = sys.getsizeof(cache)
+    assert base > cache["rows"].memory_usage(deep=True).sum()
+
+    page = cache.page("rows", {"Co./Last Name": "bache"}, 1, 50)[0]
+    txt = cache.export_text()
+    assert sys.getsizeof(cache) > base + len(txt)
+
+    cache.drop_caches()
+    assert sys.getsizeof(cache) == base
+    assert cache["rows_summary"] is not None  # what the preview shows stays
+    assert cache.page("rows", {"Co./Last Name": "bache"}, 1, 50)[0].equals(page)
+    assert cache.export_text() == txt
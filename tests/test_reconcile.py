@@ -0,0 +1,37 @@
+from reconcile import reconcile
+
+
+def test_reconcile_unmatched_and_deltas(ft_frame):
+    df = ft_frame([
+        ("Bache Bros Warehouse", "PO100", "G1", "Blueberry", 30),
+        ("Bache Bros Warehouse", "PO100", "G2", "Blueberry", 10),
+        ("Bache Bros Warehouse", "PO200", "G1", "Blueberry", 20),
+        ("Bache Bros Warehouse", "PO300", "G1", "Blueberry", 5),
+        ("Bache Bros Warehouse", "PO400", "G1", "Cherries", 99),   # crop not handled
+        ("Other Consignor", "PO500", "G1", "Blueberry", 7),      # not a company consignor
+    ])
+    invoices = [
+        {"Company": "Bache Bros Pty Ltd", "Invoice No.": "1", "PO No.": "po 100", "Invoice Trays": 40},
+        {"Company": "Bache Bros Pty Ltd", "Invoice No.": "2", "PO No.": "200", "Invoice Trays": 18},
+        {"Company": "Bache Bros Pty Ltd", "Invoice No.": "3", "PO No.": "PO999", "Invoice Trays": 4},
+    ]
+    out = reconcile(df, invoices)
+
+    assert out["unmatched_pos"].to_dict("records") == [
+        {"Company": "Bache Bros Pty Ltd", "PO No.": "PO300", "FT Trays": 5.0}
+    ]
+    assert out["unmatched_invoices"]["Invoice No."].tolist() == ["3"]
+    deltas = out["tray_deltas"].to_dict("records")
+    assert [(d["PO No."], d["Invoice Trays"], d["FT Trays"], d["Delta"]) for d in deltas] == [("PO200", 18.0, 20.0, 2.0)]
+    summary = out["summary"].set_index("Company").loc["Bache Bros Pty Ltd"]
+    assert summary["Unmatched POs"] == 1 and summary["Unmatched Invoices"] == 1 and summary["Tray Deltas"] == 1
+
+
+def test_reconcile_invoices_on_one_po_are_summed(ft_frame):
+    df = ft_frame([("Bache Bros Warehouse", "PO100", "G1", "Blueberry", 30)])
+    invoices = [
+        {"Company": "Bache Bros Pty Ltd", "Invoice No.": "1", "PO No.": "PO100", "Invoice Trays": 10},
+        {"Company": "Bache Bros Pty Ltd", "Invoice No.": "2", "PO No.": "PO100", "Invoice Trays": 20},
+    ]
+    out = reconcile(df, invoices)
+    assert out["tray_deltas"].empty and out["unmatched_pos"].empty
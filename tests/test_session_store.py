@@ -0,0 +1,117 @@
+import pytest
+
+from session_store import (
+    InvoiceMeta, InvoiceMetaStore, RowStore, deep_sizeof, memory_report, trim_to_budget,
+)
+
+
+def _meta(key, **extra):
+    return {"Company": "Bache Bros Pty Ltd", "Invoice No.": key, "PO No.": "PO1", "Key": key,
+            "Charges": {"Logistics": 10, "Freight": 2.5}, **extra}
+
+
+def test_invoice_meta_reads_like_the_pipeline_dict():
+    meta = InvoiceMeta.from_dict(_meta("k1", Growers=["G1", "G2"], Unused="x"))
+    assert meta.get("Invoice No.") == "k1"
+    assert meta.get("Charges") == {"Logistics": 10.0, "Freight": 2.5}
+    assert meta.get("Growers") == ("G1", "G2")
+    assert meta.get("Consignee", "-") == "-"
+    assert meta.get("Unknown label", 0) == 0
+
+
+def test_meta_store_evicts_oldest_unpinned():
+    store = InvoiceMetaStore(max_items=3)
+    for k in ("k1", "k2", "k3"):
+        store.put(k, _meta(k))
+    store.put("k4", _meta("k4"), pinned={"k1"})
+    assert list(store) == ["k1", "k3", "k4"]
+    store.put("k3", _meta("k3"))  # re-put moves to newest
+    store.put("k5", _meta("k5"), pinned={"k1"})
+    assert list(store) == ["k1", "k3", "k5"]
+
+    store.evict(["k3", "missing"])
+    store.retain(["k5"])
+    assert list(store) == ["k5"] and "k5" in store and store.get("k1") is None
+
+
+def test_row_store_round_trips_records():
+    rows = [
+        {"Co./Last Name": "Bache Bros Pty Ltd", "Supplier Invoice No.": "1", "Amount": 1.5},
+        {"Co./Last Name": "Bache Bros Pty Ltd", "Supplier Invoice No.": "1", "Amount": 2.0, "Extra": "x"},
+    ]
+    store = RowStore(rows)
+    assert len(store) == 2 and store
+    records = store.to_records()
+    assert [r["Amount"] for r in records] == [1.5, 2.0]
+    assert [r["Extra"] for r in records] == [None, "x"]
+    assert records[0]["Co./Last Name"] is records[1]["Co./Last Name"]  # interned once
+    assert store.to_frame()["Amount"].sum() == pytest.approx(3.5)
+    assert not RowStore()
+
+
+def test_memory_report_counts_shared_objects_once():
+    meta = InvoiceMetaStore()
+    for i in range(50):
+        meta.put(f"k{i}", _meta(f"k{i}"))
+    shared = ["x" * 1000]
+    rows, total, per_invoice = memory_report({"invoice_meta": meta, "a": shared, "b": shared})
+    assert [r["Item"] for r in rows] == ["invoice_meta", "a", "b"]
+    assert rows[1]["Bytes"] == deep_sizeof(shared) > 1000
+    assert rows[2]["Bytes"] == 0
+    assert total == rows[0]["Bytes"] + rows[1]["Bytes"]
+    assert per_invoice == pytest.approx(total / 50)
+
+
+def test_evict_oldest_skips_pinned():
+    store = InvoiceMetaStore()
+    for k in ("k1", "k2", "k3", "k4"):
+        store.put(k, _meta(k))
+    assert store.evict_oldest(2, pinned={"k1"}) == 2
+    assert list(store) == ["k1", "k4"]
+    assert store.evict_oldest(5, pinned={"k1", "k4"}) == 0
+
+
+def test_trim_to_budget_evicts_oldest_meta_until_it_fits():
+    meta = InvoiceMetaStore()
+    for i in range(200):
+        meta.put(f"k{i}", _meta(f"k{i}", Growers=[f"Grower {i}"]))
+    rows = RowStore([{"Supplier Invoice No.": str(i), "Amount": float(i)} for i in range(50)])
+    state = {"invoice_meta": meta, "all_rows": rows}
+    full = memory_report(state)[1]
+    budget = memory_report({"all_rows": rows})[1] + (full - memory_report({"all_rows": rows})[1]) // 4
+
+    total = trim_to_budget(state, budget, pinned={"k0"})
+    assert total <= budget and total == memory_report(state)[1]
+    assert "k0" in meta and "k199" in meta and "k1" not in meta
+    assert 10 < len(meta) < 100
+    assert len(rows) == 50  # results are never dropped
+
+
+def test_trim_to_budget_stops_when_only_results_and_pinned_are_left():
+    meta = InvoiceMetaStore()
+    meta.put("k1", _meta("k1"))
+    state = {"invoice_meta": meta, "all_rows": RowStore([{"Amount": 1.0}])}
+    assert trim_to_budget(state, budget=1, pinned={"k1"}) == memory_report(state)[1] > 1
+    assert list(meta) == ["k1"]
+
+
+def test_trim_to_budget_drops_derived_caches_before_evicting_meta():
+    class Cache:
+        def __init__(self):
+            self.data = ["x" * 100_000]
+
+        def __sizeof__(self):
+            return object.__sizeof__(self) + sum(len(s) for s in self.data)
+
+        def drop_caches(self):
+            self.data = []
+
+    meta = InvoiceMetaStore()
+    for i in range(20):
+        meta.put(f"k{i}", _meta(f"k{i}"))
+    cache = Cache()
+    state = {"invoice_meta": meta, "preview": cache}
+    budget = memory_report({"invoice_meta": meta})[1] + 10_000
+
+    assert trim_to_budget(state, budget) <= budget
+    assert cache.data == [] and len(meta) == 20
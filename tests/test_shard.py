@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from conftest import BACHE_LINES, CONSIGNEES, VALLEY_FRESH_LINES, make_pdf
+from journal import BatchJournal
+from shard import export_text, list_pdfs, merge, run_shard, shard_of
+
+
+@pytest.fixture
+def batch(tmp_path, batch_files):
+    pdfs = tmp_path / "pdfs"
+    (pdfs / "sub").mkdir(parents=True)
+    (pdfs / "vf.pdf").write_bytes(make_pdf(VALLEY_FRESH_LINES))
+    (pdfs / "sub" / "bache.PDF").write_bytes(make_pdf(BACHE_LINES))
+    (pdfs / "vf_resent.pdf").write_bytes(make_pdf(VALLEY_FRESH_LINES))
+    (pdfs / "broken.pdf").write_bytes(b"%PDF-1.4 truncated")
+    (pdfs / "notes.txt").write_text("not an invoice")
+    ft, maps = batch_files
+    (tmp_path / "ft.xlsx").write_bytes(ft)
+    (tmp_path / "maps.xlsx").write_bytes(maps)
+    return tmp_path
+
+
+def _run(root, out, of, by="name"):
+    return sum(
+        run_shard(root / "pdfs", root / "ft.xlsx", root / "maps.xlsx", root / out, s, of, by, CONSIGNEES)
+        for s in range(of)
+    )
+
+
+def test_shard_of_is_stable():
+    assert shard_of("a.pdf", 4) == shard_of(b"a.pdf", 4)
+    assert {shard_of(f"{i}.pdf", 3) for i in range(50)} == {0, 1, 2}
+
+
+def test_sharded_export_is_byte_identical_to_single_node(batch):
+    assert [name for name, _ in list_pdfs(batch / "pdfs")] == ["broken.pdf", "sub/bache.PDF", "vf.pdf", "vf_resent.pdf"]
+    assert _run(batch, "single", 1) == 4
+    assert _run(batch, "by-name", 3) == 4
+    assert _run(batch, "by-content", 2, by="content") == 4
+
+    rows, failures = merge(batch / "single")
+    assert {r["Supplier Invoice No."] for r in rows} == {"123456", "BB-1234"}
+    assert len(rows) == 6  # the resent invoice is exported once
+    assert [f["File"] for f in failures] == ["broken.pdf"]
+    for out in ("by-name", "by-content"):
+        assert merge(batch / out) == (rows, failures)
+        assert export_text(merge(batch / out)[0]) == export_text(rows)
+
+
+def _write_shard(root, shard, of, entries, ref="r"):
+    j = BatchJournal(f"shard-{shard}-of-{of}", root=root)
+    for fid, result in entries:
+        j.record(fid, result)
+    (root / f"shard-{shard}-of-{of}.json").write_text(json.dumps(
+        {"shard": shard, "of": of, "by": "name", "ref": ref, "files": [fid for fid, _ in entries]}
+    ))
+
+
+def test_merge_rejects_incomplete_or_mixed_runs(tmp_path):
+    with pytest.raises(ValueError, match="No shard manifests"):
+        merge(tmp_path)
+    result = {"Key": "k1", "Meta": {}, "Rows": [{"Amount": 1.0}], "Failure": None}
+    _write_shard(tmp_path, 0, 2, [("a.pdf|1", result)])
+    with pytest.raises(ValueError, match="not finished"):
+        merge(tmp_path)
+    _write_shard(tmp_path, 1, 2, [], ref="other")
+    with pytest.raises(ValueError, match="different runs"):
+        merge(tmp_path)
@@ -0,0 +1,78 @@
+import math
+import random
+
+import pytest
+
+from allocator import mapping_lookup
+from bench_shared_ref import synthetic
+from conftest import BACHE_LINES, VALLEY_FRESH_LINES, make_pdf
+from constants import COMPANY_CONSIGNORS
+from excel_ops import FtIndex, get_crop_splits
+from pipeline import Pipeline
+from shared_ref import RefTables
+
+
+@pytest.fixture(scope="module")
+def reference():
+    mapping_df, ft_df = synthetic(300, 4000, seed=3)
+    mapping_df.loc[5, "Supplier"] = None  # blank Supplier cell
+    mapping_df.loc[7, "Supplier"] = mapping_df.loc[6, "Supplier"].upper() + "  "  # duplicate: first row wins
+    ft_df.loc[10, "TBC Ref. (Po No)"] = "po-0010"  # digits-only match
+    return mapping_df, ft_df, RefTables.compile(mapping_df, ft_df)
+
+
+def _same(a, b):
+    """Account rows equal, with NaN (blank cell) == NaN."""
+    def blank(v):
+        return isinstance(v, float) and math.isnan(v)
+
+    return a.keys() == b.keys() and all(a[c] == b[c] or (blank(a[c]) and blank(b[c])) for c in a)
+
+
+def test_account_row_matches_the_pandas_lookup(reference):
+    mapping_df, _, tables = reference
+    lookup = mapping_lookup(mapping_df)
+    growers = mapping_df["Supplier"].dropna().tolist()[:100] + [" grower 00042 ", "Unknown grower", "nan"]
+    for grower in growers:
+        want, got = lookup(grower), tables.account_row(grower)
+        assert (got is None) if want is None else _same(want, got), grower
+
+
+def test_crop_splits_match_the_pandas_path(reference):
+    _, ft_df, tables = reference
+    index = FtIndex(ft_df)
+    rnd = random.Random(1)
+    queries = [(f"PO{rnd.randrange(1100)}", rnd.choice(list(COMPANY_CONSIGNORS))) for _ in range(200)]
+    queries += [("10", "Bache Bros Pty Ltd"), ("PO0010", "De Luca Banana Marketing"), ("", "Unknown")]
+    for po, company in queries:
+        assert tables.crop_splits(po, company) == get_crop_splits(index, po, company), (po, company)
+
+
+def test_shared_memory_round_trip(reference):
+    mapping_df, ft_df, tables = reference
+    shm = tables.publish()
+    attached = RefTables.attach(shm.name)
+    try:
+        assert attached.crop_splits("PO1", "Bache Bros Pty Ltd") == tables.crop_splits("PO1", "Bache Bros Pty Ltd")
+        assert _same(attached.account_row("Grower 00001"), tables.account_row("Grower 00001"))
+        assert attached.frame().equals(tables.frame())
+    finally:
+        attached.close()
+        shm.close()
+        shm.unlink()
+    with pytest.raises(ValueError):
+        RefTables.from_buffer(b"XXXX" + bytes(8))
+
+
+def test_pipeline_gives_the_same_result_on_reference_tables(batch_files):
+    import io
+
+    import pandas as pd
+
+    ft_df, mapping_df = (pd.read_excel(io.BytesIO(b)) for b in batch_files)
+    tables = RefTables.compile(mapping_df, ft_df)
+    for lines in (VALLEY_FRESH_LINES, BACHE_LINES):
+        pdf = make_pdf(lines)
+        want = Pipeline(FtIndex(ft_df), mapping_df, {}).process(pdf)
+        got = Pipeline(tables, tables, {}).process(pdf)
+        assert got["Rows"] == want["Rows"] and got["Failure"] is None
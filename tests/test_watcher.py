@@ -0,0 +1,90 @@
+import csv
+
+import pytest
+
+import watcher
+from conftest import BACHE_LINES, CONSIGNEES, VALLEY_FRESH_LINES, make_pdf
+
+
+@pytest.fixture
+def dirs(tmp_path, batch_files):
+    inbox, out = tmp_path / "inbox", tmp_path / "out"
+    inbox.mkdir()
+    ft, maps = batch_files
+    (tmp_path / "ft.xlsx").write_bytes(ft)
+    (tmp_path / "maps.xlsx").write_bytes(maps)
+    ref = watcher.RefData(tmp_path / "maps.xlsx", tmp_path / "ft.xlsx", CONSIGNEES)
+    return inbox, out, ref
+
+
+def _run(inbox, out, ref):
+    watcher.watch(inbox, out, ref, poll_seconds=0.01, settle_seconds=0, once=True)
+
+
+def _outputs(out):
+    myob = next(out.glob("myob_import_*.txt"), None)
+    failures = next(out.glob("failures_*.csv"), None)
+    lines = myob.read_text().splitlines() if myob else []
+    rows = list(csv.DictReader(failures.open())) if failures else []
+    return lines, rows
+
+
+def test_processes_each_file_once(dirs):
+    inbox, out, ref = dirs
+    (inbox / "vf.pdf").write_bytes(make_pdf(VALLEY_FRESH_LINES))
+    (inbox / "broken.pdf").write_bytes(b"%PDF-1.4 truncated")
+    _run(inbox, out, ref)
+
+    lines, failures = _outputs(out)
+    assert lines[0] == "{}" and lines[1].startswith("Co./Last Name\t")
+    assert sum("\t123456\t" in l for l in lines) == 4
+    assert [(f["File"], f["Reason"].split(":")[0]) for f in failures] == [("broken.pdf", "Could not process PDF")]
+
+    (inbox / "bache.pdf").write_bytes(make_pdf(BACHE_LINES))
+    _run(inbox, out, ref)  # restart: only the new file is processed
+    lines, failures = _outputs(out)
+    assert sum("\t123456\t" in l for l in lines) == 4
+    assert sum("\tBB-1234\t" in l for l in lines) == 2
+    assert len(failures) == 1
+    assert set(watcher.Checkpoint(out / "checkpoint.json").done) == {"vf.pdf", "broken.pdf", "bache.pdf"}
+
+
+def test_restart_truncates_output_written_after_the_checkpoint(dirs):
+    inbox, out, ref = dirs
+    (inbox / "vf.pdf").write_bytes(make_pdf(VALLEY_FRESH_LINES))
+    _run(inbox, out, ref)
+    myob = next(out.glob("myob_import_*.txt"))
+    committed = myob.read_bytes()
+
+    with open(myob, "ab") as fh:  # crash mid-invoice
+        fh.write(b"FRESHMAX NATIONAL PTY LTD\t12/01/2026\t99")
+    _run(inbox, out, ref)
+    assert myob.read_bytes() == committed
+
+
+def test_unreadable_reference_file_keeps_the_last_pipeline(dirs, tmp_path, capsys):
+    inbox, out, ref = dirs
+    (inbox / "vf.pdf").write_bytes(make_pdf(VALLEY_FRESH_LINES))
+    _run(inbox, out, ref)
+    loaded = ref.pipeline
+
+    (tmp_path / "maps.xlsx").write_bytes(b"PK half-written")
+    (inbox / "bache.pdf").write_bytes(make_pdf(BACHE_LINES))
+    _run(inbox, out, ref)
+    assert ref.pipeline is loaded
+    assert "keeping the last loaded" in capsys.readouterr().out
+    lines, _ = _outputs(out)
+    assert sum("\tBB-1234\t" in l for l in lines) == 2
+
+
+def test_resent_invoice_goes_to_failures_as_a_duplicate(dirs):
+    inbox, out, ref = dirs
+    (inbox / "a.pdf").write_bytes(make_pdf(VALLEY_FRESH_LINES))
+    _run(inbox, out, ref)
+    (inbox / "a_resent.pdf").write_bytes(make_pdf(VALLEY_FRESH_LINES))
+    _run(inbox, out, ref)  # after a restart too: posted keys are in the checkpoint
+
+    lines, failures = _outputs(out)
+    assert sum("\t123456\t" in l for l in lines) == 4
+    assert [(f["File"], f["Invoice No."], f["Reason"]) for f in failures] == [
+        ("a_resent.pdf", "123456", "Duplicate invoice")]
@@ -1,8 +1,8 @@
 import re
 from pathlib import Path
-from typing import Union, Dict
+from typing import Union, Dict, Optional
 
-import pandas as pd
+from constants import CROPS
 
 
 def norm_consignee(s: str) -> str:
@@ -22,6 +22,8 @@ def load_consignee_state_map(xlsx_path: Union[str, Path]) -> Dict[str, str]:
 
     Robust to duplicate column headers (pandas may return a DataFrame for df["Market Area"]).
     """
+    import pandas as pd
+
     df = pd.read_excel(xlsx_path, sheet_name="Data")
     df.columns = [str(c).strip() for c in df.columns]
 
@@ -56,3 +58,24 @@ def digits_only(s: str) -> str:
 def make_payload_key(company: str, invoice_no: str, cust_po: str) -> str:
     """Stable key used to save/retrieve overrides per invoice."""
     return f"{str(company).strip()}|{str(invoice_no).strip()}|{str(cust_po).strip()}"
+
+
+_CROP_RES = {
+    field: [(crop, re.compile(cfg[field], re.IGNORECASE)) for crop, cfg in CROPS.items()]
+    for field in ("ft_pattern", "line_pattern")
+}
+
+
+def match_crop(text: str, field: str = "line_pattern") -> Optional[str]:
+    """First CROPS name whose pattern (ft_pattern / line_pattern) matches text, else None."""
+    for crop, rx in _CROP_RES[field]:
+        if rx.search(str(text)):
+            return crop
+    return None
+
+
+def json_default(o):
+    """json.dumps default for pipeline results: numpy scalars from pandas (e.g. account numbers) -> Python."""
+    if hasattr(o, "item"):
+        return o.item()
+    return str(o)
@@ -0,0 +1,264 @@
+"""Watch-folder daemon: process invoice PDFs as they land in an inbox directory.
+
+    python watcher.py --inbox /path/to/inbox --maps maps.xlsx --ft consignments.xlsx --out /path/to/out
+
+Account maps, the FT summary and the consignee list stay loaded and are
+reloaded when their files change. Each new PDF goes through the same Pipeline
+as the app; successes are appended to a daily rolling MYOB import file and
+failures to a daily failures file in --out. The inbox is watched with inotify
+when inotify_simple is installed, otherwise polled.
+
+Crash safety: after each PDF the outputs are flushed and fsynced, then the
+checkpoint (processed files, posted invoice keys, output file sizes) is
+replaced atomically. An invoice whose key was already posted (a resent copy
+under another file name) goes to the failures file as "Duplicate invoice". On
+start, outputs are truncated back to the checkpointed sizes, so a crash
+mid-write never leaves partial or duplicated lines.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import time
+from datetime import date
+from pathlib import Path
+
+from constants import MYOB_COLUMNS, FAILURE_COLUMNS
+from pipeline import unreadable_result
+
+BASE_DIR = Path(__file__).resolve().parent
+
+
+class RefData:
+    """Reference data kept in memory and reloaded when its file's mtime changes."""
+
+    def __init__(self, maps_path, ft_path, consignees_path):
+        self.paths = {"maps": Path(maps_path), "ft": Path(ft_path), "consignees": Path(consignees_path)}
+        self._mtimes = {}
+        self._changed = (None, 0.0)  # (stats seen changing, first seen) for the settle debounce
+        self.pipeline = None
+
+    def refresh(self, settle_seconds: float = 0.0) -> bool:
+        """Reloads changed files. Returns True if anything was (re)loaded.
+
+        Once loaded, a change is only picked up after the files' size/mtime has
+        been stable for settle_seconds (a file still being copied isn't read).
+        Raises if a file is missing or unreadable; the last loaded pipeline stays
+        in place and the next call retries.
+        """
+        import pandas as pd
+        from excel_ops import FtIndex
+        from consignment_store import ConsignmentStore
+        from pipeline import Pipeline
+        from utils import load_consignee_state_map
+
+        stats = {k: p.stat() for k, p in self.paths.items()}
+        mtimes = {k: (s.st_size, s.st_mtime_ns) for k, s in stats.items()}
+        if self.pipeline is not None and mtimes == self._mtimes:
+            return False
+        if self.pipeline is not None and settle_seconds > 0:
+            now = time.monotonic()
+            if self._changed[0] != mtimes:
+                self._changed = (mtimes, now)
+                return False
+            if now - self._changed[1] < settle_seconds:
+                return False
+
+        p = self.pipeline
+        maps = pd.read_excel(self.paths["maps"]) if p is None or mtimes["maps"] != self._mtimes["maps"] else p.mapping_df
+        if p is None or mtimes["ft"] != self._mtimes["ft"]:
+            ft = self.paths["ft"]
+            ft = ConsignmentStore(ft) if ft.suffix == ".sqlite" else FtIndex.from_excel(ft)
+        else:
+            ft = p.ft_source
+        if p is None or mtimes["consignees"] != self._mtimes["consignees"]:
+            cmap = load_consignee_state_map(self.paths["consignees"])
+        else:
+            cmap = p.consignee_state_map
+
+        self.pipeline = Pipeline(ft, maps, cmap)
+        self._mtimes = mtimes
+        return True
+
+
+class Checkpoint:
+    """Processed files, posted invoice keys + output sizes, replaced atomically."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.done = {}     # file name -> [size, mtime_ns]
+        self.keys = set()  # invoice keys already in a MYOB import file
+        self.sizes = {}    # output file name -> committed size
+        if path.exists():
+            data = json.loads(path.read_text())
+            self.done = data.get("done", {})
+            self.keys = set(data.get("keys", []))
+            self.sizes = data.get("sizes", {})
+
+    def save(self):
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w") as fh:
+            json.dump({"done": self.done, "keys": sorted(self.keys), "sizes": self.sizes}, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.path)
+
+    def truncate_outputs(self, out_dir: Path):
+        """Drop anything written after the last checkpoint (crash mid-invoice)."""
+        for p in list(out_dir.glob("myob_import_*.txt")) + list(out_dir.glob("failures_*.csv")):
+            size = self.sizes.get(p.name, 0)
+            if p.stat().st_size > size:
+                with open(p, "r+b") as fh:
+                    fh.truncate(size)
+
+
+def _fmt(v):
+    return "" if v is None else str(v)
+
+
+class Outputs:
+    """Daily rolling MYOB import + failures files."""
+
+    def __init__(self, out_dir: Path, checkpoint: Checkpoint):
+        self.out_dir = out_dir
+        self.checkpoint = checkpoint
+
+    def _append(self, name: str, text: str, header: str):
+        p = self.out_dir / name
+        new = not p.exists() or p.stat().st_size == 0
+        with open(p, "a", encoding="utf-8", newline="") as fh:
+            if new:
+                fh.write(header)
+            fh.write(text)
+            fh.flush()
+            os.fsync(fh.fileno())
+        self.checkpoint.sizes[name] = p.stat().st_size
+
+    def add_rows(self, rows):
+        # Same layout as exporter.to_tab_delimited_with_header: "{}" line, header,
+        # then each invoice's lines followed by one blank line.
+        buf = io.StringIO()
+        w = csv.writer(buf, delimiter="\t", lineterminator="\r\n")
+        for r in rows:
+            w.writerow([_fmt(r.get(c)) for c in MYOB_COLUMNS])
+        w.writerow([""] * len(MYOB_COLUMNS))
+        hdr = io.StringIO()
+        hdr.write("{}\n")
+        csv.writer(hdr, delimiter="\t", lineterminator="\r\n").writerow(MYOB_COLUMNS)
+        self._append(f"myob_import_{date.today():%Y-%m-%d}.txt", buf.getvalue(), hdr.getvalue())
+
+    def add_failure(self, failure: dict, file_name: str):
+        buf = io.StringIO()
+        row = dict(failure, File=file_name)
+        csv.writer(buf, lineterminator="\n").writerow([_fmt(row.get(c)) for c in FAILURE_COLUMNS])
+        hdr = io.StringIO()
+        csv.writer(hdr, lineterminator="\n").writerow(FAILURE_COLUMNS)
+        self._append(f"failures_{date.today():%Y-%m-%d}.csv", buf.getvalue(), hdr.getvalue())
+
+
+# -------------------------
+# Watching
+# -------------------------
+def _pdf_stats(inbox: Path):
+    out = {}
+    with os.scandir(inbox) as it:
+        for e in it:
+            if e.is_file() and e.name.lower().endswith(".pdf"):
+                st = e.stat()
+                out[e.name] = (st.st_size, st.st_mtime_ns)
+    return out
+
+
+def _inotify_waiter(inbox: Path):
+    """Returns wait(timeout) that blocks until the inbox changes, or None if inotify is unavailable."""
+    try:
+        from inotify_simple import INotify, flags
+    except ImportError:
+        return None
+    ino = INotify()
+    ino.add_watch(str(inbox), flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.MODIFY)
+    return lambda timeout: ino.read(timeout=int(timeout * 1000))
+
+
+def watch(inbox, out_dir, ref: RefData, poll_seconds: float = 1.0, settle_seconds: float = 2.0, once: bool = False):
+    """Main loop. A PDF is processed once its size/mtime has been stable for settle_seconds
+    (debounces partial writes from mail clients / network copies)."""
+    inbox, out_dir = Path(inbox), Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    checkpoint = Checkpoint(out_dir / "checkpoint.json")
+    checkpoint.truncate_outputs(out_dir)
+    outputs = Outputs(out_dir, checkpoint)
+    wait = _inotify_waiter(inbox)
+
+    pending = {}  # name -> (size, mtime_ns, first seen with this stat)
+    ref_error = None
+    while True:
+        try:
+            if ref.refresh(settle_seconds):
+                print(f"[watcher] reference data loaded {time.strftime('%H:%M:%S')}", flush=True)
+            ref_error = None
+        except Exception as e:
+            # missing or half-written maps/FT: keep the last good pipeline, retry next poll
+            if str(e) != ref_error:
+                keeping = "keeping the last loaded" if ref.pipeline is not None else "waiting for it"
+                print(f"[watcher] reference data not loaded ({type(e).__name__}: {e}); {keeping}", flush=True)
+            ref_error = str(e)
+            if ref.pipeline is None:
+                if once:
+                    return
+                time.sleep(poll_seconds)
+                continue
+
+        now = time.monotonic()
+        for name, stat in _pdf_stats(inbox).items():
+            if checkpoint.done.get(name) == list(stat):
+                continue
+            prev = pending.get(name)
+            if prev is None or prev[:2] != stat:
+                pending[name] = (*stat, now)
+                continue
+            if stat[0] == 0 or now - prev[2] < settle_seconds:
+                continue
+
+            try:
+                with open(inbox / name, "rb") as fh:
+                    result = ref.pipeline.process(fh)
+            except Exception as e:
+                result = unreadable_result(name, e)
+
+            if not result["Failure"] and result["Key"] in checkpoint.keys:
+                meta = result["Meta"]
+                result["Failure"] = {"Company": meta.get("Company"), "Invoice No.": meta.get("Invoice No."),
+                                     "PO No.": meta.get("PO No."), "Reason": "Duplicate invoice",
+                                     "Key": result["Key"]}
+            if result["Failure"]:
+                outputs.add_failure(result["Failure"], name)
+            else:
+                outputs.add_rows(result["Rows"])
+                checkpoint.keys.add(result["Key"])
+            checkpoint.done[name] = list(stat)
+            checkpoint.save()
+            pending.pop(name, None)
+            print(f"[watcher] {name}: {result['Failure']['Reason'] if result['Failure'] else 'ok'}", flush=True)
+
+        if once and not pending:
+            return
+        if wait is not None and not pending:
+            wait(poll_seconds * 10)
+        else:
+            time.sleep(poll_seconds)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Process invoice PDFs as they arrive in a folder")
+    ap.add_argument("--inbox", required=True)
+    ap.add_argument("--out", required=True)
+    ap.add_argument("--maps", required=True, help="Account Maps .xlsx")
+    ap.add_argument("--ft", required=True, help="Consignment Summary .xlsx, or a consignment history .sqlite")
+    ap.add_argument("--consignees", default=str(BASE_DIR / "data" / "consignees.xlsx"))
+    ap.add_argument("--poll", type=float, default=1.0)
+    ap.add_argument("--settle", type=float, default=2.0)
+    args = ap.parse_args()
+    watch(args.inbox, args.out, RefData(args.maps, args.ft, args.consignees), args.poll, args.settle)